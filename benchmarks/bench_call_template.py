@@ -0,0 +1,61 @@
+"""Microbenchmark of preparing a call request: a plain RubbleProcess.call
+against a CallTemplate prepared once with RubbleProcess.prepare_call. Only
+the client side work is measured, the transport is replaced by one that
+returns immediately.
+
+Run from the repository root with:
+
+    PYTHONPATH=. python benchmarks/bench_call_template.py
+"""
+import json as json_module
+import timeit
+
+from pybble.process import RubbleProcess
+from pybble.template import Slot
+
+
+class Response:
+    ok = True
+
+    def json(self):
+        return {'output': []}
+
+
+class NullTransport:
+    """Does the JSON encoding a Transport would, but no I/O"""
+
+    def post(self, url, json=None, data=None, **kwargs):
+        if json is not None:
+            data = json_module.dumps(json).encode('utf-8')
+        return Response()
+
+
+def report(name, seconds, number):
+    print("{:<45} {:>8.3f} us/op".format(name, seconds / number * 1e6))
+
+
+def main(number=100000):
+    process = RubbleProcess(None, {}, transport=NullTransport())
+
+    def terms(sku, quantity):
+        return [{'order': {'sku': sku, 'quantity': quantity,
+                           'warehouse': 'north', 'priority': 'normal',
+                           'tags': ['web', 'retail']}}]
+
+    template = process.prepare_call(terms(Slot('sku'), Slot('quantity')),
+                                    pid=42, wrap_input_from='orders')
+
+    def plain():
+        return process.call(terms('A-17', 3), 42, wrap_input_from='orders')
+
+    def prepared():
+        return template.call(sku='A-17', quantity=3)
+
+    report("RubbleProcess.call",
+           timeit.timeit(plain, number=number), number)
+    report("CallTemplate.call",
+           timeit.timeit(prepared, number=number), number)
+
+
+if __name__ == '__main__':
+    main()
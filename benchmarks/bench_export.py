@@ -0,0 +1,61 @@
+"""Memory and filtering time of a large process list: the list of dicts
+returned by RubbleProcess.list against pybble.export.ProcessColumns.
+
+Run from the repository root with:
+
+    PYTHONPATH=. python benchmarks/bench_export.py
+"""
+import json
+import timeit
+import tracemalloc
+
+from pybble.export import page_columns, ProcessColumns
+from pybble.response import LazyResponse
+
+
+def pages(rows, page_size):
+    for begin in range(0, rows, page_size):
+        page = [{'pid': str(pid), 'domain': 'domain{}'.format(pid % 50),
+                 'modtime': 1367237523740 + pid * 1000, 'type': 'rules'}
+                for pid in range(begin, min(rows, begin + page_size))]
+        yield json.dumps({'result': page}).encode('utf-8')
+
+
+def measure(build):
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def main(rows=1000000, page_size=10000):
+    bodies = list(pages(rows, page_size))
+
+    def dicts():
+        items = []
+        for body in bodies:
+            items.extend(json.loads(body)['result'])
+        return items
+
+    def columns():
+        exported = ProcessColumns()
+        for body in bodies:
+            exported.extend(*page_columns(LazyResponse(body)))
+        return exported
+
+    items, dict_bytes = measure(dicts)
+    exported, column_bytes = measure(columns)
+    print("{:<30} {:>8.1f} MB".format("list of dicts", dict_bytes / 1e6))
+    print("{:<30} {:>8.1f} MB".format("ProcessColumns", column_bytes / 1e6))
+
+    cutoff = 1367237523740 + rows * 900
+    print("{:<30} {:>8.1f} ms".format("filter list of dicts", timeit.timeit(
+        lambda: [item for item in items if item['modtime'] >= cutoff],
+        number=3) / 3 * 1000))
+    print("{:<30} {:>8.1f} ms".format("filter ProcessColumns", timeit.timeit(
+        lambda: exported.where_modified(since=cutoff), number=3) / 3 * 1000))
+
+
+if __name__ == '__main__':
+    main()
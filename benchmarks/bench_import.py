@@ -0,0 +1,63 @@
+"""Startup benchmark: the cost of importing pybble.client and creating a
+Client, measured in fresh interpreters.
+
+Run from the repository root with:
+
+    PYTHONPATH=. python benchmarks/bench_import.py [--budget-ms 50]
+
+Exits with status 1 if the median overhead over a bare interpreter exceeds
+the budget, so it can guard startup latency in CI.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+
+STARTUP = "import pybble.client; pybble.client.Client('key', 'password')"
+
+HEAVY_MODULES = ('requests', 'urllib3', 'numpy', 'xml.etree.ElementTree',
+                 'asyncio', 'concurrent.futures')
+
+
+def run(code, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], check=True)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def heavy_modules_loaded():
+    code = STARTUP + "; import sys; print(' '.join(m for m in {!r} if m in sys.modules))".format(
+        HEAVY_MODULES)
+    output = subprocess.run([sys.executable, '-c', code], check=True,
+                            stdout=subprocess.PIPE, universal_newlines=True)
+    return output.stdout.split()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--budget-ms', type=float, default=50.0)
+    args = parser.parse_args()
+
+    bare = run("pass", args.repeat)
+    startup = run(STARTUP, args.repeat)
+    overhead_ms = (startup - bare) * 1000
+
+    print("bare interpreter        {:8.1f} ms".format(bare * 1000))
+    print("import + Client()       {:8.1f} ms".format(startup * 1000))
+    print("pybble overhead         {:8.1f} ms (budget {} ms)".format(
+        overhead_ms, args.budget_ms))
+    print("heavy modules loaded    {}".format(
+        ', '.join(heavy_modules_loaded()) or 'none'))
+
+    if overhead_ms > args.budget_ms:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Microbenchmark of the per-request configuration overhead: resolving the
+endpoint URL and building the request arguments.
+
+Run from the repository root with:
+
+    PYTHONPATH=. python benchmarks/bench_request_overhead.py
+"""
+import copy
+import timeit
+from urllib.parse import urljoin
+
+from pybble.config import ClientConfig, config as default_config
+
+
+def report(name, seconds, number):
+    print("{:<45} {:>8.3f} us/op".format(name, seconds / number * 1e6))
+
+
+def main(number=200000):
+    client_config = ClientConfig()
+
+    def dict_config_json():
+        url = urljoin(default_config['url']['api'], 'processcreate')
+        return url, dict(**default_config['default_request_kwargs'])
+
+    def dict_config_octet_stream():
+        request_kwargs = copy.deepcopy(default_config['default_request_kwargs'])
+        request_kwargs['headers']['content-type'] = 'application/octet-stream'
+        url = urljoin(default_config['url']['api'], 'file/' + 'foo.rubble')
+        return url, request_kwargs
+
+    def client_config_json():
+        url = client_config.endpoint('processcreate')
+        return url, dict(**client_config['default_request_kwargs'])
+
+    def client_config_octet_stream():
+        request_kwargs = client_config.request_kwargs_for('application/octet-stream')
+        url = client_config.file_url('foo.rubble')
+        return url, dict(**request_kwargs)
+
+    report("dict config, urljoin (process.create)",
+           timeit.timeit(dict_config_json, number=number), number)
+    report("ClientConfig, precomputed (process.create)",
+           timeit.timeit(client_config_json, number=number), number)
+    report("dict config, urljoin + deepcopy (file.write)",
+           timeit.timeit(dict_config_octet_stream, number=number), number)
+    report("ClientConfig, precomputed (file.write)",
+           timeit.timeit(client_config_octet_stream, number=number), number)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""Microbenchmarks for pybble.time
+
+Run from the repository root with:
+
+    PYTHONPATH=. python benchmarks/bench_time.py
+"""
+import datetime
+import timeit
+
+from pybble import time
+
+
+def strftime_epoch(datetime_obj):
+    """The previous implementation, kept for comparison"""
+    return int(datetime_obj.strftime("%s")) * 1000
+
+
+def report(name, seconds, number):
+    print("{:<40} {:>10.3f} us/op".format(name, seconds / number * 1e6))
+
+
+def main(number=100000):
+    naive = datetime.datetime(2026, 10, 18, 12, 30, 15, 123000)
+    aware = naive.replace(tzinfo=datetime.timezone.utc)
+
+    report("strftime('%s') naive", timeit.timeit(
+        lambda: strftime_epoch(naive), number=number), number)
+    report("datetime_to_epoch naive", timeit.timeit(
+        lambda: time.datetime_to_epoch(naive), number=number), number)
+    report("datetime_to_epoch aware", timeit.timeit(
+        lambda: time.datetime_to_epoch(aware), number=number), number)
+    report("now", timeit.timeit(time.now, number=number), number)
+
+    bulk = [aware + datetime.timedelta(seconds=i) for i in range(number)]
+    report("datetimes_to_epoch aware list (per item)", timeit.timeit(
+        lambda: time.datetimes_to_epoch(bulk), number=1), number)
+
+    try:
+        import numpy
+    except ImportError:
+        return
+
+    array = numpy.array([dt.replace(tzinfo=None) for dt in bulk],
+                        dtype='datetime64[us]')
+    report("datetimes_to_epoch datetime64 (per item)", timeit.timeit(
+        lambda: time.datetimes_to_epoch(array), number=1), number)
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,23 @@
 """
 version = '0.1.6'
 
+# Subpackages are imported on first attribute access, e.g. pybble.client, so
+# that importing pybble (as setup.py does) stays cheap
+SUBPACKAGES = (
+    'babylon', 'batch', 'channel', 'client', 'coalesce', 'config', 'deploy',
+    'error', 'export', 'facts', 'fanout', 'file', 'hedge', 'outbox', 'pool',
+    'process', 'profile', 'response', 'schedule', 'snapshot', 'template',
+    'time', 'transport', 'trapstate', 'watch',
+)
+
+
+def __getattr__(name):
+    if name in SUBPACKAGES:
+        import importlib
+        return importlib.import_module('pybble.' + name)
+    raise AttributeError("module 'pybble' has no attribute {!r}".format(name))
+
+
 setup_params = {
   'name': 'pybble',
   'packages': ['pybble'],
@@ -1,11 +1,10 @@
+import codecs
+import collections
 import sys
-import requests
-import copy
-
-from urllib.parse import urljoin
-from xml.etree import ElementTree
 
+from pybble.config import ClientConfig
 from pybble.error import RubbleServerException, error_string_from_request
+from pybble.transport import Transport
 
 
 def parse(xml):
@@ -15,6 +14,8 @@ def parse(xml):
     :param xml:
     :return:
     """
+    from xml.etree import ElementTree
+
     et = ElementTree.fromstring(xml)
 
     babylon_dict = {}
@@ -95,9 +96,10 @@ def parse_template_params(babylon_template):
 
 class Babylon:
 
-    def __init__(self, auth, config):
+    def __init__(self, auth, config, transport=None):
         self.auth = auth
-        self.config = config
+        self.config = ClientConfig.of(config)
+        self.transport = transport or Transport(auth, self.config)
 
     def translate(self, string, macro_file, **kwargs):
         """
@@ -141,21 +143,19 @@ class Babylon:
         params = {}
         params.update(kwargs)
 
-        url = urljoin(self.config['url']['api'], 'babylon-translate')
+        url = self.config.endpoint('babylon-translate')
 
         data = """Format: babylon/{macro_file}.xml
 
         {string}
         """.format(macro_file=macro_file, string=string)
 
-        request_kwargs = copy.deepcopy(self.config['default_request_kwargs'])
-        request_kwargs['headers']['content-type'] = "text/plain"
+        request_kwargs = self.config.request_kwargs_for('text/plain')
 
-        request = requests.post(url,
-                                auth=self.auth,
-                                data=data,
-                                params=params,
-                                **request_kwargs)
+        request = self.transport.post(url,
+                                      data=data,
+                                      params=params,
+                                      **request_kwargs)
 
         if not request.ok:
             raise RubbleServerException(error_string_from_request(request))
@@ -165,3 +165,157 @@ class Babylon:
                   file=sys.stderr)
 
         return request.text
+
+    def translate_stream(self, rules, macro_file, chunk_size=65536, **kwargs):
+        """Like Babylon.translate, but for documents of any size: the
+        babylon rules are streamed to the server as they are taken from
+        rules, and the generated Rubble code is yielded as it arrives, so
+        that memory use doesn't grow with the size of the document.
+
+        Parameters
+        ----------
+
+        rules: iterable of str
+            The babylon rules, one per item. Empty lines separate rules in
+            the request body, so whitespace within a rule, including
+            newlines, is collapsed into single spaces, as the server does
+            anyway.
+
+        macro_file: str
+            See Babylon.translate.
+
+        chunk_size: int, optional
+            Rules are sent, and the response is read, in chunks of about
+            this many bytes.
+
+        Query parameters are passed as keyword arguments, see
+        Babylon.translate.
+
+        Returns
+        -------
+        translations: generator
+            Yields a Translation for each rule, in order, holding the
+            rule's position in rules rather than the rule itself, so that
+            the rules aren't kept in memory. Raises RubbleServerException
+            before returning if the request fails.
+
+        The server separates the code generated for each rule by empty
+        lines, so code that itself contains an empty line would be taken
+        for the code of several rules, and every later translation would
+        be attributed to the wrong rule. As that can only be noticed once
+        the whole response has been read, the generator then raises
+        RubbleServerException after its last translation.
+        """
+        url = self.config.endpoint('babylon-translate')
+        # positions of the empty rules, which aren't sent
+        skipped = collections.deque()
+        sent = 0
+
+        def body():
+            nonlocal sent
+            chunk = ["Format: babylon/{}.xml\n\n".format(macro_file)]
+            size = 0
+            for index, rule in enumerate(rules):
+                rule = " ".join(rule.split())
+                if not rule:
+                    skipped.append(index)
+                    continue
+                sent += 1
+                chunk.append(rule + "\n\n")
+                size += len(rule) + 2
+                if size >= chunk_size:
+                    yield "".join(chunk).encode('utf-8')
+                    chunk = []
+                    size = 0
+            if chunk:
+                yield "".join(chunk).encode('utf-8')
+
+        request = self.transport.post(url,
+                                      data=body(),
+                                      params=dict(kwargs),
+                                      stream=True,
+                                      **self.config.request_kwargs_for(
+                                          'text/plain'))
+
+        if not request.ok:
+            request.close()
+            raise RubbleServerException(error_string_from_request(request))
+
+        def translations():
+            blocks = 0
+            index = 0
+            try:
+                for block in _blocks(request, chunk_size):
+                    blocks += 1
+                    while skipped and skipped[0] == index:
+                        skipped.popleft()
+                        index += 1
+                    yield Translation(index if blocks <= sent else None,
+                                      block)
+                    index += 1
+            finally:
+                request.close()
+            if blocks != sent:
+                raise RubbleServerException(
+                    "Received {} blocks of code for {} rules, the "
+                    "translations don't line up with the rules".format(
+                        blocks, sent))
+
+        return translations()
+
+
+class Translation:
+    """The translation of one babylon rule, see Babylon.translate_stream.
+
+    Attributes
+    ----------
+
+    index: int or None
+        The position of the rule in the rules passed to translate_stream.
+        None if the server returned more blocks of code than rules were
+        sent.
+
+    code: str
+        The Rubble code generated for the rule.
+    """
+
+    def __init__(self, index, code):
+        self.index = index
+        self.code = code
+
+    @property
+    def ok(self):
+        """Whether the rule matched a template"""
+        return "TRANSLATION ERROR" not in self.code
+
+    def __repr__(self):
+        return "<Translation index={} ok={}>".format(self.index, self.ok)
+
+
+def _blocks(request, chunk_size):
+    """Yield the blocks of a streamed text response that are separated by
+    empty lines
+    """
+    # requests assumes ISO-8859-1 for text without a charset, the server
+    # sends UTF-8
+    encoding = 'utf-8'
+    if 'charset' in request.headers.get('content-type', ''):
+        encoding = request.encoding
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ""
+    block = []
+    for data in request.iter_content(chunk_size):
+        lines = (pending + decoder.decode(data)).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            if line.strip():
+                block.append(line)
+            elif block:
+                yield "\n".join(block) + "\n"
+                block = []
+
+    pending += decoder.decode(b"", final=True)
+    if pending.strip():
+        block.append(pending)
+    if block:
+        yield "\n".join(block) + "\n"
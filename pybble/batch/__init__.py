@@ -0,0 +1,329 @@
+"""Helpers for running many Rubble requests concurrently with bounded
+parallelism.
+"""
+import json
+import os
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+class BatchStats:
+    """Counters and throughput for a bulk operation"""
+
+    def __init__(self):
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def stop(self):
+        self.finished = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        """Seconds since the operation started, or its total duration once
+        it has finished
+        """
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return end - self.started
+
+    @property
+    def rate(self):
+        """Completed operations per second"""
+        elapsed = self.elapsed
+        if elapsed <= 0:
+            return 0.0
+        return (self.succeeded + self.failed) / elapsed
+
+    def as_dict(self):
+        return {
+            'submitted': self.submitted,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'elapsed': self.elapsed,
+            'rate': self.rate,
+        }
+
+    def __repr__(self):
+        return ("<{name} submitted={submitted} succeeded={succeeded} "
+                "failed={failed} elapsed={elapsed:.3f}s "
+                "rate={rate:.1f}/s>".format(name=type(self).__name__,
+                                            **self.as_dict()))
+
+
+def bounded_map(fn, items, workers=8, max_pending=None, stats=None):
+    """Apply fn to every item on a pool of worker threads.
+
+    Items are pulled from the iterable lazily, and no more than max_pending
+    calls are ever submitted but not yet completed, so a producer of millions
+    of items is throttled to the speed of the server (backpressure).
+
+    Parameters
+    ----------
+
+    fn: callable
+        Called with a single item.
+
+    items: iterable
+        The work items.
+
+    workers: int, optional
+        Number of worker threads, i.e. concurrent requests.
+
+    max_pending: int, optional
+        Maximum number of submitted but not completed calls. Defaults to
+        four times the number of workers.
+
+    stats: BatchStats, optional
+        Updated as items are submitted and completed.
+
+    Returns
+    -------
+    results: generator
+        Yields (item, result, error) tuples in completion order. error is
+        None if fn returned normally, otherwise it's the raised exception
+        and result is None.
+    """
+    if max_pending is None:
+        max_pending = workers * 4
+
+    if stats is None:
+        stats = BatchStats()
+
+    def completed(futures):
+        for future in futures:
+            error = future.exception()
+            if error is None:
+                stats.succeeded += 1
+                yield future.item, future.result(), None
+            else:
+                stats.failed += 1
+                yield future.item, None, error
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for item in items:
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from completed(done)
+
+            future = executor.submit(fn, item)
+            future.item = item
+            pending.add(future)
+            stats.submitted += 1
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            yield from completed(done)
+
+    stats.stop()
+
+
+class RateLimiter:
+    """Limits the rate of operations across threads to rate per second,
+    allowing bursts of up to burst operations.
+
+    Examples
+    --------
+
+        limiter = RateLimiter(50)
+        for item, result, error in bounded_map(
+                lambda pid: limiter.acquire() or update(pid), pids):
+            ...
+
+    Parameters
+    ----------
+
+    rate: float or None
+        Operations per second, None doesn't limit.
+
+    burst: int, optional
+        Defaults to one.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until the next operation is allowed"""
+        if self.rate is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens
+                               + (now - self._updated) * self.rate)
+            self._updated = now
+            # take the token now, possibly running into debt, and sleep
+            # until it would have been there
+            self._tokens -= 1
+            wait_seconds = -self._tokens / self.rate
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+
+
+def trim_partial_line(path):
+    """Truncate a JSON lines file after its last newline, dropping a partly
+    written last line, e.g. after a crash, so that the next line appended
+    doesn't run into it. A missing file is left alone.
+
+    Returns
+    -------
+    trimmed: bool
+        Whether a partial line was dropped.
+    """
+    try:
+        lines_file = open(path, 'r+b')
+    except FileNotFoundError:
+        return False
+
+    with lines_file:
+        end = position = lines_file.seek(0, os.SEEK_END)
+        size = 0
+        # search backwards for the last newline
+        while position > 0:
+            start = max(0, position - 4096)
+            lines_file.seek(start)
+            newline = lines_file.read(position - start).rfind(b'\n')
+            if newline != -1:
+                size = start + newline + 1
+                break
+            position = start
+        if size == end:
+            return False
+        lines_file.truncate(size)
+        return True
+
+
+class Checkpoint:
+    """Progress of a bulk operation, persisted to an append-only file so
+    that an interrupted operation can be resumed.
+
+    Each completed item is written as a JSON line [key, result]. A partly
+    written last line, e.g. after a crash, is dropped when the file is
+    opened.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+
+        trim_partial_line(path)
+        try:
+            with open(path, encoding='utf-8') as checkpoint_file:
+                for line in checkpoint_file:
+                    try:
+                        key, result = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.done[key] = result
+        except FileNotFoundError:
+            pass
+
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def record(self, key, result):
+        with self._lock:
+            self.done[key] = result
+            self._file.write(json.dumps([key, result]) + '\n')
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class BulkResult(BatchStats):
+    """The outcome of a bulk operation.
+
+    Attributes
+    ----------
+
+    results: dict
+        Result of every successful item by key, including items completed
+        by a previous run according to the checkpoint.
+
+    failures: dict
+        The exception raised for every failed item by key.
+
+    skipped: int
+        Number of items skipped because the checkpoint had them as done.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.results = {}
+        self.failures = {}
+        self.skipped = 0
+
+    @property
+    def ok(self):
+        return not self.failures
+
+
+def run_bulk(fn, items, workers=8, max_pending=None, checkpoint=None):
+    """Run fn over keyed items concurrently, collecting results and
+    failures.
+
+    Parameters
+    ----------
+
+    fn: callable
+        Called with each item.
+
+    items: iterable
+        (key, item) tuples. Keys must be unique and JSON serialisable.
+
+    workers: int, optional
+        Number of concurrent requests.
+
+    max_pending: int, optional
+        See bounded_map.
+
+    checkpoint: str or Checkpoint, optional
+        Path of a checkpoint file. Items recorded in it are skipped, and
+        every item completed now is added to it. A Checkpoint passed in is
+        left open, one opened from a path is closed.
+
+    Returns
+    -------
+    result: BulkResult
+    """
+    result = BulkResult()
+
+    opened = checkpoint is not None and not isinstance(checkpoint, Checkpoint)
+    if opened:
+        checkpoint = Checkpoint(checkpoint)
+    done = checkpoint.done if checkpoint is not None else {}
+
+    def remaining():
+        for key, item in items:
+            if key in done:
+                result.results[key] = done[key]
+                result.skipped += 1
+            else:
+                yield key, item
+
+    try:
+        for (key, _), value, error in bounded_map(lambda pair: fn(pair[1]),
+                                                  remaining(),
+                                                  workers=workers,
+                                                  max_pending=max_pending,
+                                                  stats=result):
+            if error is None:
+                result.results[key] = value
+                if checkpoint is not None:
+                    checkpoint.record(key, value)
+            else:
+                result.failures[key] = error
+    finally:
+        if opened:
+            checkpoint.close()
+
+    return result
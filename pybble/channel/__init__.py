@@ -1,13 +1,14 @@
-import requests
-from urllib.parse import urljoin
-
+from pybble.config import ClientConfig
 from pybble.error import RubbleServerException, error_string_from_request
+from pybble.response import decode
+from pybble.transport import Transport
 
 
 class RubbleChannel:
 
-    def __init__(self, config):
-        self.config = config
+    def __init__(self, config, transport=None):
+        self.config = ClientConfig.of(config)
+        self.transport = transport or Transport(None, self.config)
 
     # todo: format to numpy conventions
     def update(self, channel, pid):
@@ -41,11 +42,11 @@ class RubbleChannel:
             'pid': str(pid),
         }
 
-        url = urljoin(self.config['url']['api'], 'chanupdate')
+        url = self.config.endpoint('chanupdate')
 
-        request = requests.post(url,
-                                params=payload,
-                                **self.config['default_request_kwargs'])
+        request = self.transport.post(url,
+                                      params=payload,
+                                      **self.config['default_request_kwargs'])
 
         if request.ok:
             return request.json()
@@ -53,7 +54,7 @@ class RubbleChannel:
             raise RubbleServerException(error_string_from_request(request))
 
     # todo: format according to numpy docstring conventions
-    def list(self, **kwargs):
+    def list(self, lazy=False, raw=False, **kwargs):
         """Retrieves the list of registered channel aliases.
 
         Keyword
@@ -78,6 +79,15 @@ class RubbleChannel:
             The maximum number of items to return in the list. The default
             value is 2147483647 (231-1). For pagination.
 
+        lazy (bool, optional)
+
+            Return a pybble.response.LazyResponse that decodes the JSON on
+            demand.
+
+        raw (bool, optional)
+
+            Return the undecoded response body as bytes.
+
         The response is a JSON object: {"result":[…]}. Each element of the JSON
         array result is a JSON object: {…}
 
@@ -85,11 +95,11 @@ class RubbleChannel:
         """
         params = {}
         params.update(kwargs)
-        url = urljoin(self.config['url']['api'], 'chanlist')
-        request = requests.get(url, params=params,
-                               **self.config['default_request_kwargs'])
+        url = self.config.endpoint('chanlist')
+        request = self.transport.get(url, params=params,
+                                     **self.config['default_request_kwargs'])
 
         if request.ok:
-            return request.json()
+            return decode(request, lazy, raw)
         else:
             raise RubbleServerException(error_string_from_request(request))
\ No newline at end of file
@@ -1,17 +1,10 @@
 import os
-import requests
-from urllib.parse import urljoin
+import threading
 
 from pybble import setup_params
-from pybble.config import config as default_config
+from pybble.config import ClientConfig
 from pybble.error import error_string_from_request, RubbleServerException
-
-from pybble import (
-    process,
-    file,
-    babylon,
-    channel,
-)
+from pybble.transport import create as create_transport
 
 
 class Client:
@@ -33,6 +26,17 @@ class Client:
         intra-cluster communication.  A class to talk to the rubble
         service.
 
+        Thread safety
+        -------------
+
+        A Client can be shared by any number of threads, and should be,
+        so that they share its connection pool. Its configuration is
+        immutable, its subsystems are created once under a lock, every
+        thread makes requests with its own requests.Session mounted on the
+        client's shared connection pool, and the caches and metrics are
+        guarded by locks. Size the pool to the number of threads with the
+        "pool" config option, see pybble.transport.Transport.
+
         Appendix A
         ----------
 
@@ -56,16 +60,29 @@ class Client:
         See http://clip.dia.fi.upm.es/~vocal/public_info/seminar_notes/node32.html
     """
 
-    def __init__(self, key="", password="", config=None):
+    def __init__(self, key="", password="", config=None, adapter=None,
+                 hedger=None):
         """
         :param key:
             Rubble server API key or username
         :param password:
             Rubble server API password or password
         :param config:
-            Various config options that can be passed to modify the base config
+            Various config options that are merged over the default config,
+            see pybble.config
         :type config:
             dict
+        :param adapter:
+            A connection pool to share with other clients, see
+            pybble.pool.ClientPool. By default the client has its own.
+        :type adapter:
+            requests.adapters.HTTPAdapter
+        :param hedger:
+            A hedger to share with other clients, see
+            pybble.pool.ClientPool. By default the client has its own when
+            hedging is enabled.
+        :type hedger:
+            pybble.hedge.Hedger
         """
 
         # Specifying user and password in function call takes
@@ -85,29 +102,148 @@ class Client:
         # User must supply API key to talk to rubble
         self.auth = (key, password)
 
-        # Set the default config and update it with any config the
-        # users passes in
-        if not config:
-            self.config = default_config
-        else:
-            self.config.update(default_config)
+        # Merge the config the user passes in over the default config.
+        # The result is immutable, so it can be shared safely and the
+        # module level defaults are never modified.
+        self._config = ClientConfig(config)
 
-        # Attach modules to the client
-        self.process = process.RubbleProcess(auth=self.auth, config=self.config)
-        self.file = file.RubbleFile(auth=self.auth, config=self.config)
-        self.babylon = babylon.Babylon(auth=self.auth, config=self.config)
+        # The transport and the subsystems are created on first use, so
+        # that creating a Client doesn't import requests or any subsystem
+        # that is never used
+        self._adapter = adapter
+        self._hedger = hedger
+        self._transport = None
+        self._subsystems = {}
+        self._lock = threading.RLock()
 
-    def config(self, config=None):
+        # Unless the "pool" config asks for warm-up or keep-alive probes,
+        # in which case connections are opened right away
+        pool = self.config['pool']
+        if pool.get('warm'):
+            self.transport.warm(pool['warm'])
+        if pool.get('keepalive'):
+            self.transport.keepalive(pool['keepalive'],
+                                     max(pool.get('warm', 0), 1))
+
+    @property
+    def transport(self):
+        """The transport shared by all subsystems, and so one connection
+        pool
         """
-        Get the current configuration or set it if a new config object is
-        given
-        :return:
+        if self._transport is None:
+            with self._lock:
+                if self._transport is None:
+                    self._transport = create_transport(auth=self.auth,
+                                                       config=self.config,
+                                                       adapter=self._adapter,
+                                                       hedger=self._hedger)
+        return self._transport
+
+    def _subsystem(self, name, build):
+        subsystem = self._subsystems.get(name)
+        if subsystem is None:
+            with self._lock:
+                subsystem = self._subsystems.get(name)
+                if subsystem is None:
+                    subsystem = build()
+                    profiler = self.transport.profiler
+                    if profiler is not None:
+                        from pybble.profile import ProfiledSubsystem
+                        subsystem = ProfiledSubsystem(name, subsystem,
+                                                      profiler)
+                    self._subsystems[name] = subsystem
+        return subsystem
+
+    @property
+    def process(self):
+        """The process API, see pybble.process.RubbleProcess"""
+        def build():
+            from pybble.process import RubbleProcess
+            return RubbleProcess(auth=self.auth, config=self.config,
+                                 transport=self.transport)
+        return self._subsystem('process', build)
+
+    @property
+    def file(self):
+        """The file API, see pybble.file.RubbleFile"""
+        def build():
+            from pybble.file import RubbleFile
+            return RubbleFile(auth=self.auth, config=self.config,
+                              transport=self.transport)
+        return self._subsystem('file', build)
+
+    @property
+    def babylon(self):
+        """The babylon API, see pybble.babylon.Babylon"""
+        def build():
+            from pybble.babylon import Babylon
+            return Babylon(auth=self.auth, config=self.config,
+                           transport=self.transport)
+        return self._subsystem('babylon', build)
+
+    @property
+    def channel(self):
+        """The channel alias API, see pybble.channel.RubbleChannel"""
+        def build():
+            from pybble.channel import RubbleChannel
+            return RubbleChannel(config=self.config, transport=self.transport)
+        return self._subsystem('channel', build)
+
+    @property
+    def profiler(self):
+        """The pybble.profile.Profiler of the client, None unless the
+        "profile" config option is enabled
         """
-        if config:
-            self.config = self.config.update(config)
-            return self.config
-        else:
-            return self.config
+        return self.transport.profiler
+
+    @property
+    def config(self):
+        """The client's configuration, a read-only
+        pybble.config.ClientConfig. To change the configuration create a new
+        Client.
+        """
+        return self._config
+
+    def fan_out(self, operation, items, **kwargs):
+        """Run a bulk operation on a pool of worker processes, each with its
+        own Client and connection pool, so that encoding and decoding scale
+        with the number of cores. See pybble.fanout.fan_out.
+
+        Examples
+        --------
+
+            messages = ((terms, pid) for pid, terms in outgoing)
+            for index, result, error in client.fan_out('process.send',
+                                                       messages):
+                ...
+        """
+        from pybble.fanout import fan_out
+
+        key, password = self.auth
+        return fan_out(key, password, self.config.as_dict(), operation,
+                       items, **kwargs)
+
+    def deploy(self, path, rules, **kwargs):
+        """Upload the rule file at path and update every process that uses
+        it, with rollback on failure. See pybble.deploy.Deployment for the
+        keyword arguments.
+
+        Returns
+        -------
+        deployment: pybble.deploy.Deployment
+            Call deployment.run() to deploy.
+        """
+        from pybble.deploy import Deployment
+
+        return Deployment(self.file, self.process, path, rules, **kwargs)
+
+    def close(self):
+        """Close the transport, if it has been created, see
+        pybble.transport.Transport.close
+        """
+        with self._lock:
+            if self._transport is not None:
+                self._transport.close()
 
     def domain_info(self):
         """Returns a JSON object that contains some information about the
@@ -119,10 +255,9 @@ class Client:
         to an account named acme. Then the response from this call
         will be {"domain":"acme","apikey":"Fv32O6HN9Abz"}.
         """
-        url = urljoin(self.config['url']['api'], 'domaininfo')
-        request = requests.get(url,
-                               auth=self.auth,
-                               **self.config['default_request_kwargs'])
+        url = self.config.endpoint('domaininfo')
+        request = self.transport.get(url,
+                                     **self.config['default_request_kwargs'])
 
         if request.ok:
             return request.json()
@@ -0,0 +1,103 @@
+"""Single-flight coalescing of identical concurrent requests.
+
+When several threads ask for the same idempotent resource at the same time
+only the first of them (the leader) actually makes the HTTP request, the
+others wait for it to finish and receive the same parsed result, or the same
+exception.
+"""
+import threading
+
+
+class _Call:
+    """A request that is currently in flight"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapse identical concurrent calls into a single call.
+
+    Examples
+    --------
+
+        flight = SingleFlight()
+        flight.do(('process', '4711'), fetch, '4711')
+
+    Every caller that passes the same key while a call with that key is in
+    flight shares the leader's result. Note: the shared result is the very
+    same object for every caller, treat it as read-only.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self.calls = 0
+        self.collapsed = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        """Call fn(*args, **kwargs) unless a call for key is already in
+        flight, in which case wait for that call and return its result.
+
+        Parameters
+        ----------
+
+        key: hashable
+            Identifies the request, calls with equal keys are coalesced.
+
+        fn: callable
+            Performs the request.
+
+        Returns
+        -------
+        result:
+            Whatever fn returned for the leading call.
+        """
+        with self._lock:
+            self.calls += 1
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[key] = _Call()
+            else:
+                self.collapsed += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.done.set()
+
+        return call.result
+
+    def stats(self):
+        """Return a dict of metrics: the total number of calls, how many
+        of them were collapsed into another call and the number of calls
+        currently in flight.
+        """
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'collapsed': self.collapsed,
+                'in_flight': len(self._in_flight),
+            }
+
+
+def request_key(endpoint, *args, **kwargs):
+    """Build a coalescing key from an endpoint name and the request
+    arguments. Keyword arguments are sorted so that their order does not
+    matter.
+    """
+    return (endpoint, repr(args), repr(sorted(kwargs.items())))
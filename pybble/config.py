@@ -1,4 +1,6 @@
 import os
+from collections.abc import Mapping
+from types import MappingProxyType
 from urllib.parse import urljoin
 
 from pybble import setup_params
@@ -9,7 +11,8 @@ from pybble import setup_params
 
 # URLs
 ROOT_URL = os.environ.get("RUBBLE_SERVER_URL", "https://rubble2.labs.rubble.tech/")
-API_URL = urljoin(ROOT_URL, "rubble/service/")
+API_PATH = "rubble/service/"
+API_URL = urljoin(ROOT_URL, API_PATH)
 
 config = {
     "url": {
@@ -22,5 +25,168 @@ config = {
             "user-agent": "pybble {}".format(setup_params['version']),
             "content-type": "application/json",
         }
-    }
-}
\ No newline at end of file
+    },
+    # Share one in-flight HTTP request between concurrent identical reads
+    # (process.get, file.read)
+    "coalesce_reads": True,
+    # Compression of request bodies and responses, see
+    # pybble.transport.Transport
+    "compression": {
+        "request": None,
+        "threshold": 1024,
+        "level": 6,
+        "response": True,
+    },
+    # The connection pool shared by every thread using a Client, see
+    # pybble.transport.Transport
+    "pool": {
+        "hosts": 10,
+        "maxsize": 64,
+        "block": False,
+        "warm": 0,
+        "keepalive": None,
+    },
+    # Duplicate slow idempotent requests, see pybble.hedge.Hedger
+    "hedging": {
+        "enabled": False,
+        "percentile": 95,
+        "min_delay": 0.005,
+        "warmup": 20,
+        "budget": 0.05,
+        "urls": [],
+        "calls": False,
+    },
+    # Time the phases of every request, see pybble.profile
+    "profile": {
+        "enabled": False,
+    },
+}
+
+# Endpoints whose URLs are resolved once per ClientConfig
+ENDPOINTS = (
+    'babylon-translate', 'call', 'chanlist', 'chanupdate', 'cluster-probe',
+    'domaininfo', 'file/', 'process', 'processcreate', 'processlist',
+    'processupdate', 'send',
+)
+
+
+def merge(base, overrides):
+    """Deep merge two config dicts into a new dict, without modifying
+    either of them
+    """
+    merged = dict(base)
+    for key, value in overrides.items():
+        if isinstance(value, Mapping) and isinstance(merged.get(key), Mapping):
+            merged[key] = merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def freeze(value):
+    """Return a read-only deep copy of a config value"""
+    if isinstance(value, Mapping):
+        return MappingProxyType({key: freeze(item)
+                                 for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value):
+    """Return a plain, mutable deep copy of a frozen config value"""
+    if isinstance(value, Mapping):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+    return value
+
+
+class ClientConfig(Mapping):
+    """The immutable configuration of a Client.
+
+    The config the user passes in is merged over the defaults above. The
+    result is frozen, so it can be shared by any number of threads, and the
+    endpoint URLs and the request arguments for every content-type are
+    computed once up front instead of on every request.
+
+    It's a read-only mapping, so config['url']['api'] and
+    **config['default_request_kwargs'] work as they do on the dict.
+    """
+
+    def __init__(self, overrides=None):
+        overrides = overrides or {}
+
+        # Overriding the root URL moves the API along with it. The
+        # boilerplate calls the root URL "base".
+        url = overrides.get('url', {})
+        root = url.get('root', url.get('base'))
+        if root and 'api' not in url:
+            overrides = merge(overrides, {'url': {
+                'root': root, 'api': urljoin(root, API_PATH)}})
+
+        self._data = freeze(merge(config, overrides))
+
+        api = self._data['url']['api']
+        self.api_url = api
+        self._endpoints = {name: urljoin(api, name) for name in ENDPOINTS}
+        self._request_kwargs = {}
+        self.request_kwargs = self._data['default_request_kwargs']
+        for content_type in ('application/json', 'application/octet-stream',
+                             'text/plain'):
+            self._request_kwargs[content_type] = self._with_content_type(
+                content_type)
+
+    @classmethod
+    def of(cls, value):
+        """Return value if it's a ClientConfig already, otherwise build one
+        from the dict
+        """
+        if isinstance(value, cls):
+            return value
+        return cls(value)
+
+    def _with_content_type(self, content_type):
+        kwargs = dict(self.request_kwargs)
+        headers = dict(kwargs.get('headers', {}))
+        headers['content-type'] = content_type
+        kwargs['headers'] = MappingProxyType(headers)
+        return MappingProxyType(kwargs)
+
+    def endpoint(self, name):
+        """The URL of an API endpoint, e.g. endpoint('processlist')"""
+        url = self._endpoints.get(name)
+        if url is None:
+            url = urljoin(self.api_url, name)
+        return url
+
+    def file_url(self, path):
+        """The URL of a file in the repository"""
+        if path.startswith('/') or '..' in path or ':' in path:
+            return urljoin(self.api_url, 'file/' + path)
+        return self._endpoints['file/'] + path
+
+    def request_kwargs_for(self, content_type):
+        """The default request arguments with the given content-type
+        header
+        """
+        kwargs = self._request_kwargs.get(content_type)
+        if kwargs is None:
+            kwargs = self._with_content_type(content_type)
+        return kwargs
+
+    def as_dict(self):
+        """A plain, mutable copy of the configuration"""
+        return thaw(self._data)
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return "<ClientConfig api={}>".format(self.api_url)
@@ -0,0 +1,253 @@
+"""Rolling out a new version of a rule file.
+
+Rubble processes load their rules from the rule file their rulesref points
+to. A Deployment uploads the new rule file, finds every process whose
+rulesref refers to it (or to the rule files it replaces) and updates them
+concurrently, so that they reload their rules. If an update fails, the rule
+file and the processes updated so far are put back the way they were.
+
+The update API has no conditional form, so a process is read and then
+updated with the state that was read: messages a process handles between
+the two are lost. Deploy while the processes are quiet, see
+Deployment.repoint.
+"""
+import threading
+
+from pybble.batch import BatchStats, RateLimiter, bounded_map
+from pybble.error import RubbleServerException, status_code
+
+
+def normalize_rulesref(rulesref):
+    """file:///PATH is equivalent to file:/PATH"""
+    if rulesref.startswith('file:///'):
+        return 'file:/' + rulesref[len('file:///'):]
+    return rulesref
+
+
+class DeployReport(BatchStats):
+    """The outcome of Deployment.run: throughput counters of the process
+    updates, plus
+
+    stage: "upload", "discover", "update", "rollback" or "done"
+    found: pids of the processes that refer to the rule file
+    updated: pids that were updated, and not rolled back
+    failures: (pid, exception) tuples of the failed updates
+    rolled_back: whether the deployment was rolled back
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.stage = 'upload'
+        self.found = []
+        self.updated = []
+        self.failures = []
+        self.rolled_back = False
+
+    @property
+    def ok(self):
+        return not self.failures and not self.rolled_back
+
+
+class Deployment:
+    """Upload a rule file and update every process that uses it.
+
+    Examples
+    --------
+
+        deployment = client.deploy('orders.rubble', rules, rate=50,
+                                   progress=print)
+        report = deployment.run()
+        if not report.ok:
+            print(report.failures)
+
+    Parameters
+    ----------
+
+    file: RubbleFile
+        Used to upload the rule file.
+
+    process: RubbleProcess
+        Used to find and update the processes.
+
+    path: str
+        The path of the rule file, processes are pointed at file:/path.
+
+    rules: str or bytes
+        The new rule file.
+
+    replaces: iterable, optional
+        rulesrefs of other rule files whose processes should be pointed at
+        the new one, e.g. ["file:/orders-v1.rubble"]. Processes that already
+        use file:/path are always updated so that they reload it.
+
+    workers: int, optional
+        Number of concurrent lookups and updates.
+
+    rate: float, optional
+        Maximum number of process updates per second.
+
+    page_size: int, optional
+        Number of processes per processlist call.
+
+    rollback: bool, optional
+        Restore the previous rule file and rulesrefs if any update fails.
+        Otherwise the failures are only reported.
+
+    progress: callable, optional
+        Called with the DeployReport whenever a process has been updated or
+        has failed to update, and when the stage changes.
+    """
+
+    def __init__(self, file, process, path, rules, replaces=(), workers=8,
+                 rate=None, page_size=1000, rollback=True, progress=None):
+        self.file = file
+        self.process = process
+        self.path = path
+        self.rules = rules
+        self.rulesref = 'file:/' + path.lstrip('/')
+        self.match = {self.rulesref}
+        self.match.update(normalize_rulesref(ref) for ref in replaces)
+        self.workers = workers
+        self.limiter = RateLimiter(rate)
+        self.page_size = page_size
+        self.rollback = rollback
+        self.progress = progress
+        self.report = DeployReport()
+        self.previous_rules = None
+        # the rulesref each updated process had before
+        self.previous_refs = {}
+        self._lock = threading.Lock()
+
+    def _stage(self, stage):
+        self.report.stage = stage
+        if self.progress is not None:
+            self.progress(self.report)
+
+    def run(self):
+        """Deploy, see Deployment
+
+        Returns
+        -------
+        report: DeployReport
+            Raises RubbleServerException, before changing anything, if the
+            current rule file exists but can't be read.
+        """
+        report = self.report
+        self._stage('upload')
+        try:
+            self.previous_rules = self.file.read(self.path)
+        except RubbleServerException as e:
+            # only a missing rule file is new, undo deletes it. Otherwise
+            # the deployment couldn't be undone, so it isn't started.
+            if status_code(e) != 404:
+                raise
+            self.previous_rules = None
+        self.file.write(self.path, self.rules)
+
+        self._stage('discover')
+        report.found = [pid for pid, ref in self.find()]
+
+        self._stage('update')
+        results = bounded_map(self._update, report.found,
+                              workers=self.workers, stats=report)
+        try:
+            for pid, result, error in results:
+                if error is not None:
+                    report.failures.append((pid, error))
+                if self.progress is not None:
+                    self.progress(report)
+                if error is not None and self.rollback:
+                    break
+        finally:
+            # wait for the updates in flight
+            results.close()
+
+        if report.failures and self.rollback:
+            self._stage('rollback')
+            self.undo()
+            report.rolled_back = True
+
+        report.stop()
+        self._stage('done')
+        return report
+
+    def find(self):
+        """Find the processes that use the rule file, or one that it
+        replaces
+
+        Returns
+        -------
+        found: generator
+            Yields (pid, rulesref) tuples.
+        """
+        pids = (item['pid']
+                for page in self.process.list_pages(page_size=self.page_size)
+                for item in page
+                if item.get('type', 'rules') == 'rules')
+
+        def rulesref(pid):
+            # only the rulesref is needed, don't decode the facts
+            return self.process.get(pid, prettyprint=False,
+                                    lazy=True).scalar('rulesref')
+
+        for pid, ref, error in bounded_map(rulesref, pids,
+                                           workers=self.workers):
+            # processes deleted meanwhile are skipped
+            if error is None and ref is not None \
+                    and normalize_rulesref(ref) in self.match:
+                yield pid, ref
+
+    def repoint(self, pid, rulesref):
+        """Update a process to rulesref, keeping its current state. The
+        update would reset facts, factsformat and trapstate if they weren't
+        passed, so they are read first.
+
+        Reading and updating isn't atomic: if the process handles a message
+        in between, the update overwrites the facts it derived. Processes
+        being deployed to shouldn't receive messages meanwhile, e.g. pause
+        their senders until the deployment is done.
+
+        Returns
+        -------
+        previous: str
+            The rulesref the process had.
+        """
+        content = self.process.get(pid, prettyprint=False)['content']
+        state = {key: content[key]
+                 for key in ('facts', 'factsformat', 'trapstate')
+                 if content.get(key) is not None}
+        self.process.update(rulesref, pid, **state)
+        return content['rulesref']
+
+    def _update(self, pid):
+        self.limiter.acquire()
+        previous = self.repoint(pid, self.rulesref)
+        # recorded here rather than from the results, which are dropped
+        # for updates still in flight when the deployment stops
+        with self._lock:
+            self.previous_refs[pid] = previous
+            self.report.updated.append(pid)
+
+    def undo(self):
+        """Restore the previous rule file and point the updated processes
+        back at their previous rule files. Processes that fail to roll back
+        are added to the report's failures.
+        """
+        if self.previous_rules is None:
+            self.file.delete(self.path)
+        else:
+            self.file.write(self.path, self.previous_rules)
+
+        def restore(pid):
+            self.limiter.acquire()
+            self.repoint(pid, self.previous_refs[pid])
+
+        restored = set()
+        for pid, result, error in bounded_map(restore, self.report.updated,
+                                              workers=self.workers):
+            if error is None:
+                restored.add(pid)
+            else:
+                self.report.failures.append((pid, error))
+        self.report.updated = [pid for pid in self.report.updated
+                               if pid not in restored]
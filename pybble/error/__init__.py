@@ -15,3 +15,18 @@ def error_string_from_request(request):
         status_code=request.status_code,
         reason=request.reason,
     )
+
+
+def status_code(exception):
+    """
+    The HTTP status code of a RubbleServerException raised with the string
+    from error_string_from_request, None for any other exception
+    :param exception:
+    :type exception:
+        :class:`Exception`
+    :return:
+    """
+    if not isinstance(exception, RubbleServerException):
+        return None
+    status = str(exception).split(' ', 1)[0]
+    return int(status) if status.isdigit() else None
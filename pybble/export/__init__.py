@@ -0,0 +1,280 @@
+"""Columnar export of the process list.
+
+RubbleProcess.list returns a dict per process, several hundred bytes each.
+For analytics over millions of processes ProcessColumns stores the listing
+as columns instead: pids and modtimes in compact integer arrays, domains and
+types as small integer codes into a table of the distinct values. Pages are
+scanned with pybble.response.LazyResponse, so no dicts are built while
+exporting either.
+
+NumPy is used for filtering when it is installed, and the columns can be
+converted to NumPy arrays or, when pyarrow is installed, to an Arrow table
+or a Parquet file.
+"""
+import importlib.util
+import itertools
+import re
+from array import array
+
+from pybble import time
+from pybble.error import RubbleServerException
+
+COLUMNS = ('pid', 'modtime', 'domain', 'type')
+
+# The values of properties missing from a processlist item, every item has a
+# pid
+FILL = {'modtime': 0, 'domain': '', 'type': 'rules'}
+
+# The start of an object in an array, occurs at least once per item
+_ITEM = re.compile(rb'[\[,]\s*\{')
+
+
+def numpy_available():
+    """Whether NumPy is installed, without importing it"""
+    return importlib.util.find_spec('numpy') is not None
+
+
+def _epoch(when):
+    """Milliseconds since the epoch of a datetime or int, None stays None"""
+    if when is None or isinstance(when, int):
+        return when
+    return time.datetime_to_epoch(when)
+
+
+class Dictionary:
+    """A column of repetitive strings, stored as codes into a table of the
+    distinct values
+    """
+
+    def __init__(self):
+        self.values = []
+        self.codes = array('i')
+        self._index = {}
+
+    def extend(self, values):
+        index = self._index
+        for value in values:
+            code = index.get(value)
+            if code is None:
+                code = index[value] = len(self.values)
+                self.values.append(value)
+            self.codes.append(code)
+
+    def __getitem__(self, i):
+        return self.values[self.codes[i]]
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __iter__(self):
+        values = self.values
+        return (values[code] for code in self.codes)
+
+
+class ProcessColumns:
+    """The process list as columns: pid, modtime, domain and type
+
+    Examples
+    --------
+
+        columns = client.process.export(since=datetime(2020, 1, 1))
+        recent = columns.where_modified(since=cutoff)
+        len(recent), recent.pid[:10]
+        frame = recent.to_numpy()          # dict of NumPy arrays
+        recent.to_parquet('processes.parquet')
+    """
+
+    def __init__(self):
+        self.pid = array('q')
+        self.modtime = array('q')
+        self.domain = Dictionary()
+        self.type = Dictionary()
+
+    def extend(self, pids, modtimes, domains, types):
+        self.pid.extend(int(pid) for pid in pids)
+        self.modtime.extend(modtimes)
+        self.domain.extend(domains)
+        self.type.extend(types)
+
+    def __len__(self):
+        return len(self.pid)
+
+    def rows(self):
+        """Iterate over (pid, modtime, domain, type) tuples"""
+        return zip(self.pid, self.modtime, self.domain, self.type)
+
+    def where_modified(self, since=None, before=None):
+        """The processes modified at or after since and before before
+
+        Parameters
+        ----------
+
+        since: datetime or int, optional
+            In milliseconds since the epoch if an int.
+
+        before: datetime or int, optional
+
+        Returns
+        -------
+        columns: ProcessColumns
+        """
+        since, before = _epoch(since), _epoch(before)
+        if numpy_available():
+            import numpy
+
+            modtime = numpy.frombuffer(self.modtime, dtype=numpy.int64)
+            mask = numpy.ones(len(modtime), dtype=bool)
+            if since is not None:
+                mask &= modtime >= since
+            if before is not None:
+                mask &= modtime < before
+            return self.take(numpy.flatnonzero(mask))
+
+        return self.take([i for i, modtime in enumerate(self.modtime)
+                          if (since is None or modtime >= since)
+                          and (before is None or modtime < before)])
+
+    def take(self, indices):
+        """The rows at indices, a sequence or NumPy array, in that order"""
+        if hasattr(indices, 'dtype'):
+            import numpy
+
+            def select(column, dtype):
+                selected = array(column.typecode)
+                selected.frombytes(
+                    numpy.frombuffer(column, dtype=dtype)[indices].tobytes())
+                return selected
+        else:
+            def select(column, dtype):
+                return array(column.typecode, (column[i] for i in indices))
+
+        selected = ProcessColumns()
+        selected.pid = select(self.pid, 'int64')
+        selected.modtime = select(self.modtime, 'int64')
+        for name in ('domain', 'type'):
+            source, target = getattr(self, name), getattr(selected, name)
+            # share the table of values, the codes stay valid
+            target.values = source.values
+            target._index = source._index
+            target.codes = select(source.codes, 'int32')
+        return selected
+
+    def to_numpy(self):
+        """The columns as a dict of NumPy arrays, pid and modtime as
+        int64 and domain and type as arrays of str
+        """
+        import numpy
+
+        return {
+            'pid': numpy.frombuffer(self.pid, dtype=numpy.int64).copy(),
+            'modtime': numpy.frombuffer(self.modtime,
+                                        dtype=numpy.int64).copy(),
+            'domain': numpy.array(self.domain.values, dtype=str)[
+                numpy.frombuffer(self.domain.codes, dtype=numpy.int32)],
+            'type': numpy.array(self.type.values, dtype=str)[
+                numpy.frombuffer(self.type.codes, dtype=numpy.int32)],
+        }
+
+    def to_arrow(self):
+        """The columns as a pyarrow.Table, domain and type dictionary
+        encoded. Requires pyarrow.
+        """
+        if importlib.util.find_spec('pyarrow') is None:
+            raise ImportError("to_arrow requires the pyarrow package")
+        import pyarrow
+
+        def dictionary(column):
+            return pyarrow.DictionaryArray.from_arrays(
+                pyarrow.array(column.codes, type=pyarrow.int32()),
+                pyarrow.array(column.values, type=pyarrow.string()))
+
+        return pyarrow.table({
+            'pid': pyarrow.array(self.pid, type=pyarrow.int64()),
+            'modtime': pyarrow.array(self.modtime, type=pyarrow.int64()),
+            'domain': dictionary(self.domain),
+            'type': dictionary(self.type),
+        })
+
+    def to_parquet(self, path, **kwargs):
+        """Write the columns to a Parquet file, see pyarrow.parquet
+        .write_table for the keyword arguments. Requires pyarrow.
+        """
+        table = self.to_arrow()
+        import pyarrow.parquet
+
+        pyarrow.parquet.write_table(table, path, **kwargs)
+
+    def __repr__(self):
+        return "<ProcessColumns {} processes>".format(len(self))
+
+
+def page_columns(response):
+    """The columns of a processlist page, a LazyResponse
+
+    Returns
+    -------
+    columns: tuple
+        pids, modtimes, domains and types, as lists.
+    """
+    if response.has('error') and not response.has('result'):
+        raise RubbleServerException(response['error'])
+
+    # The scanned columns line up if each has a value for every item. Items
+    # are counted by scanning too, which can count more items than there
+    # are, but never fewer.
+    columns = tuple(response.column(name) for name in COLUMNS)
+    items = len(_ITEM.findall(response.raw))
+    if any(len(column) != items for column in columns):
+        # a property is missing somewhere, decode and fill it in
+        items = response['result']
+        if any('pid' not in item for item in items):
+            raise ValueError("processlist item without a pid")
+        columns = ([item['pid'] for item in items],) + tuple(
+            [item.get(name, FILL[name]) for item in items]
+            for name in COLUMNS[1:])
+    return columns
+
+
+def export(process, page_size=10000, pid_begin=0, since=None, before=None):
+    """Export the process list as columns, see RubbleProcess.export
+
+    Parameters
+    ----------
+
+    process: RubbleProcess
+
+    page_size: int, optional
+        Number of processes per processlist call.
+
+    pid_begin: int, optional
+        The lowest process ID to export.
+
+    since, before: datetime or int, optional
+        Only export processes modified in this range, see
+        ProcessColumns.where_modified.
+
+    Returns
+    -------
+    columns: ProcessColumns
+    """
+    since, before = _epoch(since), _epoch(before)
+    columns = ProcessColumns()
+
+    while True:
+        response = process.list(lazy=True, pidBegin=pid_begin,
+                                maxItems=page_size)
+        pids, modtimes, domains, types = page_columns(response)
+
+        if since is not None or before is not None:
+            keep = [(since is None or modtime >= since)
+                    and (before is None or modtime < before)
+                    for modtime in modtimes]
+            columns.extend(*(itertools.compress(column, keep)
+                             for column in (pids, modtimes, domains, types)))
+        else:
+            columns.extend(pids, modtimes, domains, types)
+
+        if len(pids) < page_size:
+            return columns
+
+        pid_begin = max(int(pid) for pid in pids) + 1
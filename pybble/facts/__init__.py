@@ -0,0 +1,216 @@
+"""Working with Rubble facts on the client.
+
+Facts come in two encodings, JSON-encoded Herbrand terms and native Rubble
+syntax (see Appendix A in the Client docstring):
+
+    ["f", ["g", "h"], ["i", "j", "k"]]      f(g(h),i(j,k));
+
+This module converts between the two and computes the difference between two
+fact sets, so that an update only has to ship what changed.
+"""
+import json
+import re
+
+
+ATOM = re.compile(r'^(?:[a-z][A-Za-z0-9_]*|-?[0-9]+(?:\.[0-9]+)?)$')
+TOKEN = re.compile(r'\s*(?:(?P<quoted>"(?:[^"\\]|\\.)*")'
+                   r'|(?P<name>[^\s(),;"]+)'
+                   r'|(?P<punct>[(),;]))')
+
+
+def to_native(term):
+    """Encode a JSON-encoded term in native Rubble syntax, without the
+    terminating semicolon.
+    """
+    if isinstance(term, list):
+        if len(term) == 1:
+            return to_native(term[0])
+        return '{}({})'.format(to_native(term[0]),
+                               ','.join(to_native(arg) for arg in term[1:]))
+
+    term = str(term)
+    if ATOM.match(term):
+        return term
+    return json.dumps(term)
+
+
+def parse_native(facts):
+    """Parse native Rubble facts into a list of JSON-encoded terms.
+
+    Only ground facts are supported, i.e. atoms, numbers, quoted strings and
+    compound terms. Anything else raises a ValueError.
+    """
+    tokens = []
+    position = 0
+    facts = facts.rstrip()
+    while position < len(facts):
+        match = TOKEN.match(facts, position)
+        if match is None:
+            raise ValueError("Can't parse facts at {!r}".format(
+                facts[position:position + 20]))
+        tokens.append((match.lastgroup, match.group(match.lastgroup)))
+        position = match.end()
+
+    terms = []
+    index = 0
+
+    def term(index):
+        kind, value = tokens[index]
+        if kind == 'quoted':
+            return json.loads(value), index + 1
+        if kind != 'name':
+            raise ValueError("Unexpected {!r} in facts".format(value))
+
+        index += 1
+        if index == len(tokens) or tokens[index][1] != '(':
+            return value, index
+
+        compound = [value]
+        while True:
+            arg, index = term(index + 1)
+            compound.append(arg)
+            if tokens[index][1] == ')':
+                return compound, index + 1
+            if tokens[index][1] != ',':
+                raise ValueError("Expected ',' or ')' in facts, got {!r}".format(
+                    tokens[index][1]))
+
+    try:
+        while index < len(tokens):
+            fact, index = term(index)
+            terms.append(fact)
+            if index < len(tokens):
+                if tokens[index][1] != ';':
+                    raise ValueError("Expected ';' in facts, got {!r}".format(
+                        tokens[index][1]))
+                index += 1
+    except IndexError:
+        raise ValueError("Unexpected end of facts")
+
+    return terms
+
+
+def fact_key(term):
+    """A hashable key for a JSON-encoded term. Leaves are compared as
+    strings, so "1" and 1 are the same fact, as they are in Rubble.
+    """
+    if isinstance(term, list):
+        if len(term) == 1:
+            return fact_key(term[0])
+        return tuple(fact_key(arg) for arg in term)
+    return str(term)
+
+
+def as_terms(facts):
+    """Return facts as a list of JSON-encoded terms, parsing native Rubble
+    facts if given a string
+    """
+    if isinstance(facts, str):
+        return parse_native(facts)
+    return list(facts)
+
+
+class FactDiff:
+    """The difference between two fact sets.
+
+    Attributes
+    ----------
+
+    added: list
+        JSON-encoded terms present in the new facts only.
+
+    removed: list
+        JSON-encoded terms present in the previous facts only.
+    """
+
+    def __init__(self, added, removed):
+        self.added = added
+        self.removed = removed
+
+    def __bool__(self):
+        return bool(self.added or self.removed)
+
+    def __len__(self):
+        return len(self.added) + len(self.removed)
+
+    def __repr__(self):
+        return "<FactDiff added={} removed={}>".format(len(self.added),
+                                                       len(self.removed))
+
+
+def diff(previous, new):
+    """Compute which facts were added and removed going from previous to
+    new. Either may be a list of JSON-encoded terms or a string of native
+    Rubble facts. Facts are treated as a set, so order and duplicates don't
+    matter.
+
+    Returns
+    -------
+    diff: FactDiff
+    """
+    previous = as_terms(previous)
+    new = as_terms(new)
+
+    previous_keys = set(fact_key(term) for term in previous)
+    new_keys = set(fact_key(term) for term in new)
+
+    added = []
+    for term in new:
+        key = fact_key(term)
+        if key not in previous_keys:
+            added.append(term)
+            previous_keys.add(key)
+
+    removed = []
+    for term in previous:
+        key = fact_key(term)
+        if key not in new_keys:
+            removed.append(term)
+            new_keys.add(key)
+
+    return FactDiff(added, removed)
+
+
+def encoded_size(value):
+    """Size in bytes of value as a JSON request body"""
+    return len(json.dumps(value).encode('utf-8'))
+
+
+class FactUpdate:
+    """The outcome of RubbleProcess.update_facts.
+
+    Attributes
+    ----------
+
+    path: str
+        How the update was applied: "noop" if nothing changed, "delta" if the
+        changes were sent as a message, "full" if the whole fact set was sent
+        with processupdate.
+
+    diff: FactDiff or None
+        The computed change, None if the facts couldn't be diffed.
+
+    bytes_full: int
+        Size of the full fact set as a request body.
+
+    bytes_sent: int
+        Size of what was actually sent.
+
+    response: dict or None
+        The response of the request that was made.
+    """
+
+    def __init__(self, path, diff, bytes_full, bytes_sent, response=None):
+        self.path = path
+        self.diff = diff
+        self.bytes_full = bytes_full
+        self.bytes_sent = bytes_sent
+        self.response = response
+
+    @property
+    def bytes_saved(self):
+        return self.bytes_full - self.bytes_sent
+
+    def __repr__(self):
+        return "<FactUpdate path={} bytes_sent={} bytes_saved={}>".format(
+            self.path, self.bytes_sent, self.bytes_saved)
@@ -0,0 +1,189 @@
+"""Fan bulk operations out over a pool of worker processes.
+
+Encoding Herbrand terms to JSON and decoding large responses is CPU bound,
+so under the GIL a single process tops out at one core however many threads
+send requests. fan_out shards the items of a bulk operation into chunks of
+roughly equal payload size and runs them on a process pool. Every worker
+process has its own Client, and so its own connection pool, and runs its
+chunk on a few threads to overlap network waits. Results are streamed back
+chunk by chunk as they complete.
+"""
+import itertools
+import json
+import os
+import pickle
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from pybble.batch import bounded_map
+
+
+# The Client of a worker process
+_client = None
+
+
+def _initialize(key, password, config):
+    global _client
+    from pybble.client import Client
+    _client = Client(key, password, config=config)
+
+
+def _run(operation, chunk, threads, kwargs):
+    """Run a chunk of (index, args) items in a worker process"""
+    subsystem, method = operation.split('.')
+    fn = getattr(getattr(_client, subsystem), method)
+
+    results = []
+    for (index, args), result, error in bounded_map(
+            lambda item: fn(*item[1], **kwargs), chunk, workers=threads):
+        results.append((index, result, _picklable(error)))
+    return results
+
+
+def _picklable(error):
+    """The error, or a RuntimeError describing it if it can't be sent
+    back to the parent process
+    """
+    if error is None:
+        return None
+    try:
+        pickle.dumps(error)
+    except Exception:
+        return RuntimeError(repr(error))
+    return error
+
+
+def _chunk_results(future, indices):
+    """The results of a chunk, or the chunk's failure as the error of each
+    of its items, given by index, e.g. if its results couldn't be pickled or
+    its worker process died
+    """
+    try:
+        return future.result()
+    except Exception as error:
+        return [(index, None, error) for index in indices]
+
+
+# Number of elements of a collection encoded to estimate its size
+SAMPLE = 8
+
+
+def estimate_size(args):
+    """A cheap estimate of the JSON-encoded size of an item's arguments, in
+    bytes. Of a list or dict only a sample of SAMPLE elements is encoded and
+    its size extrapolated, so that estimating costs a small fraction of
+    encoding the payload.
+    """
+    if not isinstance(args, tuple):
+        args = (args,)
+    return sum(_estimate(value) for value in args)
+
+
+def _estimate(value):
+    if isinstance(value, (str, bytes)):
+        return len(value) + 2
+    if isinstance(value, dict):
+        count = len(value)
+        sample = list(itertools.islice(value.items(), SAMPLE))
+    elif isinstance(value, (list, tuple)):
+        count = len(value)
+        # evenly spaced elements, the terms of a batch differ in size
+        sample = value[::max(1, count // SAMPLE)][:SAMPLE]
+    else:
+        return 8
+    if not sample:
+        return 2
+    encoded = len(json.dumps(sample, default=str, separators=(',', ':')))
+    return encoded * count // len(sample)
+
+
+def chunks(items, chunk_bytes, max_items, size):
+    """Group (index, args) items into lists of roughly chunk_bytes of
+    payload, and at most max_items items
+    """
+    chunk = []
+    chunk_size = 0
+    for index, args in items:
+        chunk.append((index, args))
+        chunk_size += size(args) if size is not None else 1
+        if chunk_size >= chunk_bytes or len(chunk) >= max_items:
+            yield chunk
+            chunk = []
+            chunk_size = 0
+    if chunk:
+        yield chunk
+
+
+def fan_out(key, password, config, operation, items, processes=None,
+            threads=4, chunk_bytes=1 << 20, max_items=1000,
+            size=estimate_size, **kwargs):
+    """Run a bulk operation on a pool of worker processes.
+
+    Parameters
+    ----------
+
+    key, password, config:
+        Used to create a Client in each worker process.
+
+    operation: str
+        The method to call, e.g. "process.send" or "process.get".
+
+    items: iterable
+        Tuples of positional arguments, one per call, e.g. (terms, pid) for
+        process.send. Consumed lazily.
+
+    processes: int, optional
+        Number of worker processes, defaults to the number of CPUs.
+
+    threads: int, optional
+        Number of concurrent requests per worker process.
+
+    chunk_bytes: int, optional
+        Target payload size of a chunk of work.
+
+    max_items: int, optional
+        Maximum number of items in a chunk.
+
+    size: callable, optional
+        Estimates the payload size of an item's arguments, e.g. len when
+        they are already serialized. None balances by number of items
+        instead. It runs in this process for every item, so it should be
+        much cheaper than encoding the item.
+
+    kwargs: optional
+        Keyword arguments for every call.
+
+    Returns
+    -------
+    results: generator
+        Yields (index, result, error) tuples, where index is the position of
+        the item in items, in completion order. If a whole chunk fails, e.g.
+        because a result can't be pickled or a worker process died, each of
+        its items is yielded with the chunk's error.
+    """
+    processes = processes or os.cpu_count() or 1
+    max_pending = processes * 2
+
+    with ProcessPoolExecutor(max_workers=processes, initializer=_initialize,
+                             initargs=(key, password, config)) as executor:
+        # future: the indices of its chunk's items
+        pending = {}
+        for chunk in chunks(enumerate(items), chunk_bytes, max_items, size):
+            if len(pending) >= max_pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from _chunk_results(future, pending.pop(future))
+
+            try:
+                future = executor.submit(_run, operation, chunk, threads,
+                                         kwargs)
+            except BrokenProcessPool as error:
+                yield from ((index, None, error) for index, _ in chunk)
+                continue
+            pending[future] = [index for index, _ in chunk]
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from _chunk_results(future, pending.pop(future))
@@ -1,16 +1,17 @@
-import requests
-import copy
-
+from pybble.coalesce import SingleFlight, request_key
+from pybble.config import ClientConfig
 from pybble.error import RubbleServerException, error_string_from_request
-from urllib.parse import urljoin
+from pybble.transport import Transport
 
 
 class RubbleFile:
 
-    def __init__(self, auth, config):
+    def __init__(self, auth, config, transport=None):
         self.auth = auth
-        self.config = config
+        self.config = ClientConfig.of(config)
+        self.transport = transport or Transport(auth, self.config)
         self.PROTOCOL_PREFIX = "file:/"
+        self.flight = SingleFlight()
 
     def read(self, path, **kwargs):
         """
@@ -23,17 +24,28 @@ class RubbleFile:
         Returns the _either_ the contents of the file. The content-type
         is always text/plain.
 
+        Concurrent reads of the same path share a single HTTP request unless
+        the config option coalesce_reads is false.
+
         :param path:
         :return:
         """
+        if not self.config.get('coalesce_reads', True):
+            return self._read(path, **kwargs)
+
+        key = request_key('file', path, **kwargs)
+        return self.flight.do(key, self._read, path, **kwargs)
+
+    def _read(self, path, **kwargs):
+        """Read a file, see RubbleFile.read"""
         params = {}
         params.update(kwargs)
 
-        url = urljoin(self.config['url']['api'], 'file/' + path)
-        request = requests.get(url,
-                               auth=self.auth,
-                               params=params,
-                               **self.config['default_request_kwargs'])
+        url = self.config.file_url(path)
+        request = self.transport.get(url,
+                                     params=params,
+                                     hedge=True,
+                                     **self.config['default_request_kwargs'])
 
         if request.ok:
 
@@ -65,11 +77,10 @@ class RubbleFile:
         params = {}
         params.update(kwargs)
 
-        url = urljoin(self.config['url']['api'], 'file/' + path)
-        request = requests.get(url,
-                               auth=self.auth,
-                               params=params,
-                               **self.config['default_request_kwargs'])
+        url = self.config.file_url(path)
+        request = self.transport.get(url,
+                                     params=params,
+                                     **self.config['default_request_kwargs'])
 
         if request.ok:
 
@@ -113,15 +124,13 @@ class RubbleFile:
         params = {}
         params.update(kwargs)
 
-        request_kwargs = copy.deepcopy(self.config['default_request_kwargs'])
-        request_kwargs['headers']['content-type'] = 'application/octet-stream'
+        request_kwargs = self.config.request_kwargs_for('application/octet-stream')
 
-        url = urljoin(self.config['url']['api'], 'file/' + path)
-        request = requests.put(url,
-                               auth=self.auth,
-                               data=data,
-                               params=params,
-                               **request_kwargs)
+        url = self.config.file_url(path)
+        request = self.transport.put(url,
+                                     data=data,
+                                     params=params,
+                                     **request_kwargs)
 
         if request.ok:
             return True
@@ -144,11 +153,10 @@ class RubbleFile:
         params = {}
         params.update(kwargs)
 
-        url = urljoin(self.config['url']['api'], 'file/' + path)
-        request = requests.delete(url,
-                               auth=self.auth,
-                               params=params,
-                               **self.config['default_request_kwargs'])
+        url = self.config.file_url(path)
+        request = self.transport.delete(url,
+                                        params=params,
+                                        **self.config['default_request_kwargs'])
 
         if request.ok:
                 return request
@@ -0,0 +1,278 @@
+"""Hedged requests, to cut the latency tail of idempotent requests.
+
+A hedged request is sent once, and if no response has arrived after a delay
+that most requests to the same endpoint finish within (a percentile of the
+recent latencies), sent again, to an alternate frontend when one is
+configured and otherwise on another pooled connection. Whichever response
+arrives first is used, the other one is discarded when it arrives.
+
+Duplicates cost the server work, so the number of hedges is capped at a
+fraction of all requests, the budget.
+"""
+import collections
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class LatencyTracker:
+    """The latencies of the most recent requests to one endpoint
+
+    Parameters
+    ----------
+
+    window: int
+        Number of latencies kept.
+
+    refresh: int
+        Percentiles are computed again after this many new latencies, and
+        otherwise served from a cache.
+    """
+
+    def __init__(self, window=1000, refresh=50):
+        self._lock = threading.Lock()
+        self._recent = collections.deque(maxlen=window)
+        self.refresh = refresh
+        self._percentiles = {}
+        self._recorded = 0
+
+    def record(self, seconds):
+        with self._lock:
+            self._recent.append(seconds)
+            self._recorded += 1
+            if self._recorded >= self.refresh:
+                self._percentiles.clear()
+                self._recorded = 0
+
+    def __len__(self):
+        return len(self._recent)
+
+    def percentile(self, p):
+        """The pth percentile of the recent latencies in seconds, None if
+        there are none
+        """
+        with self._lock:
+            value = self._percentiles.get(p)
+            if value is None and self._recent:
+                ordered = sorted(self._recent)
+                rank = min(len(ordered) - 1, int(len(ordered) * p / 100.0))
+                value = self._percentiles[p] = ordered[rank]
+            return value
+
+
+class HedgeStats:
+    """Hedging metrics for a Hedger.
+
+    requests: hedgeable requests made
+    hedged: requests that were sent a second time
+    wins: hedged requests answered first by the duplicate
+    denied: requests that were slow enough to hedge, but over budget
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hedged = 0
+        self.wins = 0
+        self.denied = 0
+
+    @property
+    def hedge_rate(self):
+        """Fraction of requests that were hedged"""
+        return self.hedged / self.requests if self.requests else 0.0
+
+    @property
+    def win_rate(self):
+        """Fraction of hedges that returned first"""
+        return self.wins / self.hedged if self.hedged else 0.0
+
+    def __repr__(self):
+        return ("<HedgeStats requests={} hedged={} wins={} denied={} "
+                "hedge_rate={:.3f} win_rate={:.3f}>").format(
+                    self.requests, self.hedged, self.wins, self.denied,
+                    self.hedge_rate, self.win_rate)
+
+
+class Hedger:
+    """Sends requests with a hedge, configured by the "hedging" config
+    option:
+
+        "hedging": {
+            "enabled": True,
+            # hedge when a request is slower than this percentile of the
+            # recent requests to the same endpoint
+            "percentile": 95,
+            # but never sooner than this many seconds
+            "min_delay": 0.005,
+            # requests to an endpoint before it is hedged at all
+            "warmup": 20,
+            # at most this fraction of requests are hedged
+            "budget": 0.05,
+            # root URLs of alternate frontends, hedges go to each in turn
+            "urls": ["https://frontend2.example.com/"],
+            # also hedge process calls, only if your rules are idempotent
+            "calls": False,
+        }
+
+    process.get and file.read are hedged when hedging is enabled.
+
+    Parameters
+    ----------
+
+    options: dict
+        The "hedging" config option.
+
+    root: str
+        The root URL that alternate URLs replace.
+
+    workers: int, optional
+        Number of threads that send requests which may be hedged. Requests
+        that can't be hedged, because their endpoint is still warming up or
+        the budget is spent, are sent on the calling thread, and so are all
+        requests once the hedger is closed.
+    """
+
+    def __init__(self, options, root, workers=128):
+        self.percentile = options.get('percentile', 95)
+        self.min_delay = options.get('min_delay', 0.005)
+        self.warmup = options.get('warmup', 20)
+        self.budget = options.get('budget', 0.05)
+        self.urls = list(options.get('urls', ()))
+        self.root = root
+        self.workers = workers
+        self.stats = HedgeStats()
+        self._trackers = {}
+        self._turn = 0
+        self._lock = threading.Lock()
+        self._executor = None
+        self._closed = False
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("Hedger is closed")
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers,
+                        thread_name_prefix='pybble-hedge')
+        return self._executor
+
+    def tracker(self, url):
+        """The LatencyTracker of the endpoint of url"""
+        endpoint = url.split('?', 1)[0]
+        tracker = self._trackers.get(endpoint)
+        if tracker is None:
+            with self._lock:
+                tracker = self._trackers.setdefault(endpoint,
+                                                    LatencyTracker())
+        return tracker
+
+    def delay(self, tracker):
+        """Seconds to wait before hedging, None to not hedge"""
+        # there's no percentile without a latency, even with no warmup
+        if len(tracker) < max(1, self.warmup):
+            return None
+        return max(self.min_delay, tracker.percentile(self.percentile))
+
+    def alternate(self, url):
+        """The URL to send a hedge of url to"""
+        if not self.urls or not url.startswith(self.root):
+            return url
+        with self._lock:
+            self._turn += 1
+            root = self.urls[self._turn % len(self.urls)]
+        return root + url[len(self.root):]
+
+    def _affordable(self):
+        """Whether the budget has room for another hedge"""
+        with self.stats._lock:
+            return self.stats.hedged + 1 <= self.budget * self.stats.requests
+
+    def _allow(self):
+        with self.stats._lock:
+            if self.stats.hedged + 1 > self.budget * self.stats.requests:
+                self.stats.denied += 1
+                return False
+            self.stats.hedged += 1
+            return True
+
+    def send(self, send, url):
+        """Call send(url), and send(alternate url) as well if that takes
+        too long. Return the first response, or raise the exception of the
+        primary if both fail.
+
+        Parameters
+        ----------
+
+        send: callable
+            Makes the request to the URL passed to it, returns a response.
+
+        url: str
+        """
+        tracker = self.tracker(url)
+        delay = self.delay(tracker)
+        with self.stats._lock:
+            self.stats.requests += 1
+
+        started = time.monotonic()
+        primary = None
+        if delay is not None and not self._closed and self._affordable():
+            try:
+                primary = self.executor.submit(send, url)
+            except RuntimeError:
+                # closed meanwhile
+                pass
+
+        if primary is None:
+            response = send(url)
+            elapsed = time.monotonic() - started
+            tracker.record(elapsed)
+            if delay is not None and elapsed > delay:
+                with self.stats._lock:
+                    self.stats.denied += 1
+            return response
+
+        done, _ = wait([primary], timeout=delay)
+        hedge = None
+        if not done and self._allow():
+            try:
+                hedge = self.executor.submit(send, self.alternate(url))
+            except RuntimeError:
+                # closed meanwhile
+                pass
+        if hedge is None:
+            response = primary.result()
+            tracker.record(time.monotonic() - started)
+            return response
+
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    tracker.record(time.monotonic() - started)
+                    if future is hedge:
+                        with self.stats._lock:
+                            self.stats.wins += 1
+                    for loser in pending:
+                        loser.add_done_callback(_discard)
+                    return future.result()
+        # both failed
+        return primary.result()
+
+    def close(self):
+        """Stop the hedging threads, requests sent from now on are sent
+        on the calling thread without a hedge
+        """
+        with self._lock:
+            self._closed = True
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+
+
+def _discard(future):
+    """Release the connection of a response nobody is waiting for"""
+    if future.exception() is None:
+        future.result().close()
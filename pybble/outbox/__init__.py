@@ -0,0 +1,317 @@
+"""A durable outbox for messages sent to Rubble processes.
+
+Outbox.send appends the message to a local log file and returns at once.
+Background flusher threads deliver the messages with RubbleProcess.send,
+concurrently across channels but strictly in order within a channel,
+retrying failed deliveries with exponential backoff. Delivered messages are
+recorded in an acknowledgement file. Messages that were logged but not
+acknowledged when the process stopped, or crashed, are delivered again when
+the outbox is reopened, so delivery is at-least-once. Messages the server
+refuses with a 4xx status are given up on at once, they would block their
+channel forever.
+
+    outbox = client.process.outbox('messages')
+    outbox.send([["clicked", "button1"]], pid)
+    ...
+    outbox.close()
+"""
+import collections
+import datetime
+import json
+import os
+import threading
+
+from pybble import time as rubble_time
+from pybble.batch import trim_partial_line
+from pybble.error import status_code
+
+
+class OutboxStats:
+    """Counters for an Outbox"""
+
+    def __init__(self):
+        self.enqueued = 0
+        self.delivered = 0
+        self.retries = 0
+        self.failed = 0
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+# 4xx statuses that are worth retrying
+RETRYABLE = (408, 429)
+
+
+def read_lines(path):
+    """Yield the decoded JSON lines of a file, ignoring lines that can't be
+    decoded
+    """
+    try:
+        with open(path, encoding='utf-8') as log_file:
+            for line in log_file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        return
+
+
+class Outbox:
+    """A file-backed queue of messages delivered in the background.
+
+    Parameters
+    ----------
+
+    process: RubbleProcess
+        Used to deliver the messages.
+
+    path: str
+        Path prefix of the PATH.log and PATH.acks files.
+
+    workers: int, optional
+        Number of flusher threads, i.e. channels delivered to concurrently.
+
+    fsync: bool, optional
+        fsync the log on every send, and the acknowledgements on every
+        delivery. Without it a message survives a crash of the Python
+        process, but not of the machine. Costs a few milliseconds per send.
+
+    max_attempts: int, optional
+        Give up on a message after this many failed deliveries, None retries
+        forever. Messages refused with a 4xx status other than 408 and 429
+        are given up on at once. Messages given up on are kept in
+        self.failures.
+
+    backoff: float, optional
+        Seconds to wait after the first failed delivery, doubled on every
+        further failure up to max_backoff.
+
+    max_backoff: float, optional
+    """
+
+    def __init__(self, process, path, workers=8, fsync=False,
+                 max_attempts=None, backoff=0.5, max_backoff=60.0):
+        self.process = process
+        self.log_path = path + '.log'
+        self.acks_path = path + '.acks'
+        self.fsync = fsync
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.stats = OutboxStats()
+        self.failures = []
+
+        self._condition = threading.Condition()
+        self._queues = {}
+        self._ready = collections.deque()
+        self._busy = set()
+        self._closed = False
+        self._stopped = threading.Event()
+        self._next_id = 0
+
+        self._recover()
+
+        self._log = open(self.log_path, 'a', encoding='utf-8')
+        self._acks = open(self.acks_path, 'a', encoding='utf-8')
+
+        self._threads = [threading.Thread(target=self._flush_loop,
+                                          name='pybble-outbox-{}'.format(i),
+                                          daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def _recover(self):
+        """Queue the logged messages that weren't acknowledged"""
+        # a crash can leave a partial last line, which the next line
+        # appended would run into
+        trim_partial_line(self.log_path)
+        trim_partial_line(self.acks_path)
+
+        acked = set(read_lines(self.acks_path))
+        for message in read_lines(self.log_path):
+            if 'next_id' in message:
+                # written by close, the IDs of the messages compacted away
+                self._next_id = max(self._next_id, message['next_id'])
+                continue
+            self._next_id = max(self._next_id, message['id'] + 1)
+            if message['id'] not in acked:
+                self._queue(message)
+
+    def _queue(self, message):
+        queue = self._queues.setdefault(message['channel'],
+                                        collections.deque())
+        queue.append(message)
+        if len(queue) == 1 and message['channel'] not in self._busy:
+            self._ready.append(message['channel'])
+
+    def send(self, terms, pid=None, channel=None, **kwargs):
+        """Enqueue a message, see RubbleProcess.send for the arguments.
+        Give either a pid or a channel alias.
+
+        Returns
+        -------
+        id: int
+            The message's ID in the outbox.
+        """
+        if (pid is None) == (channel is None):
+            raise ValueError("Give either a pid or a channel, not both")
+
+        if isinstance(kwargs.get('when'), datetime.datetime):
+            kwargs['when'] = rubble_time.datetime_to_epoch(kwargs['when'])
+
+        with self._condition:
+            if self._closed:
+                raise ValueError("The outbox is closed")
+
+            message = {
+                'id': self._next_id,
+                'channel': channel if channel is not None else 'pid({})'.format(pid),
+                'pid': pid,
+                'terms': terms,
+                'kwargs': kwargs,
+            }
+            self._next_id += 1
+
+            self._log.write(json.dumps(message, separators=(',', ':')) + '\n')
+            self._log.flush()
+            if self.fsync:
+                os.fsync(self._log.fileno())
+
+            self.stats.enqueued += 1
+            self._queue(message)
+            self._condition.notify()
+
+        return message['id']
+
+    def _flush_loop(self):
+        while True:
+            with self._condition:
+                while not self._ready and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                channel = self._ready.popleft()
+                self._busy.add(channel)
+                message = self._queues[channel][0]
+
+            delivered = self._deliver(message)
+
+            with self._condition:
+                if delivered:
+                    self._acks.write('{}\n'.format(message['id']))
+                    self._acks.flush()
+                    if self.fsync:
+                        os.fsync(self._acks.fileno())
+                    queue = self._queues[channel]
+                    queue.popleft()
+                    if not queue:
+                        del self._queues[channel]
+                self._busy.discard(channel)
+                if channel in self._queues:
+                    self._ready.append(channel)
+                self._condition.notify_all()
+
+    def _deliver(self, message):
+        """Deliver one message, retrying with backoff. Returns whether the
+        message is done with, delivered or given up on.
+        """
+        delay = self.backoff
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                if message['pid'] is not None:
+                    response = self.process.send(message['terms'],
+                                                 message['pid'],
+                                                 **message['kwargs'])
+                else:
+                    response = self.process.send(message['terms'], None,
+                                                 channel=message['channel'],
+                                                 **message['kwargs'])
+            except Exception as e:
+                status = status_code(e)
+                refused = (status is not None and 400 <= status < 500
+                           and status not in RETRYABLE)
+                if refused or (self.max_attempts is not None
+                               and attempts >= self.max_attempts):
+                    self._give_up(message, e)
+                    return True
+                with self._condition:
+                    self.stats.retries += 1
+                # close() interrupts the wait, the message stays in the log
+                if self._stopped.wait(delay):
+                    return False
+                delay = min(delay * 2, self.max_backoff)
+                continue
+
+            if 'error' in response:
+                # the server refused the message, retrying won't help
+                self._give_up(message, response['error'])
+            else:
+                with self._condition:
+                    self.stats.delivered += 1
+            return True
+
+    def _give_up(self, message, error):
+        with self._condition:
+            self.stats.failed += 1
+            self.failures.append((message, error))
+
+    @property
+    def pending(self):
+        """Number of messages not yet delivered"""
+        with self._condition:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def flush(self, timeout=None):
+        """Wait until every message has been delivered. Returns False if
+        the timeout expired first.
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._queues, timeout)
+
+    def close(self, timeout=None):
+        """Stop accepting messages, wait up to timeout for the pending ones
+        to be delivered and stop the flushers. Undelivered messages stay in
+        the log and are delivered when the outbox is reopened.
+
+        The log is compacted to the undelivered messages: it is rewritten to
+        a temporary file that atomically replaces it, before the
+        acknowledgements are truncated, so a crash at any point leaves files
+        that recover correctly.
+        """
+        self.flush(timeout)
+
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._stopped.set()
+
+        for thread in self._threads:
+            thread.join()
+
+        with self._condition:
+            self._log.close()
+
+            undelivered = sorted((message for queue in self._queues.values()
+                                  for message in queue),
+                                 key=lambda message: message['id'])
+            temporary = self.log_path + '.tmp'
+            with open(temporary, 'w', encoding='utf-8') as log_file:
+                # keep message IDs increasing, old acknowledgements may
+                # survive a crash before they are truncated
+                lines = [{'next_id': self._next_id}] + undelivered
+                for line in lines:
+                    log_file.write(json.dumps(line, separators=(',', ':'))
+                                   + '\n')
+                log_file.flush()
+                os.fsync(log_file.fileno())
+            os.replace(temporary, self.log_path)
+
+            self._acks.truncate(0)
+            self._acks.flush()
+            os.fsync(self._acks.fileno())
+            self._acks.close()
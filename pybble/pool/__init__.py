@@ -0,0 +1,154 @@
+"""A pool of Clients for serving many Rubble domains from one process.
+
+A Client is bound to one API key. A multi-tenant server keeps a ClientPool
+instead, which hands out one Client per set of credentials, creating it on
+first use and evicting the least recently used ones beyond maxsize. Every
+Client of the pool shares one connection pool, so switching between tenants
+doesn't cost new connections. Warm-up and keep-alive probes, which need no
+credentials, are made once for the shared connection pool rather than by
+every client. With hedging enabled the clients also share one hedger, and
+so one set of hedging threads, which evicting a client leaves running.
+"""
+import collections
+import threading
+import time
+
+from pybble.config import ClientConfig, merge
+
+
+class ClientPool:
+    """Clients keyed by credentials, sharing one connection pool.
+
+    Examples
+    --------
+
+        clients = ClientPool(config={"pool": {"maxsize": 32}})
+
+        def handle(request):
+            rubble = clients.client(request.api_key, request.api_secret)
+            return rubble.process.get(request.pid)
+
+    Parameters
+    ----------
+
+    config: dict, optional
+        Config options merged over the default config, used by every
+        client, see pybble.config.
+
+    maxsize: int, optional
+        Number of clients kept, the least recently used client is evicted
+        when another one is needed.
+
+    domain_info_ttl: float, optional
+        Seconds that ClientPool.domain_info results are cached for.
+    """
+
+    def __init__(self, config=None, maxsize=256, domain_info_ttl=300):
+        from pybble.transport import Transport, create_adapter
+
+        self.config = ClientConfig(config)
+        self.maxsize = maxsize
+        self.domain_info_ttl = domain_info_ttl
+        self.adapter = create_adapter(self.config)
+
+        # clients leave the probes to the pool's transport, and share its
+        # hedger
+        self._client_config = ClientConfig(merge(self.config.as_dict(), {
+            'pool': {'warm': 0, 'keepalive': None}}))
+        self.transport = Transport(None, self.config, self.adapter)
+        self.hedger = self.transport.hedger
+        pool = self.config['pool']
+        if pool.get('warm'):
+            self.transport.warm(pool['warm'])
+        if pool.get('keepalive'):
+            self.transport.keepalive(pool['keepalive'],
+                                     max(pool.get('warm', 0), 1))
+        self.created = 0
+        self.evicted = 0
+        self._clients = collections.OrderedDict()
+        self._domain_info = {}
+        self._lock = threading.Lock()
+
+    def client(self, key, password):
+        """The Client for the credentials, see pybble.client.Client
+
+        Parameters
+        ----------
+
+        key: str
+            Rubble API key.
+
+        password: str
+            Rubble API password.
+        """
+        from pybble.client import Client
+
+        credentials = (key, password)
+        with self._lock:
+            client = self._clients.get(credentials)
+            if client is not None:
+                self._clients.move_to_end(credentials)
+                return client
+
+        # creating a client may open connections, don't hold the lock
+        client = Client(key, password, config=self._client_config,
+                        adapter=self.adapter, hedger=self.hedger)
+
+        with self._lock:
+            existing = self._clients.get(credentials)
+            if existing is None:
+                self._clients[credentials] = client
+                self.created += 1
+                evicted = []
+                while len(self._clients) > self.maxsize:
+                    old, idle = self._clients.popitem(last=False)
+                    self._domain_info.pop(old, None)
+                    evicted.append(idle)
+                self.evicted += len(evicted)
+            else:
+                # another thread created one meanwhile
+                self._clients.move_to_end(credentials)
+                evicted = [client]
+                client = existing
+
+        for idle in evicted:
+            # the connection pool and the hedger are shared and stay open,
+            # for handlers still using the client
+            idle.close()
+        return client
+
+    def domain_info(self, key, password):
+        """The domain info of the credentials, see Client.domain_info,
+        cached for domain_info_ttl seconds
+        """
+        credentials = (key, password)
+        cached = self._domain_info.get(credentials)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+
+        info = self.client(key, password).domain_info()
+        with self._lock:
+            # only cache for clients that weren't evicted meanwhile
+            if credentials in self._clients:
+                self._domain_info[credentials] = (
+                    time.monotonic() + self.domain_info_ttl, info)
+        return info
+
+    def __len__(self):
+        return len(self._clients)
+
+    def __contains__(self, credentials):
+        return credentials in self._clients
+
+    def close(self):
+        """Drop every client and close the shared connection pool and
+        hedger
+        """
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+            self._domain_info.clear()
+        for client in clients:
+            client.close()
+        self.transport.close()
+        self.adapter.close()
@@ -1,16 +1,23 @@
-import requests
 import datetime
-from urllib.parse import urljoin
+import json
+import numbers
+from urllib.parse import urlencode
 
 from pybble import time
+from pybble.config import ClientConfig, thaw
+from pybble.coalesce import SingleFlight, request_key
 from pybble.error import RubbleServerException, error_string_from_request
+from pybble.response import decode, iter_array
+from pybble.transport import Transport
 
 
 class RubbleProcess:
 
-    def __init__(self, auth, config):
+    def __init__(self, auth, config, transport=None):
         self.auth = auth
-        self.config = config
+        self.config = ClientConfig.of(config)
+        self.transport = transport or Transport(auth, self.config)
+        self.flight = SingleFlight()
 
     def call(self, terms, pid, **kwargs):
         """Synchronously sends a message consisting of Herbrand terms to
@@ -55,6 +62,20 @@ class RubbleProcess:
         the request.
         """
 
+        url = self._call_url(pid, kwargs)
+
+        request = self.transport.post(url,
+                                      json=terms,
+                                      hedge=self.config['hedging']['calls'],
+                                      **self.config['default_request_kwargs'])
+
+        if request.ok:
+            return request.json()
+        else:
+            raise RubbleServerException(error_string_from_request(request))
+
+    def _call_url(self, pid, kwargs):
+        """Build the URL of a call request, see RubbleProcess.call"""
         # create the payload and update with kwargs, channel is represented
         # by the string pid(N) where N is the numeric process ID
         params = {
@@ -78,20 +99,80 @@ class RubbleProcess:
 
         params.update(kwargs)
 
-        # join the api url to the method call
-        url = urljoin(self.config['url']['api'],
-                      'call?channel={channel}'.format(**params), True)
+        # join the api url to the method call, the channel is sent as is
+        channel = params.pop('channel')
+        url = self.config.endpoint('call') + '?channel={}'.format(channel)
+        if params:
+            url += '&' + urlencode(params)
 
-        request = requests.post(url,
-                                auth=self.auth,
-                                json=terms,
-                                **self.config['default_request_kwargs'])
+        return url
 
-        if request.ok:
-            return request.json()
-        else:
+    def call_stream(self, terms, pid, chunk_size=65536, **kwargs):
+        """Like RubbleProcess.call, but yield the output terms one by one
+        as they are decoded from the response, instead of returning them
+        all at once. Memory use stays flat however many terms the rules
+        emit, and processing can begin before the response is complete.
+
+        Parameters
+        ----------
+
+        chunk_size: int, optional
+            Number of bytes read from the connection at a time.
+
+        See RubbleProcess.call for the other parameters.
+
+        Returns
+        -------
+        output: generator
+            Yields each term of the output array. Raises
+            RubbleServerException if the response is {"error":"MESSAGE"}.
+
+        The message is sent, and the response status checked, before this
+        returns, whether or not the output is iterated over.
+        """
+        url = self._call_url(pid, kwargs)
+
+        request = self.transport.post(url,
+                                      json=terms,
+                                      stream=True,
+                                      **self.config['default_request_kwargs'])
+
+        if not request.ok:
+            request.close()
             raise RubbleServerException(error_string_from_request(request))
 
+        def output():
+            try:
+                yield from iter_array(request.iter_content(chunk_size),
+                                      'output')
+            finally:
+                request.close()
+
+        return output()
+
+    def prepare_call(self, terms, pid, **kwargs):
+        """Prepare a call that is made repeatedly with the same shape of
+        terms. The URL is resolved and the terms are encoded once, only
+        the values bound to the Slot placeholders are encoded per call.
+
+        Parameters
+        ----------
+
+        terms: list
+            The message terms, with pybble.template.Slot placeholders for
+            the values that change from call to call.
+
+        See RubbleProcess.call for the other parameters.
+
+        Returns
+        -------
+        template: pybble.template.CallTemplate
+            template.call(**values) makes the call.
+        """
+        from pybble.template import CallTemplate
+
+        return CallTemplate(self, self._call_url(pid, kwargs), terms)
+
     def send(self, terms, pid, **kwargs):
         """Sends a message consisting of JSON-encoded Herbrand terms to the
         designated channel.
@@ -110,8 +191,9 @@ class RubbleProcess:
         pid: int, optional
             Identifies the recipient process by it's process ID.
 
-        when: datetime, optional
-            When to deliver the message.
+        when: datetime or int, optional
+            When to deliver the message, either as a datetime or as
+            milliseconds since the UNIX epoch.
 
         For a description of the JSON Rubble format, see Appendix A,
         JSON-encoded Rubble facts.
@@ -136,14 +218,17 @@ class RubbleProcess:
             del kwargs['wrap_input_from']
 
         # Expect a datetime object, convert it to milliseconds
-        # since epoch
+        # since epoch. Integers are taken to be milliseconds already.
         if 'when' in kwargs:
-            if type(kwargs['when']) is not datetime.datetime:
+            if isinstance(kwargs['when'], datetime.datetime):
+                kwargs['when'] = time.datetime_to_epoch(kwargs['when'])
+            elif isinstance(kwargs['when'], numbers.Integral):
+                kwargs['when'] = int(kwargs['when'])
+            else:
                 raise ValueError("""The keyword 'when' must be a datetime
-                object.
+                object or milliseconds since the epoch.
                 """)
 
-            kwargs['when'] = self.datetime_to_epoch(kwargs['when'])
             params['when'] = kwargs['when']
 
         if 'pid' in kwargs:
@@ -152,20 +237,37 @@ class RubbleProcess:
         params.update(kwargs)
 
         # join the api url to the method call
-        url = urljoin(self.config['url']['api'], 'send')
+        url = self.config.endpoint('send')
 
-        request = requests.post(url,
-                                auth=self.auth,
-                                json=terms,
-                                params=params,
-                                **self.config['default_request_kwargs'])
+        request = self.transport.post(url,
+                                      json=terms,
+                                      params=params,
+                                      **self.config['default_request_kwargs'])
 
         if request.ok:
             return request.json()
         else:
             raise RubbleServerException(error_string_from_request(request))
 
-    def get(self, pid, prettyprint=True, **kwargs):
+    def outbox(self, path, **kwargs):
+        """Create an Outbox, which enqueues messages in a local durable
+        log and delivers them in the background. See
+        pybble.outbox.Outbox for the keyword arguments.
+        """
+        from pybble.outbox import Outbox
+
+        return Outbox(self, path, **kwargs)
+
+    def scheduler(self, **kwargs):
+        """Create a Scheduler for enqueueing large numbers of timed
+        messages with concurrent sends. See pybble.schedule.Scheduler for
+        the keyword arguments.
+        """
+        from pybble.schedule import Scheduler
+
+        return Scheduler(self, **kwargs)
+
+    def get(self, pid, prettyprint=True, lazy=False, raw=False, **kwargs):
         """
         Retrieves a process. The response is a JSON object: {"content":{…}} on
         success, or {"error":"MESSAGE"} if no process with the specified pid
@@ -185,6 +287,16 @@ class RubbleProcess:
             retrieval, for prettier display in the browser
             interface. This feature is still a bit rudimentary.
 
+        lazy: boolean, optional
+
+            Return a pybble.response.LazyResponse, which decodes the JSON
+            on demand. Use response.scalar('modtime') to read a single
+            property without decoding the facts.
+
+        raw: boolean, optional
+
+            Return the response body as bytes, without decoding it.
+
         Returns
         -------
 
@@ -295,7 +407,21 @@ class RubbleProcess:
         data are ignored, it's only a copy of the pending message stored in the
         message queue.
 
+        Concurrent calls with identical arguments share a single HTTP
+        request and receive the same parsed dict, unless the config option
+        coalesce_reads is false. Coalescing metrics are available from
+        self.flight.stats().
+
         """
+        if not self.config.get('coalesce_reads', True):
+            return self._get(pid, prettyprint, lazy, raw, **kwargs)
+
+        key = request_key('process', str(pid), prettyprint, lazy, raw, **kwargs)
+        return self.flight.do(key, self._get, pid, prettyprint, lazy, raw,
+                              **kwargs)
+
+    def _get(self, pid, prettyprint=True, lazy=False, raw=False, **kwargs):
+        """Retrieve a process, see RubbleProcess.get"""
         params = {
             "pid": str(pid),
             "prettyprint": 1 if prettyprint else 0,
@@ -305,18 +431,83 @@ class RubbleProcess:
         params.update(kwargs)
 
         # join the api url to the method call
-        url = urljoin(self.config['url']['api'], 'process')
+        url = self.config.endpoint('process')
 
-        request = requests.get(url,
-                               auth=self.auth,
-                               params=params,
-                               **self.config['default_request_kwargs'])
+        request = self.transport.get(url,
+                                     params=params,
+                                     hedge=True,
+                                     **self.config['default_request_kwargs'])
 
         if request.ok:
-            return request.json()
+            return decode(request, lazy, raw)
         else:
             raise RubbleServerException(error_string_from_request(request))
 
+    def get_trapstate(self, pid):
+        """Retrieve the trapstate of a process.
+
+        Only the trapstate property is decoded from the response, the
+        facts are never turned into Python objects.
+
+        Returns
+        -------
+        trapstate: pybble.trapstate.TrapState or None
+            None if the process is processing normally.
+        """
+        from pybble import trapstate
+
+        response = self.get(pid, prettyprint=False, lazy=True)
+        if not response.has('trapstate'):
+            if response.has('error'):
+                raise RubbleServerException(response['error'])
+            return None
+
+        return trapstate.parse(response.scalar('trapstate'))
+
+    def scan_trapped(self, causes=('ERROR', 'PAUSED'),
+                     page_size=1000, workers=16, pid_begin=0, stats=None):
+        """Find processes in an exceptional processing state.
+
+        Pages through processlist and retrieves the trapstate of every
+        process concurrently.
+
+        Parameters
+        ----------
+
+        causes: iterable, optional
+            The trapstate causes to report.
+
+        page_size: int, optional
+            Number of processes per processlist call.
+
+        workers: int, optional
+            Number of concurrent process retrievals.
+
+        pid_begin: int, optional
+            The lowest process ID to scan.
+
+        stats: pybble.batch.BatchStats, optional
+            Updated with the number of processes scanned and retrievals that
+            failed, e.g. because the process was deleted during the scan.
+
+        Returns
+        -------
+        trapped: generator
+            Yields (pid, TrapState) tuples as they are found.
+        """
+        from pybble.batch import bounded_map
+
+        causes = set(causes)
+        pids = (item['pid']
+                for page in self.list_pages(page_size=page_size,
+                                            pid_begin=pid_begin)
+                for item in page)
+
+        for pid, state, error in bounded_map(self.get_trapstate, pids,
+                                             workers=workers, stats=stats):
+            if error is None and state is not None and state.cause in causes:
+                yield pid, state
+
     def create(self, rulesref, **kwargs):
         """
         Creates a new Rubble process. The request body must have
@@ -388,18 +579,55 @@ class RubbleProcess:
         payload.update(kwargs)
 
         # join the api url to the method call
-        url = urljoin(self.config['url']['api'], 'processcreate')
+        url = self.config.endpoint('processcreate')
 
-        request = requests.post(url,
-                                auth=self.auth,
-                                json=payload,
-                                **self.config['default_request_kwargs'])
+        request = self.transport.post(url,
+                                      json=payload,
+                                      **self.config['default_request_kwargs'])
 
         if request.ok:
             return request.json()
         else:
             raise RubbleServerException(error_string_from_request(request))
 
+    def create_many(self, processes, workers=8, checkpoint=None):
+        """Create many processes concurrently.
+
+        Parameters
+        ----------
+
+        processes: iterable
+            Keyword arguments for RubbleProcess.create, one dict per process,
+            e.g. {"rulesref": "file:/foo.rubble", "facts": [...]}. A plain
+            string is taken to be the rulesref.
+
+        workers: int, optional
+            Number of concurrent requests.
+
+        checkpoint: str, optional
+            Path of a checkpoint file. If the operation is interrupted, run
+            it again with the same processes and checkpoint and only the
+            processes that weren't created yet are created.
+
+        Returns
+        -------
+        result: pybble.batch.BulkResult
+            result.results maps the position of each process in processes
+            to its new pid, result.failures maps positions to exceptions.
+        """
+        from pybble.batch import run_bulk
+
+        def create(process):
+            if isinstance(process, str):
+                process = {'rulesref': process}
+            response = self.create(**process)
+            if 'pid' not in response:
+                raise RubbleServerException(response.get('error', response))
+            return response['pid']
+
+        return run_bulk(create, enumerate(processes), workers=workers,
+                        checkpoint=checkpoint)
+
     def update(self, rulesref, pid, **kwargs):
         """
         Updates a Rubble process. The request body must have content-type
@@ -451,18 +679,119 @@ class RubbleProcess:
         payload.update(**kwargs)
 
         # join the api url to the method call
-        url = urljoin(self.config['url']['api'], 'processupdate')
+        url = self.config.endpoint('processupdate')
 
-        request = requests.post(url,
-                                auth=self.auth,
-                                json=payload,
-                                **self.config['default_request_kwargs'])
+        request = self.transport.post(url,
+                                      json=payload,
+                                      **self.config['default_request_kwargs'])
 
         if request.ok:
             return request.json()
         else:
             raise RubbleServerException(error_string_from_request(request))
 
+    def update_facts(self, pid, rulesref, facts, previous=None, delta=None,
+                     delta_kwargs=None, **kwargs):
+        """Update a process's facts, shipping only what changed when
+        possible.
+
+        The new facts are diffed against the previous facts. If nothing
+        changed no request is made. If a delta function is given and the
+        message it builds is smaller than the full fact set, the change is
+        sent as a message with RubbleProcess.call, for rules that know how
+        to apply it. Otherwise the whole fact set is sent with
+        RubbleProcess.update, compressed with the transport's request
+        encoding, or gzip if request compression isn't configured. If the
+        server refuses the compressed body it is sent again uncompressed.
+
+        Parameters
+        ----------
+
+        pid: int
+            The process to update.
+
+        rulesref: str
+            See documentation for processcreate.
+
+        facts: list or str
+            The complete new fact set, as JSON-encoded terms or as native
+            Rubble facts (then also pass factsformat="native").
+
+        previous: list or str, optional
+            The current facts, e.g. from a cache. Retrieved with
+            RubbleProcess.get if not given.
+
+        delta: callable, optional
+            Called as delta(added, removed) with lists of JSON-encoded terms,
+            returns the terms of a message that makes the rules apply the
+            change, or None if the change can't be expressed as a message.
+            For example:
+
+                def delta(added, removed):
+                    return ([["assert", term] for term in added] +
+                            [["retract", term] for term in removed])
+
+        delta_kwargs: dict, optional
+            Keyword arguments for RubbleProcess.call, e.g. wrap_input_from.
+
+        kwargs: optional
+            Passed to RubbleProcess.update for a full update, e.g.
+            factsformat and trapstate.
+
+        Returns
+        -------
+        update: pybble.facts.FactUpdate
+            Which path was taken and how many bytes were saved.
+        """
+        from pybble.facts import FactUpdate, diff as diff_facts, encoded_size
+
+        if previous is None:
+            response = self.get(pid, prettyprint=False)
+            if 'content' not in response:
+                raise RubbleServerException(response.get('error', response))
+            previous = response['content']['facts']
+
+        raw = json.dumps(dict(kwargs, pid=str(pid), rulesref=rulesref,
+                              facts=facts)).encode('utf-8')
+        bytes_full = len(raw)
+
+        # Facts that aren't plain ground terms can't be diffed, they always
+        # take the full update path
+        try:
+            change = diff_facts(previous, facts)
+        except ValueError:
+            change = None
+
+        if change is not None and not change:
+            return FactUpdate('noop', change, bytes_full, 0)
+
+        if change is not None and delta is not None:
+            terms = delta(change.added, change.removed)
+            if terms is not None and encoded_size(terms) < bytes_full:
+                response = self.call(terms, pid, **(delta_kwargs or {}))
+                return FactUpdate('delta', change, bytes_full,
+                                  encoded_size(terms), response)
+
+        encoding = self.transport.request_encoding or 'gzip'
+        body = self.transport.compress(raw, encoding)
+
+        request_kwargs = thaw(self.config.request_kwargs_for(
+            'application/json'))
+        headers = request_kwargs['headers']
+        headers['content-encoding'] = encoding
+
+        url = self.config.endpoint('processupdate')
+        request = self.transport.post(url, data=body, **request_kwargs)
+        if request.status_code == 415:
+            body = raw
+            del headers['content-encoding']
+            request = self.transport.post(url, data=body, **request_kwargs)
+
+        if not request.ok:
+            raise RubbleServerException(error_string_from_request(request))
+        return FactUpdate('full', change, bytes_full, len(body),
+                          request.json())
+
     def delete(self, pid):
         """
         Deletes the process specified by the PID.
@@ -481,19 +810,50 @@ class RubbleProcess:
             Note: the repository file that controls the process will not be
             deleted since it may be of use for other process instances.
         """
-        url = urljoin(self.config['url']['api'], 'process')
-        request = requests.delete(url,
-                                  auth=self.auth,
-                                  params={'pid': pid},
-                                  **self.config['default_request_kwargs'])
+        url = self.config.endpoint('process')
+        request = self.transport.delete(url,
+                                        params={'pid': pid},
+                                        **self.config['default_request_kwargs'])
 
         if request.ok:
             return request.json()
         else:
             raise RubbleServerException(error_string_from_request(request))
 
+    def delete_many(self, pids, workers=8, checkpoint=None):
+        """Delete many processes concurrently.
+
+        Parameters
+        ----------
+
+        pids: iterable
+            The process IDs to delete.
+
+        workers: int, optional
+            Number of concurrent requests.
+
+        checkpoint: str, optional
+            Path of a checkpoint file, see create_many.
+
+        Returns
+        -------
+        result: pybble.batch.BulkResult
+            result.results and result.failures are keyed by pid, as a
+            string.
+        """
+        from pybble.batch import run_bulk
+
+        def delete(pid):
+            response = self.delete(pid)
+            if 'error' in response:
+                raise RubbleServerException(response['error'])
+            return response
+
+        return run_bulk(delete, ((str(pid), pid) for pid in pids),
+                        workers=workers, checkpoint=checkpoint)
+
     # todo: format to numpy conventions
-    def list(self):
+    def list(self, lazy=False, raw=False, **kwargs):
         """
         Retrieves a list of process IDs and some associated metadata.
 
@@ -525,13 +885,86 @@ class RubbleProcess:
 
         This web service call is mainly intended for the Rubble administration
         console.
+
+        With lazy=True a pybble.response.LazyResponse is returned, e.g.
+        response.column('modtime') extracts every modtime without building
+        a dict per process. With raw=True the undecoded body is returned as
+        bytes.
         """
-        url = urljoin(self.config['url']['api'], 'processlist')
-        request = requests.get(url,
-                               auth=self.auth,
-                               **self.config['default_request_kwargs'])
+        params = {}
+        params.update(kwargs)
+
+        url = self.config.endpoint('processlist')
+        request = self.transport.get(url,
+                                     params=params,
+                                     **self.config['default_request_kwargs'])
 
         if request.ok:
-            return request.json()
+            return decode(request, lazy, raw)
         else:
-            raise RubbleServerException(error_string_from_request(request))
\ No newline at end of file
+            raise RubbleServerException(error_string_from_request(request))
+
+    def list_pages(self, page_size=1000, pid_begin=0, **kwargs):
+        """Page through the process list.
+
+        Parameters
+        ----------
+
+        page_size: int, optional
+            The number of processes requested per processlist call
+            (maxItems).
+
+        pid_begin: int, optional
+            The lowest process ID to list.
+
+        Returns
+        -------
+        pages: generator
+            Yields each non-empty page, a list of the JSON objects
+            described in RubbleProcess.list.
+        """
+        while True:
+            response = self.list(pidBegin=pid_begin, maxItems=page_size,
+                                 **kwargs)
+            if 'result' not in response:
+                raise RubbleServerException(response.get('error', response))
+
+            page = response['result']
+            if page:
+                yield page
+
+            if len(page) < page_size:
+                return
+
+            pid_begin = max(int(item['pid']) for item in page) + 1
+
+    def export(self, page_size=10000, pid_begin=0, since=None, before=None):
+        """Export the process list as columns rather than a dict per
+        process, for analytics over large numbers of processes. See
+        pybble.export.export for the parameters.
+
+        Returns
+        -------
+        columns: pybble.export.ProcessColumns
+            Convertible to NumPy arrays, an Arrow table or a Parquet file.
+        """
+        from pybble.export import export
+
+        return export(self, page_size=page_size, pid_begin=pid_begin,
+                      since=since, before=before)
+
+    def watch(self, pids, callback=None, **kwargs):
+        """Watch processes for changes. See pybble.watch.Watcher for the
+        keyword arguments.
+
+        If a callback is given the watcher is started in a background
+        thread and callback is called with every ProcessChange, otherwise
+        iterate over the returned Watcher (or use async for) to receive
+        them.
+        """
+        from pybble.watch import Watcher
+
+        watcher = Watcher(self, pids, **kwargs)
+        if callback is not None:
+            watcher.start(callback)
+        return watcher
\ No newline at end of file
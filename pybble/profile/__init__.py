@@ -0,0 +1,235 @@
+"""Profiling of the client side cost of Rubble requests.
+
+With the "profile" config option enabled, every operation of a Client, e.g.
+client.process.get(pid), is timed in phases:
+
+    prepare      building the parameters and the URL
+    serialize    encoding and compressing the request body
+    network      sending the request and receiving the response, including
+                 the time requests spends preparing the request
+    deserialize  decoding the response
+    error        handling an error response or exception
+
+and the timings are added up per endpoint. Every phase but network is spent
+in pybble, so the share of network time tells network-bound workloads from
+client-bound ones.
+
+    rubble = Client(key, password, config={"profile": {"enabled": True}})
+    ...
+    print(rubble.profiler.report())
+    rubble.profiler.dump("profile.json")
+
+A request that raises, e.g. because the server can't be reached, is timed
+up to the failure in the phase it failed in. Operations that make several
+requests attribute the time between requests to the prepare phase of the
+next one. Requests made outside an operation,
+e.g. by worker threads of the bulk operations, only have serialize and
+network timings.
+"""
+import functools
+import inspect
+import json
+import threading
+import time
+
+PHASES = ('prepare', 'serialize', 'network', 'deserialize', 'error')
+
+
+class EndpointProfile:
+    """Aggregated phase timings of the requests to one endpoint"""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.requests = 0
+        self.operations = set()
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+
+    @property
+    def total(self):
+        """Seconds spent in all phases"""
+        return sum(self.seconds.values())
+
+    @property
+    def client_share(self):
+        """Fraction of the time spent in pybble rather than the network"""
+        total = self.total
+        if not total:
+            return 0.0
+        return 1.0 - self.seconds['network'] / total
+
+    def as_dict(self):
+        return {
+            'endpoint': self.endpoint,
+            'requests': self.requests,
+            'operations': sorted(self.operations),
+            'seconds': dict(self.seconds),
+            'client_share': self.client_share,
+        }
+
+
+class _Operation:
+    """The timeline of the operation running in a thread"""
+
+    def __init__(self, name):
+        self.name = name
+        self.mark = time.perf_counter()
+        self.endpoint = None
+        self.ok = True
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.seconds[phase] += now - self.mark
+        self.mark = now
+
+
+class Profiler:
+    """Collects phase timings, see pybble.profile
+
+    Parameters
+    ----------
+
+    api_url: str
+        The API root, endpoints are named by the URL path below it.
+    """
+
+    def __init__(self, api_url):
+        self.api_url = api_url
+        self.endpoints = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def endpoint(self, url):
+        """The endpoint name of a URL, e.g. "process" or "file/" """
+        if not url.startswith(self.api_url):
+            return url.split('?', 1)[0]
+        path = url[len(self.api_url):].split('?', 1)[0]
+        if path.startswith('file/'):
+            return 'file/'
+        return path
+
+    def operation(self, name, fn):
+        """Wrap the method fn of operation name, e.g. "process.get" """
+        if inspect.isgeneratorfunction(fn):
+            # the work happens as the caller iterates, outside the call
+            return fn
+
+        @functools.wraps(fn)
+        def profiled(*args, **kwargs):
+            outer = getattr(self._local, 'operation', None)
+            if outer is not None:
+                # nested operations are part of the outer one
+                return fn(*args, **kwargs)
+
+            operation = self._local.operation = _Operation(name)
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException:
+                operation.ok = False
+                raise
+            finally:
+                self._local.operation = None
+                operation.lap('deserialize' if operation.ok else 'error')
+                self._record(operation)
+            return result
+        return profiled
+
+    def begin_request(self, url):
+        """Called by the Transport when it starts on a request"""
+        operation = getattr(self._local, 'operation', None)
+        if operation is None:
+            operation = self._local.request = _Operation(None)
+        else:
+            if operation.endpoint is not None:
+                # an earlier request of this operation, record it now
+                operation.lap('prepare')
+                self._record(operation)
+                operation.seconds = dict.fromkeys(PHASES, 0.0)
+            else:
+                operation.lap('prepare')
+        operation.endpoint = self.endpoint(url)
+
+    def lap(self, phase):
+        """Called by the Transport at the end of a phase"""
+        operation = getattr(self._local, 'operation', None) \
+            or getattr(self._local, 'request', None)
+        if operation is not None:
+            operation.lap(phase)
+
+    def end_request(self, ok):
+        """Called by the Transport with the response status"""
+        operation = getattr(self._local, 'operation', None)
+        if operation is not None:
+            operation.ok = ok
+            return
+        request = getattr(self._local, 'request', None)
+        if request is not None:
+            self._local.request = None
+            self._record(request)
+
+    def _record(self, operation):
+        if operation.endpoint is None:
+            # no request was made, e.g. a cached or invalid call
+            return
+        with self._lock:
+            profile = self.endpoints.get(operation.endpoint)
+            if profile is None:
+                profile = self.endpoints[operation.endpoint] = \
+                    EndpointProfile(operation.endpoint)
+            profile.requests += 1
+            if operation.name is not None:
+                profile.operations.add(operation.name)
+            for phase, seconds in operation.seconds.items():
+                profile.seconds[phase] += seconds
+
+    def reset(self):
+        with self._lock:
+            self.endpoints = {}
+
+    def report(self):
+        """A table of the mean milliseconds per request in each phase, and
+        the share of the time spent in pybble, per endpoint
+        """
+        lines = ['{:<20} {:>8} {}  {:>7}'.format(
+            'endpoint', 'requests',
+            ' '.join('{:>11}'.format(phase) for phase in PHASES), 'client')]
+        with self._lock:
+            profiles = sorted(self.endpoints.values(),
+                              key=lambda profile: -profile.total)
+        for profile in profiles:
+            lines.append('{:<20} {:>8} {}  {:>6.1f}%'.format(
+                profile.endpoint, profile.requests,
+                ' '.join('{:>11.3f}'.format(
+                    profile.seconds[phase] / profile.requests * 1000)
+                    for phase in PHASES),
+                profile.client_share * 100))
+        return '\n'.join(lines)
+
+    def dump(self, path):
+        """Write the timings to path as JSON"""
+        with self._lock:
+            profiles = [profile.as_dict()
+                        for profile in self.endpoints.values()]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'phases': PHASES, 'endpoints': profiles}, f, indent=2)
+
+
+class ProfiledSubsystem:
+    """A subsystem of a Client whose methods are profiled, e.g. the calls
+    of client.process.get are recorded as operation "process.get"
+    """
+
+    def __init__(self, name, subsystem, profiler):
+        self._name = name
+        self._subsystem = subsystem
+        self._profiler = profiler
+
+    def __getattr__(self, attribute):
+        value = getattr(self._subsystem, attribute)
+        if attribute.startswith('_') or not inspect.ismethod(value):
+            return value
+        return self._profiler.operation(
+            '{}.{}'.format(self._name, attribute), value)
+
+    def __repr__(self):
+        return '<Profiled {!r}>'.format(self._subsystem)
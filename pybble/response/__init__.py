@@ -0,0 +1,259 @@
+"""Lazily decoded JSON responses.
+
+A LazyResponse keeps the raw response body and only decodes what is asked
+for. Scalar properties such as pid or modtime are found by scanning the raw
+bytes, the whole document is decoded the first time anything else is
+accessed.
+
+iter_array decodes the elements of an array in a streamed response one at a
+time, so that large responses never have to be held in memory whole.
+"""
+import codecs
+import json
+import re
+
+from collections.abc import Mapping
+
+from pybble.error import RubbleServerException
+
+
+# A key can only follow "{" or "," in JSON. Inside a JSON string every
+# double quote is escaped, so this can't match string content.
+KEY = r'[{{,]\s*"{key}"\s*:'
+SCALAR = KEY + r'\s*(-?[0-9][0-9.eE+-]*|"(?:[^"\\]|\\.)*"|true|false|null)'
+
+
+class LazyResponse(Mapping):
+    """A read-only mapping over a JSON response body that is decoded on
+    demand.
+
+    Examples
+    --------
+
+        response = client.process.get(pid, lazy=True)
+        response.scalar('modtime')         # scans the bytes
+        response['content']['facts']       # decodes the document once
+        bytes(response.raw)                # the body as received
+    """
+
+    def __init__(self, content):
+        self._content = content
+        self._decoded = None
+
+    @property
+    def raw(self):
+        """The response body as a memoryview, without copying"""
+        return memoryview(self._content)
+
+    @property
+    def decoded(self):
+        """Whether the whole document has been decoded"""
+        return self._decoded is not None
+
+    def decode(self):
+        """Decode the whole document, once"""
+        if self._decoded is None:
+            self._decoded = json.loads(self._content)
+        return self._decoded
+
+    def has(self, key):
+        """Whether the property key occurs anywhere in the document,
+        without decoding it
+        """
+        pattern = KEY.format(key=re.escape(key)).encode('utf-8')
+        return re.search(pattern, self._content) is not None
+
+    def column(self, key):
+        """Return every scalar (string, number, boolean or null) value of
+        the property key, at any depth, in document order, without decoding
+        the document.
+
+        For a process list this returns a column, e.g. every modtime.
+        """
+        pattern = re.compile(SCALAR.format(key=re.escape(key)).encode('utf-8'))
+        return [json.loads(value) for value in pattern.findall(self._content)]
+
+    def scalar(self, key, default=None):
+        """Return the scalar value of the property key, looking at the top
+        level and inside "content". The raw bytes are scanned when key
+        occurs exactly once, otherwise the document is decoded.
+        """
+        if self._decoded is None:
+            found = self.column(key)
+            if len(found) == 1:
+                return found[0]
+
+        document = self.decode()
+        if key in document:
+            return document[key]
+        return document.get('content', {}).get(key, default)
+
+    def __contains__(self, key):
+        return key in self.decode()
+
+    def __getitem__(self, key):
+        return self.decode()[key]
+
+    def __iter__(self):
+        return iter(self.decode())
+
+    def __len__(self):
+        return len(self.decode())
+
+    def __repr__(self):
+        return "<LazyResponse {} bytes{}>".format(
+            len(self._content), ", decoded" if self.decoded else "")
+
+
+def decode(request, lazy=False, raw=False):
+    """Return the body of a successful response: the raw bytes if raw is
+    true, a LazyResponse if lazy is true, and otherwise the decoded JSON.
+    """
+    if raw:
+        return request.content
+    if lazy:
+        return LazyResponse(request.content)
+    return request.json()
+
+
+_WHITESPACE = re.compile(r'\s*')
+_NUMBER = re.compile(r'[-+0-9.eE]*')
+
+
+class _Stream:
+    """Text decoded incrementally from an iterable of byte chunks"""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        self.closed = False
+        # hold on to consumed text until we know the layout, see rest
+        self.keep = False
+
+    def read(self):
+        """Append the next chunk to the buffer, return False at the end"""
+        if self.closed:
+            return False
+        # drop what has been consumed before growing the buffer
+        if not self.keep:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        for chunk in self._chunks:
+            text = self._decoder.decode(chunk)
+            if text:
+                self.buffer += text
+                return True
+        self.buffer += self._decoder.decode(b'', final=True)
+        self.closed = True
+        return False
+
+    def skip(self):
+        """Skip whitespace, return the next character or '' at the end"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.read():
+                return ''
+
+    def expect(self, literal):
+        """Consume literal, return False if the input doesn't start with it"""
+        self.skip()
+        while len(self.buffer) - self.pos < len(literal) and self.read():
+            pass
+        if not self.buffer.startswith(literal, self.pos):
+            return False
+        self.pos += len(literal)
+        return True
+
+    def value(self, decoder):
+        """Decode the next JSON value"""
+        self.skip()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buffer, self.pos)
+            except ValueError:
+                if self.read():
+                    continue
+                raise
+            # a number running up to the end of the buffer may continue in
+            # the next chunk, e.g. "-2" of "-2.5e3"
+            if isinstance(value, (int, float)) and not self.closed \
+                    and _NUMBER.match(self.buffer, self.pos).end() \
+                    == len(self.buffer) and self.read():
+                continue
+            self.pos = end
+            return value
+
+    def rest(self):
+        """Return the whole document, when keep was set from the start"""
+        while self.read():
+            pass
+        return self.buffer
+
+
+def iter_array(chunks, key=None):
+    """Yield the elements of a JSON array one by one while it is being
+    received.
+
+    Parameters
+    ----------
+
+    chunks: iterable of bytes
+        The UTF-8 encoded document, e.g. request.iter_content(65536).
+
+    key: str, optional
+        When given, the document is an object and the array is the value of
+        its first property, which must be key, e.g. {"output": [...]}.
+        Otherwise the document is the array itself.
+
+    Returns
+    -------
+    elements: generator
+        Raises RubbleServerException if the document is an object with an
+        "error" property in place of key, ValueError if it is not valid
+        JSON.
+    """
+    stream = _Stream(chunks)
+    decoder = json.JSONDecoder()
+
+    if key is not None:
+        stream.keep = True
+        prefix = stream.expect('{') and stream.skip() == '"'
+        if prefix:
+            name = stream.value(decoder)
+            prefix = name == key and stream.expect(':') \
+                and stream.skip() == '['
+        if not prefix:
+            # not the layout we stream, fall back to decoding it whole
+            yield from _whole(stream.rest(), key)
+            return
+        stream.keep = False
+
+    if not stream.expect('['):
+        raise ValueError("expected a JSON array")
+
+    if stream.skip() == ']':
+        stream.pos += 1
+        return
+
+    while True:
+        yield stream.value(decoder)
+        separator = stream.skip()
+        stream.pos += 1
+        if separator == ']':
+            return
+        if separator != ',':
+            raise ValueError("expected ',' or ']' at offset {}, got {!r}"
+                             .format(stream.pos - 1, separator))
+
+
+def _whole(text, key):
+    """The elements of the array document[key], for iter_array"""
+    document = json.loads(text)
+    if isinstance(document, dict) and key not in document \
+            and 'error' in document:
+        raise RubbleServerException(document['error'])
+    return iter(document[key])
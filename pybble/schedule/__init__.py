@@ -0,0 +1,154 @@
+"""Bulk scheduling of timed messages.
+
+A Scheduler collects (pid, terms, when) entries, converts all delivery times
+to milliseconds since the epoch in one pass, groups the messages by recipient
+and delivery time and then enqueues them with concurrent sends.
+"""
+import numbers
+
+from pybble import time
+from pybble.batch import BatchStats, bounded_map
+
+
+def _is_datetime(when):
+    return when is not None and not isinstance(when, numbers.Integral)
+
+
+def _delivery_order(key):
+    """Sort immediate messages first, then by delivery time and pid"""
+    pid, when = key
+    return (when is not None, when or 0, pid)
+
+
+class ScheduleReport(BatchStats):
+    """The outcome of Scheduler.flush: throughput counters plus the entries
+    that could not be enqueued.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.failures = []
+
+
+class Scheduler:
+    """Plan and enqueue large numbers of scheduled messages.
+
+    Examples
+    --------
+
+        scheduler = client.process.scheduler(workers=16)
+        scheduler.extend((pid, [["remind", user]], when)
+                         for pid, user, when in reminders)
+        report = scheduler.flush()
+        print(report.rate, "messages/s")
+
+    Parameters
+    ----------
+
+    process: RubbleProcess
+        Used to send the messages.
+
+    workers: int, optional
+        Number of concurrent send requests.
+
+    max_pending: int, optional
+        Maximum number of sends in flight, see pybble.batch.bounded_map.
+
+    merge: bool, optional
+        If True, messages for the same pid with the same delivery time are
+        merged into a single message carrying all of their terms. This cuts
+        the number of requests but makes the terms arrive in one
+        transaction, so only use it if the rules don't care.
+
+    send_kwargs: optional
+        Extra keyword arguments for every RubbleProcess.send call, e.g.
+        wrap_input_from.
+    """
+
+    def __init__(self, process, workers=8, max_pending=None, merge=False,
+                 **send_kwargs):
+        self.process = process
+        self.workers = workers
+        self.max_pending = max_pending
+        self.merge = merge
+        self.send_kwargs = send_kwargs
+        self.entries = []
+
+    def add(self, pid, terms, when=None):
+        """Schedule terms to be delivered to pid at when, a datetime or
+        milliseconds since the epoch, or as soon as possible if when is
+        None.
+        """
+        self.entries.append((pid, terms, when))
+
+    def extend(self, entries):
+        """Schedule an iterable of (pid, terms, when) tuples"""
+        self.entries.extend(entries)
+
+    def plan(self):
+        """Convert the delivery times and group the messages.
+
+        Returns
+        -------
+        messages: list
+            (pid, terms, when) tuples ordered by delivery time, with when
+            in milliseconds since the epoch (or None).
+        """
+        # datetimes are converted in one pass, ints are milliseconds
+        # already
+        whens = [entry[2] for entry in self.entries]
+        epochs = iter(time.datetimes_to_epoch(
+            [when for when in whens if _is_datetime(when)]))
+        whens = [next(epochs) if _is_datetime(when) else
+                 None if when is None else int(when)
+                 for when in whens]
+
+        groups = {}
+        for (pid, terms, _), when in zip(self.entries, whens):
+            groups.setdefault((str(pid), when), []).append(terms)
+
+        messages = []
+        for pid, when in sorted(groups, key=_delivery_order):
+            group = groups[(pid, when)]
+            if self.merge:
+                merged = []
+                for terms in group:
+                    # a str is a single term
+                    if isinstance(terms, str):
+                        merged.append(terms)
+                    else:
+                        merged.extend(terms)
+                messages.append((pid, merged, when))
+            else:
+                messages.extend((pid, terms, when) for terms in group)
+
+        return messages
+
+    def flush(self):
+        """Enqueue every planned message and clear the scheduler.
+
+        Returns
+        -------
+        report: ScheduleReport
+            Throughput and failures. Failures are (pid, terms, when, error)
+            tuples.
+        """
+        messages = self.plan()
+        self.entries = []
+
+        report = ScheduleReport()
+        for message, _, error in bounded_map(self._send, messages,
+                                             workers=self.workers,
+                                             max_pending=self.max_pending,
+                                             stats=report):
+            if error is not None:
+                report.failures.append(message + (error,))
+
+        return report
+
+    def _send(self, message):
+        pid, terms, when = message
+        kwargs = dict(self.send_kwargs)
+        if when is not None:
+            kwargs['when'] = when
+        return self.process.send(terms, pid, **kwargs)
@@ -0,0 +1,253 @@
+"""A persistent local snapshot of process states.
+
+The snapshot is two files: a data file, an append-only file of process
+responses exactly as the server sent them, and PATH.index, a JSON object
+holding the generation of the data file and mapping each pid to the offset,
+length and modtime of its latest record. Reads are served from a memory map
+of the data file.
+
+Compacting writes the next generation of the data file, PATH.data.N, and
+then switches the index over to it in one atomic replace, so a crash leaves
+a matching index and data file of either generation. The first generation
+is PATH.data.
+
+A refresh lists the processes with processlist and only retrieves those whose
+modtime differs from the snapshot, so after the first export only changed
+processes are fetched.
+
+    store = SnapshotStore('processes')
+    report = store.refresh(client.process)
+    for pid in store:
+        process = store.get(pid)
+"""
+import json
+import mmap
+import os
+import threading
+
+from pybble.batch import BatchStats, bounded_map
+from pybble.error import RubbleServerException
+from pybble.response import LazyResponse
+
+
+class RefreshReport(BatchStats):
+    """The outcome of SnapshotStore.refresh. succeeded and failed count
+    process retrievals, unchanged and removed the processes that didn't
+    need one.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.unchanged = 0
+        self.removed = 0
+        self.failures = {}
+
+
+class SnapshotStore:
+    """A memory-mapped, append-only store of process states.
+
+    Parameters
+    ----------
+
+    path: str
+        Path prefix of the data and PATH.index files.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path + '.index'
+        self._lock = threading.RLock()
+        self._mmap = None
+
+        try:
+            with open(self.index_path, encoding='utf-8') as index_file:
+                stored = json.load(index_file)
+        except FileNotFoundError:
+            stored = {}
+        if 'processes' in stored:
+            self.generation = stored['generation']
+            self.index = stored['processes']
+        else:
+            # written before compaction switched generations
+            self.generation = 0
+            self.index = stored
+        self.data_path = self._data_path(self.generation)
+
+        if self.generation > 0:
+            # left behind if compact was interrupted after switching
+            try:
+                os.remove(self._data_path(self.generation - 1))
+            except FileNotFoundError:
+                pass
+
+        self._data = open(self.data_path, 'ab')
+        # records lost from the end of the data file are fetched again on
+        # the next refresh
+        size = self._data.seek(0, os.SEEK_END)
+        self.index = {pid: entry for pid, entry in self.index.items()
+                      if entry[0] + entry[1] <= size}
+
+    def _data_path(self, generation):
+        if generation == 0:
+            return self.path + '.data'
+        return '{}.data.{}'.format(self.path, generation)
+
+    def refresh(self, process, workers=16, page_size=1000):
+        """Bring the snapshot up to date.
+
+        Parameters
+        ----------
+
+        process: RubbleProcess
+            Used to list and retrieve processes.
+
+        workers: int, optional
+            Number of concurrent process retrievals.
+
+        page_size: int, optional
+            Number of processes per processlist call.
+
+        Returns
+        -------
+        report: RefreshReport
+        """
+        report = RefreshReport()
+
+        modtimes = {}
+        for page in process.list_pages(page_size=page_size):
+            for item in page:
+                modtimes[item['pid']] = item['modtime']
+
+        with self._lock:
+            for pid in self.index.keys() - modtimes.keys():
+                del self.index[pid]
+                report.removed += 1
+
+            changed = []
+            for pid, modtime in modtimes.items():
+                entry = self.index.get(pid)
+                if entry is not None and entry[2] == modtime:
+                    report.unchanged += 1
+                else:
+                    changed.append(pid)
+
+        def fetch(pid):
+            content = process.get(pid, prettyprint=False, raw=True)
+            # processes deleted meanwhile are answered with an error
+            response = LazyResponse(content)
+            if response.has('error') and 'error' in response:
+                raise RubbleServerException(response['error'])
+            return content
+
+        for pid, content, error in bounded_map(fetch, changed, workers=workers,
+                                               stats=report):
+            if error is not None:
+                # keep the stale record, it's retried on the next refresh
+                report.failures[pid] = error
+                continue
+            self._append(pid, content, modtimes[pid])
+
+        self.save()
+        report.stop()
+        return report
+
+    def _append(self, pid, content, modtime):
+        with self._lock:
+            offset = self._data.seek(0, os.SEEK_END)
+            self._data.write(content)
+            self.index[pid] = [offset, len(content), modtime]
+            # mapped again on the next read, to include the new record
+            self._unmap()
+
+    def save(self):
+        """Flush the data file and atomically replace the index"""
+        with self._lock:
+            self._data.flush()
+            os.fsync(self._data.fileno())
+
+            temporary = self.index_path + '.tmp'
+            with open(temporary, 'w', encoding='utf-8') as index_file:
+                json.dump({'generation': self.generation,
+                           'processes': self.index},
+                          index_file, separators=(',', ':'))
+                index_file.flush()
+                os.fsync(index_file.fileno())
+            os.replace(temporary, self.index_path)
+
+    def _unmap(self):
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # views returned by raw are still held, the map is
+                # unmapped once the last of them is released
+                pass
+            self._mmap = None
+
+    def _mapped(self):
+        with self._lock:
+            if self._mmap is None:
+                self._data.flush()
+                with open(self.data_path, 'rb') as data_file:
+                    self._mmap = mmap.mmap(data_file.fileno(), 0,
+                                           access=mmap.ACCESS_READ)
+            return self._mmap
+
+    def raw(self, pid):
+        """The stored response for pid as a memoryview of the memory map,
+        without copying. The view stays valid after the store is refreshed
+        or closed, and keeps the map alive until it is released.
+        """
+        offset, length, _ = self.index[str(pid)]
+        return memoryview(self._mapped())[offset:offset + length]
+
+    def get(self, pid):
+        """The stored response for pid, decoded: {"content": {...}}"""
+        return json.loads(bytes(self.raw(pid)))
+
+    def modtime(self, pid):
+        return self.index[str(pid)][2]
+
+    def compact(self):
+        """Write the next generation of the data file, keeping only the
+        latest record of every process, and switch over to it
+        """
+        with self._lock:
+            generation = self.generation + 1
+            data_path = self._data_path(generation)
+            index = {}
+            with open(data_path, 'wb') as data_file:
+                for pid in self.index:
+                    content = self.raw(pid)
+                    index[pid] = [data_file.tell(), len(content),
+                                  self.index[pid][2]]
+                    data_file.write(content)
+                    content.release()
+                data_file.flush()
+                os.fsync(data_file.fileno())
+
+            self.close()
+            previous = self.data_path
+            self.index = index
+            self.generation = generation
+            self.data_path = data_path
+            self._data = open(data_path, 'ab')
+            # until the new index replaces the old one, a crash leaves the
+            # previous generation in use
+            self.save()
+            os.remove(previous)
+
+    def close(self):
+        """Close the data file. Views returned by raw stay valid, see raw"""
+        with self._lock:
+            self._unmap()
+            self._data.close()
+
+    def __contains__(self, pid):
+        return str(pid) in self.index
+
+    def __iter__(self):
+        return iter(list(self.index))
+
+    def __len__(self):
+        return len(self.index)
@@ -0,0 +1,123 @@
+"""Call templates: calls with a fixed shape that are made over and over.
+
+A CallTemplate resolves the call URL and JSON encodes the terms once, leaving
+holes where Slot placeholders were. Each call then only encodes the bound
+values and joins them with the pre-encoded fragments.
+
+    from pybble.template import Slot
+
+    order = client.process.prepare_call(
+        [{"order": {"sku": Slot("sku"), "quantity": Slot("quantity")}}],
+        pid=42)
+
+    order.call(sku="A-17", quantity=3)
+"""
+import json
+import uuid
+
+from pybble.error import RubbleServerException, error_string_from_request
+
+
+class Slot:
+    """A placeholder for a value that is bound when a template is called
+
+    Parameters
+    ----------
+
+    name: str
+        The keyword argument that supplies the value.
+    """
+
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return "Slot({!r})".format(self.name)
+
+
+def compile_terms(terms):
+    """Encode terms containing Slot placeholders
+
+    Returns
+    -------
+    (fragments, names): tuple
+        The encoded JSON is fragments[0] + value of names[0] + fragments[1]
+        + ..., with one more fragment than names. Fragments are bytes.
+    """
+    marker = uuid.uuid4().hex
+    slots = []
+
+    def mark(node):
+        if isinstance(node, Slot):
+            # marked by position, a name could be escaped by the encoding
+            slots.append(node.name)
+            return '{}{}{}'.format(marker, len(slots) - 1, marker)
+        if isinstance(node, dict):
+            return {key: mark(value) for key, value in node.items()}
+        if isinstance(node, (list, tuple)):
+            return [mark(value) for value in node]
+        return node
+
+    # the markers end up as JSON strings, split on them including quotes
+    pieces = json.dumps(mark(terms)).split('"' + marker)
+    fragments = [pieces[0].encode('utf-8')]
+    names = []
+    for piece in pieces[1:]:
+        position, rest = piece.split(marker + '"', 1)
+        names.append(slots[int(position)])
+        fragments.append(rest.encode('utf-8'))
+    return fragments, names
+
+
+class CallTemplate:
+    """A prepared call, see RubbleProcess.prepare_call
+
+    Parameters
+    ----------
+
+    process: RubbleProcess
+
+    url: str
+        The complete call URL.
+
+    terms: list
+        The message terms, with Slot placeholders for the changing values.
+    """
+
+    def __init__(self, process, url, terms):
+        self.process = process
+        self.url = url
+        self.fragments, self.names = compile_terms(terms)
+        self.request_kwargs = process.config.request_kwargs_for(
+            'application/json')
+
+    def body(self, **values):
+        """The encoded request body with values bound to the slots"""
+        missing = set(self.names).difference(values)
+        if missing:
+            raise TypeError("no value for slot(s): {}".format(
+                ", ".join(sorted(missing))))
+
+        fragments = self.fragments
+        parts = [fragments[0]]
+        for name, fragment in zip(self.names, fragments[1:]):
+            parts.append(json.dumps(values[name]).encode('utf-8'))
+            parts.append(fragment)
+        return b''.join(parts)
+
+    def call(self, **values):
+        """Make the call with values bound to the slots, see
+        RubbleProcess.call
+        """
+        request = self.process.transport.post(self.url,
+                                              data=self.body(**values),
+                                              **self.request_kwargs)
+        if request.ok:
+            return request.json()
+        else:
+            raise RubbleServerException(error_string_from_request(request))
+
+    def __repr__(self):
+        return "<CallTemplate {} slots={}>".format(self.url, self.names)
@@ -0,0 +1,146 @@
+"""A local HTTP server standing in for Rubble in the tests.
+
+    server = start_server()                 # MockRubbleHandler
+    server = start_server(EchoHandler)      # a handler of the test's own
+    ...
+    stop_server(server)
+
+Handlers can subclass BaseHandler, which speaks HTTP/1.1 with keep-alive
+connections and has helpers to read request bodies and write responses.
+
+Tests that don't need the network can use a FakeTransport, which records
+each request and answers it with a function of the test's own.
+"""
+import json
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from pybble.transport import Transport
+
+
+class BaseHandler(BaseHTTPRequestHandler):
+    """A quiet HTTP/1.1 handler"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def read_body(self):
+        """The request body, which may be sent chunked"""
+        if self.headers.get('transfer-encoding') == 'chunked':
+            body = b''
+            while True:
+                size = int(self.rfile.readline(), 16)
+                body += self.rfile.read(size + 2)[:size]
+                if size == 0:
+                    return body
+        return self.rfile.read(int(self.headers.get('content-length', 0)))
+
+    def respond(self, body, status=200, content_type='application/json'):
+        """Send body, JSON encoded unless it's bytes"""
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('content-type', content_type)
+        self.send_header('content-length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MockRubbleHandler(BaseHandler):
+    """Answers process, processcreate and call requests like Rubble does,
+    over keep-alive connections
+    """
+
+    def do_GET(self):
+        self.server.connections.add(self.client_address)
+        if self.path.endswith('cluster-probe'):
+            self.server.probe_auth.add(self.headers.get('authorization'))
+            self.respond({})
+            return
+        if self.path.endswith('domaininfo'):
+            self.server.domain_info_requests += 1
+            self.respond({'domain': 'acme', 'apikey': 'key'})
+            return
+        pid = self.path.split('pid=')[1].split('&')[0]
+        self.respond({'content': {'pid': pid, 'modtime': 1, 'facts': 'a;'}})
+
+    def do_POST(self):
+        self.server.connections.add(self.client_address)
+        self.server.calls += 1
+        body = json.loads(self.read_body())
+        if self.path.endswith('processcreate'):
+            self.respond({'pid': body['rulesref'].rsplit('/', 1)[1]})
+        else:
+            self.respond({'output': body})
+
+
+class MockRubbleServer(ThreadingHTTPServer):
+    """Counts what its handlers see: the client addresses connected, the
+    authorization headers of probes, domaininfo requests and POSTs
+    """
+
+    daemon_threads = True
+    # every worker thread connects at once
+    request_queue_size = 128
+
+    def __init__(self, address, handler):
+        super().__init__(address, handler)
+        self.connections = set()
+        self.probe_auth = set()
+        self.domain_info_requests = 0
+        self.calls = 0
+
+    @property
+    def url(self):
+        """The root URL to configure clients with"""
+        return 'http://127.0.0.1:{}/'.format(self.server_port)
+
+
+def start_server(handler=MockRubbleHandler):
+    """Serve handler on a free local port in a daemon thread"""
+    server = MockRubbleServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def stop_server(server):
+    server.shutdown()
+    server.server_close()
+
+
+class FakeTransport(Transport):
+    """A Transport that answers requests without sending them.
+
+    Parameters
+    ----------
+
+    answer: callable
+        Called as answer(method, url, kwargs) with the arguments of
+        Transport.send, returns the status code and the body, which is
+        JSON-encoded unless it's bytes.
+
+    config: dict, optional
+    """
+
+    def __init__(self, answer, config=None):
+        super().__init__(None, config or {})
+        self.answer = answer
+        self.requests = []
+
+    def send(self, method, url, **kwargs):
+        self.requests.append((method, url, kwargs))
+        status, body = self.answer(method, url, kwargs)
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode('utf-8')
+
+        response = requests.models.Response()
+        response.status_code = status
+        response.reason = HTTPStatus(status).phrase
+        response.url = url
+        response._content = body
+        return response
@@ -0,0 +1,101 @@
+import itertools
+import os
+import tempfile
+from unittest import TestCase
+
+from pybble.babylon import Babylon
+from pybble.config import ClientConfig
+from pybble.error import RubbleServerException
+from pybble.tests.mock_rubble import BaseHandler, start_server, stop_server
+from pybble.transport.recording import RecordingTransport
+
+
+class TranslateHandler(BaseHandler):
+    """Translates "N is a number" rules to number(N). and anything else to
+    a TRANSLATION ERROR, answering with 404 for an unknown macro file. The
+    code for "gap is a number" has an empty line in it.
+    """
+
+    def do_POST(self):
+        header, *rules = self.read_body().decode('utf-8').split('\n\n')
+        if header != 'Format: babylon/numbers.xml':
+            self.respond(b'', status=404)
+            return
+
+        blocks = []
+        for rule in filter(None, rules):
+            words = rule.split()
+            if words == ['gap', 'is', 'a', 'number']:
+                blocks.append('% gap\n\nnumber(gap).')
+            elif words[1:] == ['is', 'a', 'number']:
+                blocks.append('% {}\nnumber({}).'.format(rule, words[0]))
+            else:
+                blocks.append('% TRANSLATION ERROR: ' + rule)
+        self.respond('\n\n'.join(blocks).encode('utf-8'),
+                     content_type='text/plain; charset=utf-8')
+
+class TestTranslateStream(TestCase):
+    """
+    Tests streaming babylon translations, pybble.babylon
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = start_server(TranslateHandler)
+
+    @classmethod
+    def tearDownClass(cls):
+        stop_server(cls.server)
+
+    def setUp(self):
+        self.config = ClientConfig({'url': {'root': self.server.url}})
+        self.rules = ['{} is a\n number'.format(i) for i in range(100)]
+        self.rules[7] = 'seven is a word'
+
+    def check(self, translations):
+        translations = list(translations)
+        self.assertEqual(len(translations), 100)
+        self.assertEqual([t.index for t in translations], list(range(100)))
+        self.assertEqual(translations[3].code, '% 3 is a number\nnumber(3).\n')
+        self.assertFalse(translations[7].ok)
+        self.assertEqual(sum(t.ok for t in translations), 99)
+
+    def test_per_rule_results(self):
+        babylon = Babylon(('key', 'password'), self.config)
+        self.check(babylon.translate_stream(iter(self.rules), 'numbers',
+                                            chunk_size=64))
+
+    def test_empty_rules_skipped(self):
+        babylon = Babylon(('key', 'password'), self.config)
+        rules = ['', '1 is a number', ' \n ', 'two is a word', '3 is a number']
+        translations = list(babylon.translate_stream(rules, 'numbers'))
+
+        self.assertEqual([t.index for t in translations], [1, 3, 4])
+        self.assertEqual([t.ok for t in translations], [True, False, True])
+
+    def test_misaligned_blocks_raised(self):
+        babylon = Babylon(('key', 'password'), self.config)
+        rules = ['1 is a number', 'gap is a number', '3 is a number']
+        translations = babylon.translate_stream(rules, 'numbers')
+
+        self.assertEqual([t.index for t in itertools.islice(translations, 4)],
+                         [0, 1, 2, None])
+        with self.assertRaises(RubbleServerException):
+            next(translations)
+
+    def test_error_raised_at_once(self):
+        babylon = Babylon(('key', 'password'), self.config)
+        with self.assertRaises(RubbleServerException):
+            babylon.translate_stream(self.rules, 'letters')
+
+    def test_recorded(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        transport = RecordingTransport(
+            ('key', 'password'), self.config,
+            os.path.join(directory.name, 'traffic.jsonl'))
+        babylon = Babylon(('key', 'password'), self.config, transport)
+
+        self.check(babylon.translate_stream(self.rules, 'numbers',
+                                            chunk_size=64))
+        transport.close()
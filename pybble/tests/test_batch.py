@@ -0,0 +1,65 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from pybble.batch import Checkpoint, run_bulk, trim_partial_line
+
+
+class TestCheckpoint(TestCase):
+    """
+    Tests resumable bulk operations, pybble.batch.Checkpoint and run_bulk
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'checkpoint')
+
+    def test_partial_line_dropped(self):
+        with open(self.path, 'w') as checkpoint_file:
+            checkpoint_file.write('[1, "a"]\n[2, "b"]\n[3, "')
+
+        checkpoint = Checkpoint(self.path)
+        self.assertEqual(checkpoint.done, {1: 'a', 2: 'b'})
+        checkpoint.record(3, 'c')
+        checkpoint.close()
+
+        self.assertEqual(Checkpoint(self.path).done, {1: 'a', 2: 'b', 3: 'c'})
+
+    def test_trim_partial_line(self):
+        self.assertFalse(trim_partial_line(self.path))
+        with open(self.path, 'wb') as lines_file:
+            lines_file.write(b'x' * 10000)
+        self.assertTrue(trim_partial_line(self.path))
+        self.assertEqual(os.path.getsize(self.path), 0)
+
+        with open(self.path, 'wb') as lines_file:
+            lines_file.write(b'1\n' + b'x' * 10000 + b'\n')
+        self.assertFalse(trim_partial_line(self.path))
+        self.assertEqual(os.path.getsize(self.path), 10003)
+
+    def test_resume(self):
+        calls = []
+
+        def double(item):
+            calls.append(item)
+            if item == 3:
+                raise ValueError(item)
+            return item * 2
+
+        checkpoint = Checkpoint(self.path)
+        result = run_bulk(double, [(i, i) for i in range(5)],
+                          checkpoint=checkpoint)
+        self.assertEqual(result.results, {0: 0, 1: 2, 2: 4, 4: 8})
+        self.assertEqual(list(result.failures), [3])
+        # the caller's checkpoint is left open
+        checkpoint.record(3, 6)
+        checkpoint.close()
+
+        calls.clear()
+        result = run_bulk(double, [(i, i) for i in range(6)],
+                          checkpoint=self.path)
+        self.assertEqual(calls, [5])
+        self.assertEqual(result.skipped, 5)
+        self.assertEqual(result.results[3], 6)
+        self.assertEqual(len(result.results), 6)
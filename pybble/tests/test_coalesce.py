@@ -0,0 +1,91 @@
+import threading
+from unittest import TestCase
+
+from pybble.coalesce import SingleFlight, request_key
+
+
+class TestSingleFlight(TestCase):
+    """
+    Tests coalescing identical concurrent calls, pybble.coalesce
+    """
+
+    callers = 8
+
+    def run_concurrently(self, flight, fn):
+        """Call flight.do from every caller while the leader is blocked in
+        fn, return the results and errors
+        """
+        results, errors = [], []
+
+        def caller():
+            try:
+                results.append(flight.do(('process', '1'), fn))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=caller)
+                   for _ in range(self.callers)]
+        for thread in threads:
+            thread.start()
+        return threads, results, errors
+
+    def wait_for_waiters(self, flight):
+        # every caller but the leader has been collapsed into its call
+        while flight.stats()['collapsed'] < self.callers - 1:
+            threading.Event().wait(0.001)
+
+    def test_callers_share_one_result(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            release.wait()
+            return {'content': {'pid': '1'}}
+
+        threads, results, errors = self.run_concurrently(flight, fetch)
+        self.wait_for_waiters(flight)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(errors, [])
+        self.assertEqual(len(results), self.callers)
+        self.assertTrue(all(result is results[0] for result in results))
+
+    def test_exception_reaches_every_waiter(self):
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def fetch():
+            release.wait()
+            raise ValueError("404 Not Found")
+
+        threads, results, errors = self.run_concurrently(flight, fetch)
+        self.wait_for_waiters(flight)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [])
+        self.assertEqual(len(errors), self.callers)
+        self.assertTrue(all(isinstance(e, ValueError) for e in errors))
+
+    def test_key_released_after_completion(self):
+        flight = SingleFlight()
+        self.assertEqual(flight.do('key', lambda: 1), 1)
+        # a later call with the same key is made again, not served the
+        # earlier result
+        self.assertEqual(flight.do('key', lambda: 2), 2)
+
+        with self.assertRaises(ValueError):
+            flight.do('key', lambda: int('x'))
+        self.assertEqual(flight.do('key', lambda: 3), 3)
+        self.assertEqual(flight.stats(), {'calls': 4, 'collapsed': 0,
+                                          'in_flight': 0})
+
+    def test_request_key_ignores_keyword_order(self):
+        self.assertEqual(request_key('process', 1, a=1, b=2),
+                         request_key('process', 1, b=2, a=1))
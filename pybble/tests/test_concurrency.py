@@ -0,0 +1,131 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+from pybble.client import Client
+from pybble.pool import ClientPool
+from pybble.tests.mock_rubble import start_server, stop_server
+
+
+class TestConcurrency(TestCase):
+    """
+    Stress tests one Client shared by a pool of worker threads
+    """
+
+    threads = 64
+    requests_per_thread = 10
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = start_server()
+
+    @classmethod
+    def tearDownClass(cls):
+        stop_server(cls.server)
+
+    def test_client_shared_by_worker_pool(self):
+        url = self.server.url
+        self.server.connections.clear()
+        rubble = Client('key', 'password', config={
+            'url': {'root': url},
+            'pool': {'maxsize': self.threads},
+        })
+
+        def work(worker):
+            for i in range(self.requests_per_thread):
+                pid = str(worker * 1000 + i)
+                self.assertEqual(
+                    rubble.process.get(pid)['content']['pid'], pid)
+                self.assertEqual(
+                    rubble.process.create('file:/' + pid)['pid'], pid)
+                self.assertEqual(
+                    rubble.process.call([['ping', pid]], pid)['output'],
+                    [['ping', pid]])
+            return worker
+
+        with ThreadPoolExecutor(self.threads) as executor:
+            finished = list(executor.map(work, range(self.threads)))
+
+        self.assertEqual(finished, list(range(self.threads)))
+
+        # all subsystems were created once and share one transport
+        self.assertIs(rubble.process.transport, rubble.transport)
+
+        # connections are reused across requests rather than opened per
+        # request
+        self.assertLessEqual(len(self.server.connections), self.threads)
+        rubble.transport.close()
+
+    def test_warm_up(self):
+        url = self.server.url
+        self.server.connections.clear()
+        rubble = Client('key', 'password', config={
+            'url': {'root': url},
+            'pool': {'warm': 4},
+        })
+
+        # the connections were opened by unauthenticated probes
+        self.assertEqual(len(self.server.connections), 4)
+        self.assertEqual(self.server.probe_auth, {None})
+
+        # and are then used by requests
+        for pid in range(4):
+            rubble.process.get(str(pid))
+        self.assertEqual(len(self.server.connections), 4)
+        rubble.transport.close()
+
+    def test_client_pool(self):
+        url = self.server.url
+        clients = ClientPool(config={'url': {'root': url}}, maxsize=2)
+
+        first = clients.client('tenant1', 'secret')
+        self.assertIs(clients.client('tenant1', 'secret'), first)
+        second = clients.client('tenant2', 'secret')
+
+        # every client shares the pool's connections
+        self.assertIs(first.transport.adapter, second.transport.adapter)
+
+        # domain info is cached
+        requests = self.server.domain_info_requests
+        for _ in range(3):
+            self.assertEqual(clients.domain_info('tenant1', 'secret'),
+                             {'domain': 'acme', 'apikey': 'key'})
+        self.assertEqual(self.server.domain_info_requests, requests + 1)
+
+        # tenant2 is the least recently used
+        clients.client('tenant3', 'secret')
+        self.assertEqual(len(clients), 2)
+        self.assertNotIn(('tenant2', 'secret'), clients)
+        self.assertIn(('tenant1', 'secret'), clients)
+        clients.close()
+
+    def test_client_pool_shares_probes(self):
+        url = self.server.url
+        clients = ClientPool(config={
+            'url': {'root': url},
+            'pool': {'keepalive': 60},
+            # every request after the first goes through the hedger's
+            # threads
+            'hedging': {'enabled': True, 'warmup': 0, 'budget': 1.0},
+        }, maxsize=1)
+
+        first = clients.client('tenant1', 'secret')
+        first.process.get(1)
+        second = clients.client('tenant2', 'secret')
+
+        # one keep-alive thread for the shared connection pool
+        keepalives = [thread for thread in threading.enumerate()
+                      if thread.name == 'pybble-keepalive']
+        self.assertEqual(len(keepalives), 1)
+
+        # and one hedger, which a handler still holding the evicted client
+        # keeps using
+        self.assertNotIn(('tenant1', 'secret'), clients)
+        self.assertIs(first.transport.hedger, second.transport.hedger)
+        first.process.get(1)
+        first.process.get(1)
+        self.assertGreaterEqual(clients.hedger.stats.requests, 3)
+
+        # once the pool is closed requests are sent without hedging
+        clients.close()
+        first.process.get(1)
@@ -0,0 +1,121 @@
+import json
+from unittest import TestCase
+
+from pybble.deploy import Deployment
+from pybble.error import RubbleServerException
+from pybble.response import LazyResponse
+
+
+class FakeFile:
+
+    def __init__(self, files, error=None):
+        self.files = files
+        self.error = error
+
+    def read(self, path):
+        if self.error is not None:
+            raise RubbleServerException(self.error)
+        if path not in self.files:
+            raise RubbleServerException("404 Not Found")
+        return self.files[path]
+
+    def write(self, path, data):
+        self.files[path] = data
+
+    def delete(self, path):
+        del self.files[path]
+
+
+class FakeProcess:
+
+    def __init__(self, processes, failing=()):
+        self.processes = processes
+        self.failing = set(failing)
+        self.updates = []
+
+    def list_pages(self, page_size=1000):
+        yield [{'pid': pid, 'type': 'rules'} for pid in sorted(self.processes)]
+
+    def get(self, pid, prettyprint=True, lazy=False):
+        document = {'content': dict(self.processes[pid], pid=pid)}
+        if lazy:
+            return LazyResponse(json.dumps(document).encode('utf-8'))
+        return document
+
+    def update(self, rulesref, pid, **kwargs):
+        if pid in self.failing and rulesref == 'file:/orders.rubble':
+            raise RubbleServerException("500 Internal Server Error")
+        self.updates.append((pid, rulesref, kwargs))
+        self.processes[pid] = dict(kwargs, rulesref=rulesref)
+
+
+class TestDeployment(TestCase):
+    """
+    Tests rolling out rule files, pybble.deploy
+    """
+
+    def processes(self):
+        return {
+            '1': {'rulesref': 'file:/orders.rubble', 'facts': 'a;',
+                  'factsformat': 1},
+            '2': {'rulesref': 'file:///orders-v1.rubble', 'facts': 'b;',
+                  'factsformat': 1, 'trapstate': '<trapstate/>'},
+            '3': {'rulesref': 'file:/other.rubble', 'facts': 'c;',
+                  'factsformat': 1},
+        }
+
+    def test_deploy(self):
+        file = FakeFile({'orders.rubble': 'old;'})
+        process = FakeProcess(self.processes())
+        stages = []
+
+        report = Deployment(file, process, 'orders.rubble', 'new;',
+                            replaces=['file:/orders-v1.rubble'],
+                            progress=lambda r: stages.append(r.stage)).run()
+
+        self.assertTrue(report.ok)
+        self.assertEqual(file.files['orders.rubble'], 'new;')
+        self.assertEqual(sorted(report.found), ['1', '2'])
+        self.assertEqual(stages[-1], 'done')
+        # the process state is passed along, so it isn't reset
+        self.assertEqual(process.processes['2'], {
+            'rulesref': 'file:/orders.rubble', 'facts': 'b;',
+            'factsformat': 1, 'trapstate': '<trapstate/>'})
+        self.assertEqual(process.processes['3']['rulesref'],
+                         'file:/other.rubble')
+
+    def test_rollback(self):
+        file = FakeFile({'orders.rubble': 'old;'})
+        process = FakeProcess(self.processes(), failing=['2'])
+
+        report = Deployment(file, process, 'orders.rubble', 'new;',
+                            replaces=['file:/orders-v1.rubble'],
+                            workers=1).run()
+
+        self.assertTrue(report.rolled_back)
+        self.assertEqual([pid for pid, error in report.failures], ['2'])
+        self.assertEqual(report.updated, [])
+        self.assertEqual(file.files['orders.rubble'], 'old;')
+        self.assertEqual(process.processes['1']['rulesref'],
+                         'file:/orders.rubble')
+        self.assertEqual(process.processes['2']['rulesref'],
+                         'file:///orders-v1.rubble')
+
+    def test_new_rule_file_rolled_back(self):
+        file = FakeFile({})
+        process = FakeProcess(self.processes(), failing=['1'])
+
+        report = Deployment(file, process, 'orders.rubble', 'new;').run()
+
+        self.assertTrue(report.rolled_back)
+        self.assertEqual(file.files, {})
+
+    def test_unreadable_rule_file(self):
+        file = FakeFile({'orders.rubble': 'old;'},
+                        error="503 Service Unavailable")
+        process = FakeProcess(self.processes())
+
+        with self.assertRaises(RubbleServerException):
+            Deployment(file, process, 'orders.rubble', 'new;').run()
+        self.assertEqual(file.files, {'orders.rubble': 'old;'})
+        self.assertEqual(process.updates, [])
@@ -0,0 +1,73 @@
+import json
+from unittest import TestCase, skipUnless
+
+from pybble.export import export, numpy_available, page_columns
+from pybble.response import LazyResponse
+
+
+class FakeProcess:
+    """Serves processlist pages from a list of processes"""
+
+    def __init__(self, processes):
+        self.processes = processes
+
+    def list(self, lazy=False, pidBegin=0, maxItems=2147483647):
+        page = [item for item in self.processes
+                if int(item['pid']) >= pidBegin][:maxItems]
+        return LazyResponse(json.dumps({'result': page}).encode('utf-8'))
+
+
+class TestExport(TestCase):
+    """
+    Tests columnar export of the process list, pybble.export
+    """
+
+    processes = [
+        {'pid': str(pid), 'domain': 'acme' if pid % 3 else 'globex',
+         'modtime': 1000 + pid, 'type': 'rules'}
+        for pid in range(1, 26)
+    ]
+
+    def test_export_pages(self):
+        columns = export(FakeProcess(self.processes), page_size=10)
+
+        self.assertEqual(len(columns), 25)
+        self.assertEqual(list(columns.rows())[2], (3, 1003, 'globex', 'rules'))
+        self.assertEqual(columns.domain.values, ['acme', 'globex'])
+        self.assertEqual(columns.type.values, ['rules'])
+
+    def test_missing_properties(self):
+        items = [
+            {'pid': '1', 'modtime': 1, 'type': 'rules'},
+            {'pid': '2', 'modtime': 2, 'domain': 'acme'},
+            {'pid': '3', 'domain': 'globex', 'type': 'rules'},
+            {'pid': '4', 'modtime': 4, 'domain': 'acme', 'type': 'rules'},
+        ]
+        # every column has three values, but not of the same items
+        response = LazyResponse(json.dumps({'result': items}).encode())
+
+        self.assertEqual(page_columns(response), (
+            ['1', '2', '3', '4'], [1, 2, 0, 4],
+            ['', 'acme', 'globex', 'acme'], ['rules'] * 4))
+
+        # complete items are scanned without decoding
+        response = LazyResponse(json.dumps({'result': items[3:]}).encode())
+        self.assertEqual(page_columns(response),
+                         (['4'], [4], ['acme'], ['rules']))
+        self.assertFalse(response.decoded)
+
+    def test_modtime_filter(self):
+        process = FakeProcess(self.processes)
+        columns = export(process, page_size=10, since=1005, before=1010)
+        self.assertEqual(list(columns.pid), [5, 6, 7, 8, 9])
+
+        recent = export(process, page_size=10).where_modified(since=1020)
+        self.assertEqual(list(recent.pid), [20, 21, 22, 23, 24, 25])
+        self.assertEqual(list(recent.domain)[:2], ['acme', 'globex'])
+
+    @skipUnless(numpy_available(), "requires numpy")
+    def test_to_numpy(self):
+        arrays = export(FakeProcess(self.processes)).to_numpy()
+        self.assertEqual(arrays['modtime'].sum(), sum(range(1001, 1026)))
+        self.assertEqual(list(arrays['domain'][:3]),
+                         ['acme', 'acme', 'globex'])
@@ -0,0 +1,36 @@
+from unittest import TestCase
+
+from pybble import facts
+
+
+class TestFacts(TestCase):
+    """
+    Tests converting and diffing facts, pybble.facts
+    """
+
+    native = ('completed(task23); device_category(1,"Mobile device"); '
+              'leap_year; daylight_saving; f(g(h), i(j,k));')
+
+    json = [["completed", "task23"],
+            ["device_category", "1", "Mobile device"],
+            ["leap_year"],
+            "daylight_saving",
+            ["f", ["g", "h"], ["i", "j", "k"]]]
+
+    def test_native_and_json_facts_are_equivalent(self):
+        self.assertFalse(facts.diff(self.native, self.json))
+
+    def test_to_native_round_trips(self):
+        native = ';'.join(facts.to_native(term) for term in self.json)
+        self.assertFalse(facts.diff(native, self.json))
+
+    def test_diff_finds_added_and_removed(self):
+        new = self.json[1:] + [["owner", "Jane Doe"]]
+        change = facts.diff(self.native, new)
+
+        self.assertEqual(change.added, [["owner", "Jane Doe"]])
+        self.assertEqual(change.removed, [["completed", "task23"]])
+
+    def test_rules_cannot_be_parsed(self):
+        with self.assertRaises(ValueError):
+            facts.parse_native('happy(X) :- rich(X);')
@@ -0,0 +1,116 @@
+import json
+import pickle
+import threading
+from unittest import TestCase
+
+from pybble import fanout
+from pybble.error import RubbleServerException
+from pybble.fanout import chunks, estimate_size, fan_out
+from pybble.tests.mock_rubble import (MockRubbleHandler, start_server,
+                                      stop_server)
+
+
+class MissingHandler(MockRubbleHandler):
+    """Answers calls to pid(missing) with 404"""
+
+    def do_POST(self):
+        if 'pid(missing)' in self.path:
+            self.read_body()
+            self.respond(b'', status=404)
+            return
+        super().do_POST()
+
+
+class Unpicklable(Exception):
+    """An error holding a lock, which can't be pickled"""
+
+    def __init__(self):
+        super().__init__('unpicklable')
+        self.lock = threading.Lock()
+
+
+class TestFanOut(TestCase):
+    """
+    Tests running bulk operations on worker processes, pybble.fanout
+    """
+
+    def test_estimate_size(self):
+        terms = [['fact', str(i), {'n': i}] for i in range(10000)]
+        encoded = len(json.dumps(terms, separators=(',', ':')))
+        self.assertAlmostEqual(estimate_size((terms, '42')) / encoded, 1.0,
+                               delta=0.1)
+        self.assertEqual(estimate_size('abc'), 5)
+        self.assertEqual(estimate_size(([], {})), 4)
+
+    def test_chunks(self):
+        items = list(enumerate([('x' * 98,)] * 10))
+
+        self.assertEqual([len(chunk) for chunk in
+                          chunks(items, 300, 1000, estimate_size)],
+                         [3, 3, 3, 1])
+        self.assertEqual([len(chunk) for chunk in
+                          chunks(items, 1000, 4, estimate_size)], [4, 4, 2])
+        self.assertEqual([len(chunk) for chunk in
+                          chunks(items, 5, 1000, None)], [5, 5])
+        self.assertEqual([index for chunk in chunks(items, 300, 1000, len)
+                          for index, args in chunk], list(range(10)))
+
+    def test_fan_out(self):
+        server = start_server()
+        self.addCleanup(stop_server, server)
+
+        url = server.url
+        items = [([['ping', str(i)]], str(i)) for i in range(50)]
+        results = list(fan_out('key', 'password', {'url': {'root': url}},
+                               'process.call', items, processes=2,
+                               chunk_bytes=100))
+
+        self.assertEqual(sorted(index for index, _, _ in results),
+                         list(range(50)))
+        for index, result, error in results:
+            self.assertIsNone(error)
+            self.assertEqual(result['output'], items[index][0])
+
+    def test_unpicklable_errors_are_described(self):
+        class Subsystem:
+            def fail(self, value):
+                raise Unpicklable()
+
+            def echo(self, value):
+                return value
+
+        class FakeClient:
+            subsystem = Subsystem()
+
+        self.addCleanup(setattr, fanout, '_client', fanout._client)
+        fanout._client = FakeClient()
+
+        results = fanout._run('subsystem.fail', [(0, ('a',))], 1, {})
+        (index, result, error), = pickle.loads(pickle.dumps(results))
+        self.assertIsInstance(error, RuntimeError)
+        self.assertIn('Unpicklable', str(error))
+
+        self.assertEqual(fanout._run('subsystem.echo', [(0, ('a',))], 1, {}),
+                         [(0, 'a', None)])
+
+    def test_failed_chunk_reported_per_item(self):
+        server = start_server(MissingHandler)
+        self.addCleanup(stop_server, server)
+
+        # call_stream returns a generator, which can't be sent back from a
+        # worker process, unless the call fails at once
+        items = [([['ping']], pid) for pid in ('1', 'missing', '2', 'missing')]
+        results = list(fan_out('key', 'password',
+                               {'url': {'root': server.url}},
+                               'process.call_stream', items, processes=2,
+                               max_items=1))
+
+        self.assertEqual(sorted(index for index, _, _ in results),
+                         list(range(4)))
+        for index, result, error in results:
+            self.assertIsNone(result)
+            if items[index][1] == 'missing':
+                self.assertIsInstance(error, RubbleServerException)
+            else:
+                self.assertNotIsInstance(error, RubbleServerException)
+                self.assertIsNotNone(error)
@@ -0,0 +1,116 @@
+import threading
+import time
+from unittest import TestCase
+
+from pybble.hedge import Hedger, LatencyTracker
+
+
+class Response:
+
+    def __init__(self, url):
+        self.url = url
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class TestHedger(TestCase):
+    """
+    Tests hedging slow requests, pybble.hedge
+    """
+
+    root = 'https://primary.example.com/'
+    url = root + 'rubble/service/process?pid=1'
+
+    def hedger(self, **options):
+        options.setdefault('warmup', 5)
+        options.setdefault('min_delay', 0.01)
+        options.setdefault('urls', ['https://secondary.example.com/'])
+        return Hedger(options, self.root)
+
+    def warm_up(self, hedger):
+        for _ in range(hedger.warmup):
+            hedger.send(Response, self.url)
+
+    def test_slow_primary_is_hedged(self):
+        hedger = self.hedger(budget=1.0)
+        self.warm_up(hedger)
+        responses = []
+
+        def send(url):
+            if url.startswith(self.root):
+                time.sleep(0.3)
+            response = Response(url)
+            responses.append(response)
+            return response
+
+        response = hedger.send(send, self.url)
+
+        self.assertEqual(response.url, 'https://secondary.example.com/'
+                                       'rubble/service/process?pid=1')
+        self.assertEqual((hedger.stats.hedged, hedger.stats.wins), (1, 1))
+
+        # the late primary response is released when it arrives
+        time.sleep(0.5)
+        self.assertEqual([r.closed for r in responses], [False, True])
+
+    def test_budget(self):
+        hedger = self.hedger(budget=0.0)
+        self.warm_up(hedger)
+
+        def send(url):
+            time.sleep(0.05)
+            return Response(url)
+
+        self.assertEqual(hedger.send(send, self.url).url, self.url)
+        self.assertEqual((hedger.stats.hedged, hedger.stats.denied), (0, 1))
+        self.assertEqual(hedger.stats.hedge_rate, 0.0)
+
+    def test_unhedgeable_requests_stay_on_calling_thread(self):
+        hedger = self.hedger(budget=0.0)
+        threads = set()
+
+        def send(url):
+            threads.add(threading.get_ident())
+            return Response(url)
+
+        for _ in range(hedger.warmup + 5):
+            hedger.send(send, self.url)
+        self.assertEqual(threads, {threading.get_ident()})
+        self.assertIsNone(hedger._executor)
+
+    def test_closed_hedger_sends_inline(self):
+        hedger = self.hedger(budget=1.0)
+        self.warm_up(hedger)
+        # start the hedging threads
+        hedger.send(Response, self.url)
+        hedger.close()
+        threads = set()
+
+        def send(url):
+            threads.add(threading.get_ident())
+            time.sleep(0.05)
+            return Response(url)
+
+        self.assertEqual(hedger.send(send, self.url).url, self.url)
+        self.assertEqual(threads, {threading.get_ident()})
+
+    def test_percentile_cached(self):
+        tracker = LatencyTracker(window=100, refresh=10)
+        for seconds in range(100):
+            tracker.record(seconds)
+        self.assertEqual(tracker.percentile(90), 90)
+
+        # served from the cache until refresh new latencies are recorded
+        for _ in range(9):
+            tracker.record(1000)
+        self.assertEqual(tracker.percentile(90), 90)
+        tracker.record(1000)
+        self.assertEqual(tracker.percentile(90), 1000)
+        self.assertIsNone(LatencyTracker().percentile(50))
+
+    def test_no_warmup(self):
+        hedger = self.hedger(warmup=0)
+        self.assertEqual(hedger.send(Response, self.url).url, self.url)
+        self.assertEqual(hedger.send(Response, self.url).url, self.url)
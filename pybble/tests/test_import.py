@@ -0,0 +1,20 @@
+import subprocess
+import sys
+from unittest import TestCase
+
+
+class TestImport(TestCase):
+    """
+    Tests that importing pybble and creating a Client stays cheap
+    """
+
+    def test_client_creation_imports_no_heavy_modules(self):
+        code = ("import sys, pybble; pybble.client.Client('key', 'password'); "
+                "print(' '.join(m for m in ('requests', 'numpy', "
+                "'xml.etree.ElementTree', 'asyncio', 'pybble.process') "
+                "if m in sys.modules))")
+        output = subprocess.run([sys.executable, '-c', code], check=True,
+                                stdout=subprocess.PIPE,
+                                universal_newlines=True)
+
+        self.assertEqual(output.stdout.split(), [])
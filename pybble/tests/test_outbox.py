@@ -0,0 +1,131 @@
+import json
+import os
+import tempfile
+import threading
+from unittest import TestCase
+
+from pybble.error import RubbleServerException
+from pybble.outbox import Outbox
+
+
+class FakeProcess:
+    """Records delivered messages, failing with the exceptions queued in
+    errors first
+    """
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def send(self, terms, pid, channel=None, **kwargs):
+        with self.lock:
+            if self.errors:
+                raise self.errors.pop(0)
+            self.sent.append((channel or pid, terms))
+        return {}
+
+
+class TestOutbox(TestCase):
+    """
+    Tests the durable outbox, pybble.outbox
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'messages')
+
+    def outbox(self, process, **kwargs):
+        kwargs.setdefault('backoff', 0.01)
+        return Outbox(process, self.path, **kwargs)
+
+    def lines(self, suffix):
+        with open(self.path + suffix) as lines_file:
+            return lines_file.read()
+
+    def test_ordered_within_channel(self):
+        process = FakeProcess()
+        outbox = self.outbox(process, workers=4)
+        for i in range(50):
+            outbox.send([['n', i]], pid=i % 3)
+        self.assertTrue(outbox.flush(5))
+        outbox.close()
+
+        self.assertEqual(outbox.stats.delivered, 50)
+        for pid in range(3):
+            self.assertEqual([terms[0][1] for to, terms in process.sent
+                              if to == pid],
+                             list(range(pid, 50, 3)))
+
+    def test_retry_and_refusal(self):
+        process = FakeProcess([ConnectionError(),
+                               RubbleServerException('429 Too Many Requests'),
+                               RubbleServerException('404 Not Found')])
+        outbox = self.outbox(process)
+        outbox.send([['first']], channel='orders')
+        outbox.send([['second']], channel='orders')
+        self.assertTrue(outbox.flush(5))
+        outbox.close()
+
+        # the first was retried twice and then refused, without blocking
+        # the channel
+        self.assertEqual(process.sent, [('orders', [['second']])])
+        self.assertEqual(outbox.stats.retries, 2)
+        self.assertEqual(outbox.stats.failed, 1)
+        message, error = outbox.failures[0]
+        self.assertEqual(message['terms'], [['first']])
+
+    def test_max_attempts(self):
+        process = FakeProcess([ConnectionError()] * 3)
+        outbox = self.outbox(process, max_attempts=2)
+        outbox.send([['lost']], pid=1)
+        outbox.send([['kept']], pid=1)
+        self.assertTrue(outbox.flush(5))
+        outbox.close()
+
+        self.assertEqual(outbox.stats.failed, 1)
+        self.assertEqual(process.sent, [(1, [['kept']])])
+
+    def test_recover_torn_lines(self):
+        with open(self.path + '.log', 'w') as log_file:
+            for i in range(3):
+                log_file.write(json.dumps({
+                    'id': i, 'channel': 'pid(1)', 'pid': 1,
+                    'terms': [['n', i]], 'kwargs': {}}) + '\n')
+            log_file.write('{"id": 3, "chan')
+        with open(self.path + '.acks', 'w') as acks_file:
+            # 1 may have been delivered, but wasn't acknowledged
+            acks_file.write('0\n1')
+
+        process = FakeProcess()
+        outbox = self.outbox(process)
+        self.assertEqual(outbox.send([['n', 3]], pid=1), 3)
+        self.assertTrue(outbox.flush(5))
+
+        self.assertEqual(process.sent,
+                         [(1, [['n', 1]]), (1, [['n', 2]]), (1, [['n', 3]])])
+        self.assertEqual(self.lines('.acks'), '0\n1\n2\n3\n')
+        outbox.close()
+
+    def test_close_compacts(self):
+        process = FakeProcess([ConnectionError()])
+        outbox = self.outbox(process, backoff=60)
+        outbox.send([['pending']], pid=1)
+        # interrupts the backoff
+        outbox.close(timeout=0.1)
+
+        self.assertEqual(self.lines('.acks'), '')
+        marker, message = self.lines('.log').splitlines()
+        self.assertEqual(json.loads(marker), {'next_id': 1})
+        self.assertEqual(json.loads(message)['terms'], [['pending']])
+
+        # reopened, the pending message is delivered and IDs carry on
+        process = FakeProcess()
+        outbox = self.outbox(process)
+        self.assertEqual(outbox.send([['next']], pid=1), 1)
+        self.assertTrue(outbox.flush(5))
+        outbox.close()
+
+        self.assertEqual(process.sent, [(1, [['pending']]), (1, [['next']])])
+        self.assertEqual(self.lines('.log'), '{"next_id":2}\n')
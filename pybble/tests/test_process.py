@@ -0,0 +1,232 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from pybble.batch import Checkpoint
+from pybble.client import Client
+from pybble.error import RubbleServerException
+from pybble.facts import encoded_size
+from pybble.process import RubbleProcess
+from pybble.tests.mock_rubble import (FakeTransport, MockRubbleHandler,
+                                      start_server, stop_server)
+from pybble.transport import decompress
+
+
+class CallHandler(MockRubbleHandler):
+    """Answers calls to pid(missing) with 404"""
+
+    def do_POST(self):
+        if 'pid(missing)' in self.path:
+            self.server.calls += 1
+            self.read_body()
+            self.respond(b'', status=404)
+            return
+        super().do_POST()
+
+
+class TestCallStream(TestCase):
+    """
+    Tests streaming call output, pybble.process.RubbleProcess.call_stream
+    """
+
+    def setUp(self):
+        self.server = start_server(CallHandler)
+        self.addCleanup(stop_server, self.server)
+
+        self.rubble = Client('key', 'password', config={
+            'url': {'root': self.server.url},
+        })
+        self.addCleanup(self.rubble.transport.close)
+
+    def test_sent_before_iterating(self):
+        terms = [['ping', str(i)] for i in range(100)]
+        output = self.rubble.process.call_stream(terms, 1, chunk_size=16)
+
+        self.assertEqual(self.server.calls, 1)
+        self.assertEqual(list(output), terms)
+
+    def test_error_raised_at_once(self):
+        with self.assertRaises(RubbleServerException):
+            self.rubble.process.call_stream([['ping']], 'missing')
+        self.assertEqual(self.server.calls, 1)
+
+
+class TestUpdateFacts(TestCase):
+    """
+    Tests updating facts with the cheapest request,
+    pybble.process.RubbleProcess.update_facts
+    """
+
+    previous = [['fact', str(i)] for i in range(200)]
+
+    def setUp(self):
+        self.status = 200
+        self.refuse = False
+        self.transport = FakeTransport(self.answer)
+        self.process = RubbleProcess(None, {}, transport=self.transport)
+
+    def answer(self, method, url, kwargs):
+        if url.endswith('/process'):
+            return 200, {'content': {'facts': self.previous}}
+        if 'content-encoding' in kwargs['headers'] and self.refuse:
+            return 415, b''
+        return self.status, {'pid': '1'}
+
+    def sent(self):
+        return [url.rsplit('/', 1)[1]
+                for method, url, kwargs in self.transport.requests]
+
+    @staticmethod
+    def delta(added, removed):
+        return ([['assert', term] for term in added] +
+                [['retract', term] for term in removed])
+
+    def test_noop(self):
+        update = self.process.update_facts(1, 'rules', self.previous,
+                                           previous=self.previous)
+
+        self.assertEqual(update.path, 'noop')
+        self.assertEqual(update.bytes_sent, 0)
+        self.assertEqual(self.sent(), [])
+
+    def test_delta_smaller_than_full(self):
+        facts = self.previous[1:] + [['fact', 'new']]
+        update = self.process.update_facts(1, 'rules', facts,
+                                           previous=self.previous,
+                                           delta=self.delta)
+
+        self.assertEqual(update.path, 'delta')
+        self.assertEqual(self.sent(), ['call?channel=pid(1)'])
+        terms = [['assert', ['fact', 'new']],
+                 ['retract', ['fact', '0']]]
+        self.assertEqual(update.bytes_sent, encoded_size(terms))
+        self.assertEqual(update.bytes_full, encoded_size(
+            {'pid': '1', 'rulesref': 'rules', 'facts': facts}))
+        self.assertEqual(update.bytes_saved,
+                         update.bytes_full - update.bytes_sent)
+
+    def test_full_when_delta_is_larger(self):
+        facts = [['other', str(i)] for i in range(5)]
+        update = self.process.update_facts(1, 'rules', facts,
+                                           previous=self.previous,
+                                           delta=self.delta)
+
+        self.assertEqual(update.path, 'full')
+        self.assertEqual(self.sent(), ['processupdate'])
+
+    def test_full_update_is_compressed(self):
+        facts = self.previous + [['fact', 'new']]
+        update = self.process.update_facts(1, 'rules', facts,
+                                           previous=self.previous)
+
+        self.assertEqual(update.path, 'full')
+        self.assertEqual(update.response, {'pid': '1'})
+        (method, url, kwargs), = self.transport.requests
+        self.assertEqual(kwargs['headers']['content-encoding'], 'gzip')
+        self.assertEqual(update.bytes_sent, len(kwargs['data']))
+        self.assertLess(update.bytes_sent, update.bytes_full)
+        payload = json.loads(decompress(kwargs['data'], 'gzip'))
+        self.assertEqual(payload['facts'], facts)
+
+    def test_full_update_falls_back_to_uncompressed(self):
+        self.refuse = True
+        facts = self.previous + [['fact', 'new']]
+        update = self.process.update_facts(1, 'rules', facts,
+                                           previous=self.previous)
+
+        self.assertEqual(self.sent(), ['processupdate', 'processupdate'])
+        self.assertEqual(update.bytes_sent, update.bytes_full)
+        self.assertEqual(update.bytes_saved, 0)
+
+    def test_fetches_previous_facts(self):
+        update = self.process.update_facts(1, 'rules', self.previous)
+
+        self.assertEqual(update.path, 'noop')
+        self.assertEqual(self.sent(), ['process'])
+
+    def test_error_raised(self):
+        self.status = 500
+        with self.assertRaises(RubbleServerException):
+            self.process.update_facts(1, 'rules', [['fact', 'new']],
+                                      previous=self.previous)
+
+
+class TestBulk(TestCase):
+    """
+    Tests creating and deleting many processes,
+    pybble.process.RubbleProcess.create_many and delete_many
+    """
+
+    def setUp(self):
+        self.transport = FakeTransport(self.answer)
+        self.process = RubbleProcess(None, {}, transport=self.transport)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.checkpoint = os.path.join(directory.name, 'checkpoint.jsonl')
+        self.existing = {'1', '2', '3'}
+
+    def answer(self, method, url, kwargs):
+        if method == 'DELETE':
+            pid = str(kwargs['params']['pid'])
+            if pid not in self.existing:
+                return 200, {'error': 'No such process'}
+            self.existing.remove(pid)
+            return 200, {}
+        rulesref = json.loads(kwargs['data'])['rulesref']
+        if rulesref == 'file:/missing.rubble':
+            return 200, {'error': 'No such rule file'}
+        return 200, {'pid': rulesref.rsplit('/', 1)[1].split('.')[0]}
+
+    def created(self):
+        return [json.loads(kwargs['data'])['rulesref']
+                for method, url, kwargs in self.transport.requests]
+
+    def test_create_many(self):
+        result = self.process.create_many([
+            'file:/a.rubble',
+            {'rulesref': 'file:/b.rubble', 'facts': [['f']]},
+            'file:/missing.rubble',
+        ])
+
+        self.assertEqual(result.results, {0: 'a', 1: 'b'})
+        self.assertEqual(list(result.failures), [2])
+        self.assertIsInstance(result.failures[2], RubbleServerException)
+        self.assertEqual((result.succeeded, result.failed), (2, 1))
+        self.assertEqual(sorted(self.created()),
+                         ['file:/a.rubble', 'file:/b.rubble',
+                          'file:/missing.rubble'])
+
+    def test_create_many_resumes_by_position(self):
+        checkpoint = Checkpoint(self.checkpoint)
+        checkpoint.record(0, 'a')
+        checkpoint.close()
+
+        result = self.process.create_many(
+            ['file:/a.rubble', 'file:/b.rubble'], checkpoint=self.checkpoint)
+
+        self.assertEqual(self.created(), ['file:/b.rubble'])
+        self.assertEqual(result.results, {0: 'a', 1: 'b'})
+        self.assertEqual(result.skipped, 1)
+        checkpoint = Checkpoint(self.checkpoint)
+        checkpoint.close()
+        self.assertEqual(checkpoint.done, {0: 'a', 1: 'b'})
+
+    def test_delete_many(self):
+        result = self.process.delete_many([1, 2, 4])
+
+        self.assertEqual(result.results, {'1': {}, '2': {}})
+        self.assertEqual(list(result.failures), ['4'])
+        self.assertIsInstance(result.failures['4'], RubbleServerException)
+        self.assertEqual(self.existing, {'3'})
+
+    def test_delete_many_resumes_by_pid(self):
+        self.process.delete_many([1], checkpoint=self.checkpoint)
+        # 1 is gone, deleting it again would fail
+        result = self.process.delete_many([1, 2],
+                                          checkpoint=self.checkpoint)
+
+        self.assertEqual(result.results, {'1': {}, '2': {}})
+        self.assertEqual(result.skipped, 1)
+        self.assertFalse(result.failures)
+        self.assertEqual(len(self.transport.requests), 2)
@@ -0,0 +1,108 @@
+from unittest import TestCase
+
+from pybble.client import Client
+from pybble.profile import Profiler
+from pybble.tests.mock_rubble import start_server, stop_server
+
+API = 'https://rubble.example.com/rubble/service/'
+
+
+class TestProfiler(TestCase):
+    """
+    Tests attributing request time to phases, pybble.profile
+    """
+
+    def request(self, profiler, url, ok=True):
+        profiler.begin_request(url)
+        profiler.lap('serialize')
+        profiler.lap('network')
+        profiler.end_request(ok)
+
+    def test_operations_per_endpoint(self):
+        profiler = Profiler(API)
+
+        def get(pid):
+            self.request(profiler, API + 'process?pid={}'.format(pid))
+
+        def read(path):
+            self.request(profiler, API + 'file/' + path, ok=False)
+            raise ValueError(path)
+
+        for pid in range(3):
+            profiler.operation('process.get', get)(pid)
+        with self.assertRaises(ValueError):
+            profiler.operation('file.read', read)('a.rubble')
+        # outside of any operation
+        self.request(profiler, API + 'process?pid=4')
+
+        self.assertEqual(set(profiler.endpoints), {'process', 'file/'})
+        process = profiler.endpoints['process']
+        self.assertEqual(process.requests, 4)
+        self.assertEqual(process.operations, {'process.get'})
+        self.assertEqual(process.seconds['error'], 0.0)
+        self.assertGreater(profiler.endpoints['file/'].seconds['error'], 0.0)
+
+        report = profiler.report().splitlines()
+        self.assertEqual(len(report), 3)
+        self.assertTrue(report[0].startswith('endpoint'))
+
+    def test_failed_request_timed_as_network(self):
+        import requests
+
+        # nothing listens on port 1, connecting fails at once
+        rubble = Client('key', 'password', config={
+            'url': {'root': 'http://127.0.0.1:1/'},
+            'profile': {'enabled': True},
+        })
+        self.addCleanup(rubble.close)
+        profiler = rubble.profiler
+
+        with self.assertRaises(requests.ConnectionError):
+            rubble.transport.get(rubble.config.endpoint('process'))
+        self.assertIsNone(profiler._local.request)
+        process = profiler.endpoints['process']
+        self.assertEqual(process.requests, 1)
+        self.assertGreater(process.seconds['network'], 0.0)
+
+        network = process.seconds['network']
+        with self.assertRaises(requests.ConnectionError):
+            rubble.process.get(1)
+        self.assertEqual(process.requests, 2)
+        self.assertEqual(process.operations, {'process.get'})
+        # only the time after the failure is error handling
+        self.assertGreater(process.seconds['network'], network)
+        self.assertGreater(process.seconds['error'], 0.0)
+
+
+class TestProfiledHedging(TestCase):
+    """
+    Tests profiling requests that are sent on hedging threads
+    """
+
+    def test_timings_recorded_for_calling_thread(self):
+        server = start_server()
+        self.addCleanup(stop_server, server)
+
+        rubble = Client('key', 'password', config={
+            'url': {'root': server.url},
+            'profile': {'enabled': True},
+            # every request goes through the hedging threads, none is
+            # slow enough to be hedged
+            'hedging': {'enabled': True, 'warmup': 0, 'budget': 1.0,
+                        'min_delay': 10},
+        })
+        self.addCleanup(rubble.close)
+
+        # outside of an operation, so that every profiled one is sent on
+        # the hedging threads
+        rubble.transport.get(rubble.config.endpoint('process') + '?pid=0',
+                         hedge=True)
+        rubble.profiler.reset()
+        for pid in range(5):
+            rubble.process.get(str(pid))
+
+        self.assertIsNotNone(rubble.transport.hedger._executor)
+        process = rubble.profiler.endpoints['process']
+        self.assertEqual(process.requests, 5)
+        self.assertEqual(process.operations, {'process.get'})
+        self.assertGreater(process.seconds['network'], 0.0)
@@ -0,0 +1,102 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from pybble.config import ClientConfig
+from pybble.response import iter_array
+from pybble.tests.mock_rubble import BaseHandler, start_server, stop_server
+from pybble.transport import decompress
+from pybble.transport.recording import RecordingTransport, ReplayTransport
+
+
+class OutputHandler(BaseHandler):
+    """Answers with {"output": [...]} holding the decoded request terms"""
+
+    def do_POST(self):
+        body = self.read_body()
+        if self.headers.get('content-encoding'):
+            body = decompress(body, self.headers['content-encoding'])
+        self.respond({'output': json.loads(body)})
+
+
+class TestRecording(TestCase):
+    """
+    Tests recording and replaying traffic, pybble.transport.recording
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = start_server(OutputHandler)
+
+    @classmethod
+    def tearDownClass(cls):
+        stop_server(cls.server)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'traffic.jsonl')
+        self.url = self.server.url + 'rubble/service/call'
+        # compress every request body
+        self.config = ClientConfig({'compression': {'request': 'gzip',
+                                                    'threshold': 1}})
+        self.terms = [['fact', str(i)] for i in range(50)]
+
+    def replay(self):
+        return ReplayTransport(None, self.config, self.path, speed=0,
+                               strict=True)
+
+    def records(self):
+        with open(self.path) as recording:
+            return [json.loads(line) for line in recording]
+
+    def test_compressed_request(self):
+        recorder = RecordingTransport(None, self.config, self.path)
+        self.assertEqual(recorder.post(self.url, json=self.terms).json(),
+                         {'output': self.terms})
+        recorder.close()
+
+        record, = self.records()
+        self.assertEqual(json.loads(record['request']['text']), self.terms)
+
+        replay = self.replay()
+        self.assertEqual(replay.post(self.url, json=self.terms).json(),
+                         {'output': self.terms})
+        with self.assertRaises(LookupError):
+            replay.post(self.url, json=self.terms[1:])
+
+    def test_iterable_body(self):
+        def body():
+            yield b'['
+            yield ','.join(json.dumps(term) for term in self.terms)
+            yield b']'
+
+        recorder = RecordingTransport(None, self.config, self.path)
+        self.assertEqual(recorder.post(self.url, data=body()).json(),
+                         {'output': self.terms})
+        recorder.close()
+
+        record, = self.records()
+        self.assertEqual(json.loads(record['request']['text']), self.terms)
+        self.assertEqual(self.replay().post(self.url, data=body()).json(),
+                         {'output': self.terms})
+
+    def test_streamed_response(self):
+        recorder = RecordingTransport(None, self.config, self.path)
+        response = recorder.post(self.url, json=self.terms, stream=True)
+        # nothing is recorded until the response has been read
+        self.assertEqual(self.records(), [])
+        output = list(iter_array(response.iter_content(64), 'output'))
+        response.close()
+        recorder.close()
+        self.assertEqual(output, self.terms)
+
+        record, = self.records()
+        self.assertEqual(json.loads(record['response']['text']),
+                         {'output': self.terms})
+
+        response = self.replay().post(self.url, json=self.terms, stream=True)
+        self.assertEqual(list(iter_array(response.iter_content(64),
+                                         'output')),
+                         self.terms)
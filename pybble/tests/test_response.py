@@ -0,0 +1,90 @@
+import json
+from unittest import TestCase
+
+from pybble.error import RubbleServerException
+from pybble.response import LazyResponse, iter_array
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class TestLazyResponse(TestCase):
+    """
+    Tests the lazily decoded responses, pybble.response.LazyResponse
+    """
+
+    document = {
+        'pid': 7,
+        'content': {
+            'rulesref': 'file:/orders.rubble',
+            'modtime': 1600000000000,
+            'facts': 'note("pid": 8, \\"x\\")',
+        },
+        'result': [{'pid': 1, 'ok': True}, {'pid': 2, 'ok': None}],
+    }
+
+    def setUp(self):
+        self.content = json.dumps(self.document).encode('utf-8')
+        self.response = LazyResponse(self.content)
+
+    def test_scan_without_decoding(self):
+        response = self.response
+        self.assertTrue(response.has('rulesref'))
+        self.assertFalse(response.has('error'))
+        self.assertEqual(response.scalar('rulesref'), 'file:/orders.rubble')
+        self.assertEqual(response.scalar('modtime'), 1600000000000)
+        self.assertEqual(response.column('ok'), [True, None])
+        # "pid" inside the facts string isn't a key
+        self.assertEqual(response.column('pid'), [7, 1, 2])
+        self.assertEqual(bytes(response.raw), self.content)
+        self.assertFalse(response.decoded)
+
+    def test_repeated_key_decodes(self):
+        response = self.response
+        # pid occurs three times, so the top level one is looked up
+        self.assertEqual(response.scalar('pid'), 7)
+        self.assertTrue(response.decoded)
+        self.assertIsNone(response.scalar('missing'))
+        self.assertEqual(response.scalar('missing', 0), 0)
+
+    def test_mapping(self):
+        response = self.response
+        self.assertEqual(response['content']['facts'],
+                         self.document['content']['facts'])
+        self.assertEqual(dict(response), self.document)
+        self.assertIn('result', response)
+        self.assertEqual(len(response), 3)
+        self.assertIs(response.decode(), response.decode())
+
+
+class TestIterArray(TestCase):
+    """
+    Tests decoding streamed call output, pybble.response.iter_array
+    """
+
+    output = [1, -2.5e3, 'pid(5) ü "quoted"', {'a': [1, 2]}, None, True,
+              12345678901234]
+
+    def test_split_anywhere(self):
+        data = json.dumps({'output': self.output},
+                          ensure_ascii=False).encode('utf-8')
+
+        # every split point, including inside numbers and multibyte chars
+        for size in range(1, 16):
+            self.assertEqual(list(iter_array(chunked(data, size), 'output')),
+                             self.output)
+
+    def test_other_layouts(self):
+        self.assertEqual(list(iter_array([b' [1, 2 ,3] '])), [1, 2, 3])
+        self.assertEqual(list(iter_array([b'{"output": []}'], 'output')), [])
+        self.assertEqual(
+            list(iter_array(chunked(b'{"n": 1, "output": [3]}', 2), 'output')),
+            [3])
+
+    def test_error(self):
+        with self.assertRaises(RubbleServerException):
+            list(iter_array(chunked(b'{"error": "no such pid"}', 3), 'output'))
+
+        with self.assertRaises(ValueError):
+            list(iter_array([b'[1 2]']))
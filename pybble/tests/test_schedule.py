@@ -0,0 +1,119 @@
+import datetime
+import threading
+from unittest import TestCase
+
+from pybble.batch import bounded_map
+from pybble.schedule import Scheduler
+
+UTC = datetime.timezone.utc
+
+
+class FakeProcess:
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def send(self, terms, pid, **kwargs):
+        if pid in self.failing:
+            raise ValueError("500 Internal Server Error")
+        with self.lock:
+            self.sent.append((pid, terms, kwargs.get('when')))
+        return {}
+
+
+class TestScheduler(TestCase):
+    """
+    Tests planning and enqueueing timed messages, pybble.schedule
+    """
+
+    def test_plan_orders_and_converts(self):
+        scheduler = Scheduler(FakeProcess())
+        scheduler.add(1, [['b']], datetime.datetime(2020, 1, 1, tzinfo=UTC))
+        scheduler.add(2, [['a']])
+        scheduler.add(1, [['c']], 1000)
+
+        self.assertEqual(scheduler.plan(), [
+            ('2', [['a']], None),
+            ('1', [['c']], 1000),
+            ('1', [['b']], 1577836800000),
+        ])
+
+    def test_integral_when(self):
+        try:
+            import numpy
+        except ImportError:
+            self.skipTest("requires numpy")
+
+        scheduler = Scheduler(FakeProcess())
+        scheduler.add(1, [['a']], numpy.int64(1000))
+        self.assertEqual(scheduler.plan(), [('1', [['a']], 1000)])
+        self.assertIs(type(scheduler.plan()[0][2]), int)
+
+    def test_merge_keeps_str_terms_whole(self):
+        scheduler = Scheduler(FakeProcess(), merge=True)
+        scheduler.add(1, 'daylight_saving', 1000)
+        scheduler.add(1, [['completed', 'task23']], 1000)
+
+        self.assertEqual(scheduler.plan(), [
+            ('1', ['daylight_saving', ['completed', 'task23']], 1000)])
+
+    def test_flush_reports_failures(self):
+        process = FakeProcess(failing={'2'})
+        scheduler = Scheduler(process, workers=2)
+        scheduler.extend([(1, [['a']], None), (2, [['b']], 1000)])
+
+        report = scheduler.flush()
+
+        self.assertEqual(process.sent, [('1', [['a']], None)])
+        self.assertEqual((report.succeeded, report.failed), (1, 1))
+        self.assertEqual(report.failures[0][:3], ('2', [['b']], 1000))
+        self.assertEqual(scheduler.entries, [])
+
+
+class TestBoundedMap(TestCase):
+    """
+    Tests pybble.batch.bounded_map
+    """
+
+    def test_results_and_errors(self):
+        def fn(item):
+            if item == 3:
+                raise ValueError(item)
+            return item * 2
+
+        results = sorted((item, result, type(error))
+                         for item, result, error in bounded_map(fn, range(5)))
+
+        self.assertEqual(results, [(0, 0, type(None)), (1, 2, type(None)),
+                                   (2, 4, type(None)), (3, None, ValueError),
+                                   (4, 8, type(None))])
+
+    def test_backpressure(self):
+        in_flight = []
+        peak = [0]
+        lock = threading.Lock()
+
+        def fn(item):
+            with lock:
+                in_flight.append(item)
+                peak[0] = max(peak[0], len(in_flight))
+            threading.Event().wait(0.001)
+            with lock:
+                in_flight.remove(item)
+
+        pulled = []
+
+        def items():
+            for i in range(100):
+                pulled.append(i)
+                yield i
+
+        results = bounded_map(fn, items(), workers=4, max_pending=6)
+        next(results)
+        # items are only pulled as the pending ones complete
+        self.assertLessEqual(len(pulled), 7)
+        list(results)
+        self.assertEqual(len(pulled), 100)
+        self.assertLessEqual(peak[0], 4)
@@ -0,0 +1,162 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from pybble.error import RubbleServerException
+from pybble.snapshot import SnapshotStore
+
+
+class FakeProcess:
+    """Lists and returns processes from a dict of pid to modtime"""
+
+    def __init__(self, modtimes):
+        self.modtimes = modtimes
+        self.fetched = []
+
+    def list_pages(self, page_size):
+        items = [{'pid': pid, 'modtime': modtime}
+                 for pid, modtime in self.modtimes.items()]
+        for i in range(0, len(items), page_size):
+            yield items[i:i + page_size]
+
+    def get(self, pid, prettyprint=True, raw=False):
+        self.fetched.append(pid)
+        if pid == 'gone':
+            body = {'error': 'No such process or unauthorized access'}
+        else:
+            body = {'content': {'pid': pid, 'modtime': self.modtimes[pid],
+                                'facts': 'a(' + pid + ');'}}
+        return json.dumps(body).encode('utf-8')
+
+
+class TestSnapshotStore(TestCase):
+    """
+    Tests the local snapshot of process states, pybble.snapshot
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'processes')
+        self.process = FakeProcess({'1': 10, '2': 20, '3': 30})
+
+    def test_round_trip(self):
+        store = SnapshotStore(self.path)
+        report = store.refresh(self.process, page_size=2)
+
+        self.assertEqual(report.succeeded, 3)
+        self.assertEqual(sorted(store), ['1', '2', '3'])
+        self.assertEqual(store.get(2)['content']['facts'], 'a(2);')
+        self.assertEqual(bytes(store.raw('3')), self.process.get('3'))
+        self.assertEqual(store.modtime('1'), 10)
+        store.close()
+
+    def test_only_changes_fetched(self):
+        store = SnapshotStore(self.path)
+        store.refresh(self.process)
+        store.close()
+
+        self.process.modtimes = {'1': 10, '2': 21, '4': 40}
+        self.process.fetched = []
+        store = SnapshotStore(self.path)
+        report = store.refresh(self.process)
+
+        self.assertEqual(sorted(self.process.fetched), ['2', '4'])
+        self.assertEqual((report.unchanged, report.removed), (1, 1))
+        self.assertEqual(store.get('2')['content']['modtime'], 21)
+        self.assertNotIn('3', store)
+
+        store.compact()
+        self.assertEqual(os.path.getsize(store.data_path),
+                         sum(len(self.process.get(pid))
+                             for pid in ('1', '2', '4')))
+        self.assertFalse(os.path.exists(self.path + '.data'))
+        self.assertEqual(store.get('4')['content']['pid'], '4')
+        store.close()
+
+        store = SnapshotStore(self.path)
+        self.assertEqual(store.generation, 1)
+        self.assertEqual(store.get('2')['content']['modtime'], 21)
+        store.close()
+
+    def test_compact_interrupted(self):
+        store = SnapshotStore(self.path)
+        store.refresh(self.process)
+        self.process.modtimes['1'] = 11
+        store.refresh(self.process)
+
+        def crash():
+            raise OSError('crashed before the index was replaced')
+
+        # the new data file is written, the index still names the old one
+        store.save = crash
+        with self.assertRaises(OSError):
+            store.compact()
+        store.close()
+
+        store = SnapshotStore(self.path)
+        self.assertEqual(store.generation, 0)
+        for pid, modtime in (('1', 11), ('2', 20), ('3', 30)):
+            self.assertEqual(store.get(pid)['content']['modtime'], modtime)
+
+        # compacting again succeeds and removes the old generation
+        store.compact()
+        self.assertFalse(os.path.exists(self.path + '.data'))
+        self.assertEqual(store.get('1')['content']['modtime'], 11)
+        store.close()
+
+    def test_reads_index_without_generation(self):
+        store = SnapshotStore(self.path)
+        store.refresh(self.process)
+        store.close()
+        with open(self.path + '.index', 'r+', encoding='utf-8') as index:
+            processes = json.load(index)['processes']
+            index.seek(0)
+            index.truncate()
+            json.dump(processes, index)
+
+        store = SnapshotStore(self.path)
+        self.assertEqual(store.generation, 0)
+        self.assertEqual(store.get('3')['content']['pid'], '3')
+        store.close()
+
+    def test_error_response_not_stored(self):
+        self.process.modtimes['gone'] = 1
+        store = SnapshotStore(self.path)
+        report = store.refresh(self.process)
+
+        self.assertIsInstance(report.failures['gone'], RubbleServerException)
+        self.assertNotIn('gone', store)
+        store.close()
+
+    def test_corrupt_tail(self):
+        store = SnapshotStore(self.path)
+        store.refresh(self.process)
+        store.close()
+
+        # lose the end of the data file
+        size = os.path.getsize(self.path + '.data')
+        with open(self.path + '.data', 'r+b') as data_file:
+            data_file.truncate(size - 5)
+
+        store = SnapshotStore(self.path)
+        self.assertEqual(len(store), 2)
+        self.process.fetched = []
+        store.refresh(self.process)
+        self.assertEqual(len(self.process.fetched), 1)
+        for pid in '123':
+            self.assertEqual(store.get(pid)['content']['pid'], pid)
+        store.close()
+
+    def test_views_outlive_refresh_and_close(self):
+        store = SnapshotStore(self.path)
+        store.refresh(self.process)
+        view = store.raw('1')
+
+        self.process.modtimes['1'] = 11
+        store.refresh(self.process)
+        store.close()
+
+        self.assertEqual(json.loads(bytes(view))['content']['modtime'], 10)
+        view.release()
@@ -0,0 +1,75 @@
+import json
+from unittest import TestCase
+
+from pybble.template import CallTemplate, Slot, compile_terms
+
+
+class FakeResponse:
+    ok = True
+
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return {'output': json.loads(self.data)}
+
+
+class FakeProcess:
+    """Echoes the posted terms back as output"""
+
+    def __init__(self):
+        self.config = self
+        self.transport = self
+        self.posted = []
+
+    def request_kwargs_for(self, content_type):
+        return {'headers': {'content-type': content_type}}
+
+    def post(self, url, data, headers):
+        self.posted.append((url, data))
+        return FakeResponse(data)
+
+
+def terms(sku, quantity):
+    return [{'order': {'sku': sku, 'quantity': quantity,
+                       'tags': ['web', sku]}}, 'done']
+
+
+class TestCallTemplate(TestCase):
+    """
+    Tests pre-encoding call terms, pybble.template
+    """
+
+    def setUp(self):
+        self.process = FakeProcess()
+        self.template = CallTemplate(self.process, 'http://rubble/call',
+                                     terms(Slot('sku'), Slot('n')))
+
+    def test_body_matches_plain_encoding(self):
+        self.assertEqual(self.template.names, ['sku', 'n', 'sku'])
+        self.assertEqual(self.template.body(sku='A-"17"', n=[1, 2.5]),
+                         json.dumps(terms('A-"17"', [1, 2.5])).encode())
+
+    def test_call(self):
+        self.assertEqual(self.template.call(sku='B', n=3),
+                         {'output': terms('B', 3)})
+        self.assertEqual(self.process.posted,
+                         [('http://rubble/call',
+                           json.dumps(terms('B', 3)).encode())])
+
+    def test_missing_value(self):
+        with self.assertRaises(TypeError):
+            self.template.body(sku='B')
+
+    def test_names_escaped_in_json(self):
+        names = ['say "hi"', 'größe', 'back\\slash']
+        fragments, found = compile_terms([Slot(name) for name in names])
+        self.assertEqual(found, names)
+
+        template = CallTemplate(self.process, 'http://rubble/call',
+                                [Slot(name) for name in names])
+        values = dict(zip(names, range(3)))
+        self.assertEqual(template.body(**values), b'[0, 1, 2]')
+
+    def test_no_slots(self):
+        self.assertEqual(compile_terms([1, 'a']), ([b'[1, "a"]'], []))
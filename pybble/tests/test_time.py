@@ -0,0 +1,60 @@
+import datetime
+from unittest import TestCase
+
+from pybble import time
+
+
+class TestTime(TestCase):
+    """
+    Tests the epoch conversions in pybble.time
+    """
+
+    def test_aware_datetime_keeps_milliseconds(self):
+        dt = datetime.datetime(2013, 4, 29, 12, 12, 3, 740000,
+                               tzinfo=datetime.timezone.utc)
+        self.assertEqual(time.datetime_to_epoch(dt), 1367237523740)
+
+    def test_aware_datetime_honours_timezone(self):
+        utc = datetime.datetime(2013, 4, 29, 12, 0,
+                                tzinfo=datetime.timezone.utc)
+        cest = utc.astimezone(datetime.timezone(datetime.timedelta(hours=2)))
+        self.assertEqual(time.datetime_to_epoch(utc),
+                         time.datetime_to_epoch(cest))
+
+    def test_naive_datetime_is_local_time(self):
+        dt = datetime.datetime(2013, 4, 29, 12, 0)
+        self.assertEqual(time.datetime_to_epoch(dt),
+                         int(dt.timestamp()) * 1000)
+
+    def test_round_trip(self):
+        epoch = 1367237523740
+        self.assertEqual(
+            time.datetime_to_epoch(time.epoch_to_datetime(epoch)), epoch)
+
+    def test_bulk_conversion_matches_single(self):
+        start = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+        datetimes = [start + datetime.timedelta(milliseconds=i * 1001)
+                     for i in range(100)]
+        datetimes.append(datetime.datetime(2020, 6, 1, 8, 30))
+
+        self.assertEqual(time.datetimes_to_epoch(datetimes),
+                         [time.datetime_to_epoch(dt) for dt in datetimes])
+
+    def test_bulk_conversion_of_numpy_array(self):
+        try:
+            import numpy
+        except ImportError:
+            self.skipTest("NumPy is not installed")
+
+        array = numpy.array(['2013-04-29T12:12:03.740'],
+                                 dtype='datetime64[ms]')
+        self.assertEqual(list(time.datetimes_to_epoch(array)), [1367237523740])
+
+    def test_now_is_milliseconds(self):
+        self.assertAlmostEqual(time.now() / 1000,
+                               datetime.datetime.now().timestamp(), delta=5)
+
+    def test_stopwatch_is_monotonic(self):
+        with time.Stopwatch() as stopwatch:
+            pass
+        self.assertGreaterEqual(stopwatch.elapsed_ns, 0)
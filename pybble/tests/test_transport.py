@@ -0,0 +1,137 @@
+import gzip
+import zlib
+from unittest import TestCase
+
+from pybble.config import ClientConfig
+from pybble.tests.mock_rubble import BaseHandler, start_server, stop_server
+from pybble.transport import Transport, compress, decompress
+
+
+class EchoHandler(BaseHandler):
+    """Answers with the decoded request body, gzipped if it's large,
+    chunked if the server is set to, and with 415 to compressed requests if
+    the server rejects them
+    """
+
+    def do_POST(self):
+        body = self.read_body()
+        encoding = self.headers.get('content-encoding')
+        self.server.requests.append((encoding, len(body)))
+
+        if encoding is not None and self.server.reject:
+            content, status = b'{}', 415
+        else:
+            if encoding == 'gzip':
+                body = gzip.decompress(body)
+            elif encoding == 'deflate':
+                body = zlib.decompress(body)
+            content, status = body, 200
+
+        self.send_response(status)
+        self.send_header('content-type', 'application/json')
+        if len(content) > 100 and 'gzip' in self.headers['accept-encoding']:
+            content = gzip.compress(content)
+            self.send_header('content-encoding', 'gzip')
+        if self.server.chunked:
+            self.send_header('transfer-encoding', 'chunked')
+            self.end_headers()
+            for start in range(0, len(content), 64):
+                chunk = content[start:start + 64]
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+            self.wfile.write(b'0\r\n\r\n')
+            return
+        self.send_header('content-length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class TestCompression(TestCase):
+    """
+    Tests compression of requests and responses, pybble.transport
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = start_server(EchoHandler)
+
+    @classmethod
+    def tearDownClass(cls):
+        stop_server(cls.server)
+
+    def setUp(self):
+        self.server.requests = []
+        self.server.reject = False
+        self.server.chunked = False
+        self.url = self.server.url + 'rubble/service/call'
+
+    def transport(self, **compression):
+        return Transport(None, ClientConfig({'compression': compression}))
+
+    def test_compress(self):
+        data = b'{"facts": "' + b'empty(glass); ' * 100 + b'"}'
+        self.assertEqual(gzip.decompress(compress(data, 'gzip')), data)
+        self.assertEqual(zlib.decompress(compress(data, 'deflate')), data)
+        raw = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+        raw = raw.compress(data) + raw.flush()
+        self.assertEqual(decompress(raw, 'deflate'), data)
+        with self.assertRaises(ValueError):
+            compress(data, 'br')
+
+    def test_threshold_and_stats(self):
+        transport = self.transport(request='gzip', threshold=100)
+        small = [['ping']]
+        large = [['fact', str(i)] for i in range(100)]
+
+        self.assertEqual(transport.post(self.url, json=small).json(), small)
+        self.assertEqual(transport.post(self.url, json=large).json(), large)
+
+        self.assertEqual([encoding for encoding, _ in self.server.requests],
+                         [None, 'gzip'])
+        stats = transport.compression.as_dict()
+        self.assertEqual(stats['requests_compressed'], 1)
+        self.assertLess(stats['request_ratio'], 0.5)
+        # the large response came back gzipped
+        self.assertEqual(stats['responses_compressed'], 1)
+        self.assertLess(stats['response_ratio'], 1.0)
+        transport.close()
+
+    def test_chunked_response_stats(self):
+        self.server.chunked = True
+        transport = self.transport()
+        terms = [['fact', str(i)] for i in range(100)]
+        response = transport.post(self.url, json=terms)
+
+        self.assertEqual(response.json(), terms)
+        self.assertNotIn('content-length', response.headers)
+        stats = transport.compression.as_dict()
+        self.assertEqual(stats['responses_compressed'], 1)
+        self.assertEqual(stats['response_bytes_decoded'],
+                         len(response.content))
+        self.assertEqual(stats['response_bytes_wire'],
+                         len(gzip.compress(response.content)))
+        self.assertGreaterEqual(stats['decompress_seconds'], 0.0)
+        transport.close()
+
+    def test_415_falls_back_to_uncompressed(self):
+        self.server.reject = True
+        transport = self.transport(request='deflate', threshold=10)
+        terms = [['fact', str(i)] for i in range(10)]
+
+        self.assertEqual(transport.post(self.url, json=terms).json(), terms)
+        self.assertEqual(transport.post(self.url, json=terms).json(), terms)
+
+        # compression is switched off after the first 415
+        self.assertEqual([encoding for encoding, _ in self.server.requests],
+                         ['deflate', None, None])
+        self.assertIsNone(transport.request_encoding)
+        transport.close()
+
+    def test_accept_encoding(self):
+        from urllib3.util.request import ACCEPT_ENCODING
+
+        from pybble.transport import accept_encoding
+
+        advertised = accept_encoding().split(', ')
+        self.assertEqual(advertised,
+                         [e.strip() for e in ACCEPT_ENCODING.split(',')])
+        self.assertIn('gzip', advertised)
@@ -0,0 +1,121 @@
+import json
+from unittest import TestCase
+
+from pybble import trapstate
+from pybble.batch import BatchStats
+from pybble.error import RubbleServerException
+from pybble.process import RubbleProcess
+from pybble.response import LazyResponse
+
+
+class TestTrapState(TestCase):
+    """
+    Tests parsing trapstate documents, pybble.trapstate
+    """
+
+    xml = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+    <trapstate>
+        <timestamp>1368101400107</timestamp>
+        <cause>ERROR</cause>
+        <description>Inference failure: CONTRADICTION crazy_fact</description>
+        <triggering-message>input(pid(42),crazy_fact);</triggering-message>
+        <reschedule-delay>60000</reschedule-delay>
+        <discard-after>172800000</discard-after>
+    </trapstate>
+    """
+
+    def test_trapstate_parsed(self):
+        state = trapstate.parse(self.xml)
+
+        self.assertEqual(state.cause, trapstate.ERROR)
+        self.assertEqual(state.timestamp, 1368101400107)
+        self.assertEqual(state.triggering_message, 'input(pid(42),crazy_fact);')
+        self.assertEqual(state.reschedule_delay, 60000)
+        self.assertEqual(state.discard_at, 1368101400107 + 172800000)
+        self.assertIsNone(state.pause_condition)
+        self.assertTrue(state.stuck)
+
+    def test_equal_states_hash_alike(self):
+        first, second = trapstate.parse(self.xml), trapstate.parse(self.xml)
+
+        self.assertEqual(first, second)
+        self.assertEqual(len({first, second}), 1)
+        with self.assertRaises(AttributeError):
+            second.cause = trapstate.PAUSED
+        paused = trapstate.TrapState(**dict(second.as_dict(),
+                                            cause=trapstate.PAUSED))
+        self.assertNotEqual(first, paused)
+        self.assertEqual(len({first, second, paused}), 2)
+
+    def test_blank_trapstate_is_none(self):
+        self.assertIsNone(trapstate.parse(None))
+        self.assertIsNone(trapstate.parse("  "))
+
+
+class TestGetTrapstate(TestCase):
+    """
+    Tests retrieving trapstates, pybble.process.RubbleProcess.get_trapstate
+    and scan_trapped, with get and list_pages stubbed
+    """
+
+    xml = ('<trapstate><timestamp>1368101400107</timestamp>'
+           '<cause>{}</cause></trapstate>')
+
+    def setUp(self):
+        self.process = RubbleProcess(None, {})
+        self.addCleanup(self.process.transport.close)
+        self.process.get = self.get
+        self.process.list_pages = self.list_pages
+        self.documents = {
+            1: {'content': {'facts': [['error', 'x']],
+                            'trapstate': self.xml.format('ERROR')}},
+            2: {'content': {'facts': [], 'trapstate': self.xml.format(
+                trapstate.PAUSE_ON_CONDITION)}},
+            3: {'content': {'facts': []}},
+            4: {'error': 'No such process'},
+            5: {'content': {'facts': [], 'trapstate': ''}},
+        }
+
+    def get(self, pid, prettyprint=True, lazy=False, **kwargs):
+        document = json.dumps(self.documents[pid]).encode('utf-8')
+        return LazyResponse(document)
+
+    def list_pages(self, page_size=1000, pid_begin=0):
+        pids = sorted(pid for pid in self.documents if pid >= pid_begin)
+        for start in range(0, len(pids), page_size):
+            yield [{'pid': pid} for pid in pids[start:start + page_size]]
+
+    def test_trapped(self):
+        state = self.process.get_trapstate(1)
+
+        self.assertEqual(state.cause, trapstate.ERROR)
+        self.assertEqual(state.timestamp, 1368101400107)
+
+    def test_processing_normally(self):
+        self.assertIsNone(self.process.get_trapstate(3))
+        self.assertIsNone(self.process.get_trapstate(5))
+
+    def test_error_response_raised(self):
+        with self.assertRaises(RubbleServerException) as raised:
+            self.process.get_trapstate(4)
+        self.assertEqual(str(raised.exception), 'No such process')
+
+    def test_scan_filters_causes(self):
+        stats = BatchStats()
+        trapped = dict(self.process.scan_trapped(page_size=2, stats=stats))
+
+        self.assertEqual(list(trapped), [1])
+        self.assertEqual(trapped[1].cause, trapstate.ERROR)
+        self.assertEqual(stats.submitted, 5)
+        self.assertEqual(stats.failed, 1)
+
+        paused = dict(self.process.scan_trapped(
+            causes=[trapstate.PAUSE_ON_CONDITION], page_size=2))
+        self.assertEqual(list(paused), [2])
+
+    def test_scan_from_pid(self):
+        trapped = self.process.scan_trapped(
+            causes=[trapstate.ERROR, trapstate.PAUSE_ON_CONDITION],
+            pid_begin=2)
+
+        self.assertEqual(sorted(pid for pid, _ in trapped), [2])
@@ -0,0 +1,83 @@
+import threading
+from unittest import TestCase
+
+from pybble.watch import Watcher
+
+
+class FakeProcess:
+
+    def __init__(self, modtimes):
+        self.modtimes = modtimes
+        self.missing = set()
+        self.fail_list = False
+
+    def list_pages(self, page_size=1000, pid_begin=0):
+        if self.fail_list:
+            raise ValueError("503 Service Unavailable")
+        yield [{'pid': pid, 'modtime': modtime}
+               for pid, modtime in sorted(self.modtimes.items(),
+                                          key=lambda item: int(item[0]))
+               if int(pid) >= pid_begin]
+
+    def get(self, pid, prettyprint=True):
+        if pid in self.missing:
+            raise ValueError("404 Not Found")
+        return {'content': {'pid': pid, 'facts': 'f;'}}
+
+
+class TestWatcher(TestCase):
+    """
+    Tests polling processes for changes, pybble.watch
+    """
+
+    def test_poll(self):
+        process = FakeProcess({'1': 10, '2': 20, '3': 30})
+        watcher = Watcher(process, [1, 2, 3], min_interval=0.01)
+
+        self.assertEqual(watcher.poll(), [])
+
+        process.modtimes['1'] = 11
+        process.modtimes['2'] = 21
+        del process.modtimes['3']
+        process.missing.add('2')
+        changes = {change.pid: change for change in watcher.poll()}
+
+        self.assertEqual(set(changes), {'1', '2', '3'})
+        self.assertEqual(changes['1'].process['facts'], 'f;')
+        # failed retrievals carry the error
+        self.assertIsNone(changes['2'].process)
+        self.assertIsInstance(changes['2'].error, ValueError)
+        self.assertTrue(changes['3'].deleted)
+
+        # nothing changed, the interval backs off
+        self.assertEqual(watcher.poll(), [])
+        self.assertEqual(watcher.interval, 0.02)
+
+    def test_stop_right_after_start(self):
+        watcher = Watcher(FakeProcess({'1': 10}), [1], min_interval=0.01)
+        watcher.start(lambda change: None)
+        watcher.stop()
+        self.assertIsNone(watcher._thread)
+
+    def test_thread_survives_errors(self):
+        process = FakeProcess({'1': 10})
+        errors = []
+        received = threading.Event()
+
+        def callback(change):
+            received.set()
+            raise RuntimeError("callback failed")
+
+        watcher = Watcher(process, [1], min_interval=0.01, max_interval=0.01,
+                          initial=True, on_error=errors.append)
+        process.fail_list = True
+        watcher.start(callback)
+        while not errors:
+            threading.Event().wait(0.005)
+
+        process.fail_list = False
+        self.assertTrue(received.wait(5))
+        watcher.stop()
+
+        self.assertIsInstance(errors[0], ValueError)
+        self.assertIsInstance(watcher.error, RuntimeError)
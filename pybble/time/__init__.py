@@ -1,13 +1,122 @@
+"""Time conversion for the Rubble API.
+
+Rubble represents time as integer milliseconds since 00:00:00 UTC on January
+1, 1970. Conversions here use integer arithmetic on timedeltas rather than a
+strftime("%s") round trip, so they keep milliseconds, honour the timezone of
+aware datetimes and behave the same on every platform. Naive datetimes are
+taken to be in the local timezone.
+"""
 import datetime
+import sys
+import time
+
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+MILLISECOND = datetime.timedelta(milliseconds=1)
 
 
 def now():
-    """Get now as microseconds since the UNIX epoch.
+    """Get now as milliseconds since the UNIX epoch.
     """
-    return int(datetime.datetime.now().strftime("%s")) * 1000
+    return time.time_ns() // 1000000
 
 
 def datetime_to_epoch(datetime_obj):
-    """Get now as microseconds since the UNIX epoch.
+    """Get a datetime as milliseconds since the UNIX epoch.
+
+    Aware datetimes are converted using their own timezone, naive datetimes
+    are interpreted as local time.
     """
-    return int(datetime_obj.strftime("%s")) * 1000
\ No newline at end of file
+    if datetime_obj.tzinfo is None or datetime_obj.utcoffset() is None:
+        datetime_obj = datetime_obj.astimezone()
+    return (datetime_obj - EPOCH) // MILLISECOND
+
+
+def epoch_to_datetime(epoch):
+    """Get milliseconds since the UNIX epoch as an aware UTC datetime.
+    """
+    return EPOCH + datetime.timedelta(milliseconds=epoch)
+
+
+def datetimes_to_epoch(datetimes):
+    """Convert a sequence of datetimes to milliseconds since the UNIX
+    epoch.
+
+    Parameters
+    ----------
+
+    datetimes: sequence or numpy.ndarray
+        Python datetimes, or a NumPy datetime64 array. NumPy datetime64
+        values carry no timezone and, as in NumPy itself, are taken to be
+        UTC. NumPy is never imported here, an array can only have been
+        created if it already is.
+
+    Returns
+    -------
+    epochs: list or numpy.ndarray
+        A list of ints, or an int64 array if a NumPy array was given.
+    """
+    numpy = sys.modules.get('numpy')
+    if numpy is not None and isinstance(datetimes, numpy.ndarray):
+        if datetimes.dtype.kind == 'M':
+            return datetimes.astype('datetime64[ms]').astype(numpy.int64)
+        return numpy.fromiter(
+            (datetime_to_epoch(dt) for dt in datetimes.tolist()),
+            dtype=numpy.int64, count=len(datetimes))
+
+    epoch = EPOCH
+    millisecond = MILLISECOND
+    return [(dt - epoch) // millisecond
+            if dt.tzinfo is not None and dt.utcoffset() is not None
+            else (dt.astimezone() - epoch) // millisecond
+            for dt in datetimes]
+
+
+def monotonic_ns():
+    """The value of a monotonic clock, in nanoseconds, with the highest
+    available resolution. Only meaningful for measuring intervals.
+    """
+    return time.perf_counter_ns()
+
+
+class Stopwatch:
+    """Measure latency with a monotonic clock.
+
+    Examples
+    --------
+
+        with Stopwatch() as stopwatch:
+            client.process.get(pid)
+        print(stopwatch.elapsed_ms)
+    """
+
+    def __init__(self):
+        self.started = None
+        self.stopped = None
+
+    def start(self):
+        self.started = time.perf_counter_ns()
+        self.stopped = None
+        return self
+
+    def stop(self):
+        self.stopped = time.perf_counter_ns()
+        return self.elapsed_ns
+
+    @property
+    def elapsed_ns(self):
+        """Nanoseconds since start, or between start and stop once stopped
+        """
+        end = self.stopped if self.stopped is not None else time.perf_counter_ns()
+        return end - self.started
+
+    @property
+    def elapsed_ms(self):
+        """Milliseconds since start, as a float"""
+        return self.elapsed_ns / 1e6
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,532 @@
+"""The HTTP transport shared by the Rubble subsystems of a Client.
+
+Every request made by pybble goes through a Transport, which keeps a pool of
+keep-alive connections, adds the default request arguments from the config,
+encodes JSON bodies and compresses large request bodies.
+
+A Transport is safe to use from many threads at once. requests.Session isn't
+documented to be thread-safe, so every thread gets its own Session, but all
+of them are mounted on one HTTPAdapter, whose urllib3 connection pool is
+thread-safe, so the connections are shared by every thread.
+"""
+import importlib.util
+import json as json_module
+import threading
+import time
+import zlib
+
+from pybble.config import ClientConfig
+
+
+def zstandard_available():
+    """Whether the optional zstandard package is installed, without
+    importing it
+    """
+    return importlib.util.find_spec('zstandard') is not None
+
+
+def compress(data, encoding, level=6):
+    """Compress bytes with the given content-encoding"""
+    if encoding == 'gzip':
+        import gzip
+        # no timestamp, so that equal bodies compress alike
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    if encoding == 'deflate':
+        return zlib.compress(data, level)
+    if encoding == 'zstd':
+        if not zstandard_available():
+            raise ValueError("zstd compression requires the zstandard package")
+        import zstandard
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    raise ValueError("Unsupported content-encoding {!r}".format(encoding))
+
+
+def decompress(data, encoding):
+    """Decompress bytes compressed with compress"""
+    if encoding == 'gzip':
+        import gzip
+        return gzip.decompress(data)
+    if encoding == 'deflate':
+        # servers send zlib streams or, wrongly, raw deflate streams
+        try:
+            return zlib.decompress(data)
+        except zlib.error:
+            return zlib.decompress(data, -zlib.MAX_WBITS)
+    if encoding == 'zstd':
+        if not zstandard_available():
+            raise ValueError(
+                "zstd decompression requires the zstandard package")
+        import zstandard
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    raise ValueError("Unsupported content-encoding {!r}".format(encoding))
+
+
+def accept_encoding():
+    """The content-encodings responses can be decoded from. urllib3 does
+    the decoding, so these are the ones it advertises, which include zstd
+    only if the installed urllib3 can decode it.
+    """
+    from urllib3.util.request import ACCEPT_ENCODING
+
+    return ', '.join(encoding.strip()
+                     for encoding in ACCEPT_ENCODING.split(','))
+
+
+class CompressionStats:
+    """Compression metrics for a Transport.
+
+    Request bodies: the number compressed, their size before and after
+    compression and the CPU time the compressing threads spent. Responses:
+    the number received with a content-encoding, their size on the wire
+    and after decoding, and the CPU time spent reading and decoding them.
+    Streamed responses are decoded as the caller reads them and aren't
+    counted.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests_compressed = 0
+        self.request_bytes_raw = 0
+        self.request_bytes_sent = 0
+        self.compress_seconds = 0.0
+        self.responses_compressed = 0
+        self.response_bytes_wire = 0
+        self.response_bytes_decoded = 0
+        self.decompress_seconds = 0.0
+
+    def record_request(self, raw, sent, seconds):
+        with self._lock:
+            self.requests_compressed += 1
+            self.request_bytes_raw += raw
+            self.request_bytes_sent += sent
+            self.compress_seconds += seconds
+
+    def record_response(self, wire, decoded, seconds):
+        with self._lock:
+            self.responses_compressed += 1
+            self.response_bytes_wire += wire
+            self.response_bytes_decoded += decoded
+            self.decompress_seconds += seconds
+
+    @property
+    def request_ratio(self):
+        """Compressed request bytes as a fraction of the raw bytes"""
+        if not self.request_bytes_raw:
+            return 1.0
+        return self.request_bytes_sent / self.request_bytes_raw
+
+    @property
+    def response_ratio(self):
+        """Response bytes on the wire as a fraction of the decoded bytes"""
+        if not self.response_bytes_decoded:
+            return 1.0
+        return self.response_bytes_wire / self.response_bytes_decoded
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'requests_compressed': self.requests_compressed,
+                'request_bytes_raw': self.request_bytes_raw,
+                'request_bytes_sent': self.request_bytes_sent,
+                'request_ratio': self.request_ratio,
+                'compress_seconds': self.compress_seconds,
+                'responses_compressed': self.responses_compressed,
+                'response_bytes_wire': self.response_bytes_wire,
+                'response_bytes_decoded': self.response_bytes_decoded,
+                'response_ratio': self.response_ratio,
+                'decompress_seconds': self.decompress_seconds,
+            }
+
+
+class Transport:
+    """Makes the HTTP requests for a Client.
+
+    Compression is configured with the "compression" config option:
+
+        "compression": {
+            # content-encoding for request bodies: None, "gzip", "deflate"
+            # or "zstd" (requires the zstandard package)
+            "request": "gzip",
+            # only bodies of at least this many bytes are compressed
+            "threshold": 1024,
+            "level": 6,
+            # advertise the encodings we can decode via accept-encoding
+            "response": True,
+        }
+
+    If the server answers a compressed request with 415 Unsupported Media
+    Type, the request is retried uncompressed and request compression is
+    switched off for this transport.
+
+    The connection pool is configured with the "pool" config option:
+
+        "pool": {
+            # number of hosts to keep connection pools for
+            "hosts": 10,
+            # connections kept alive per host, make this at least the number
+            # of threads sharing the client
+            "maxsize": 64,
+            # wait for a free connection rather than opening an extra one
+            # when all are in use
+            "block": False,
+            # open this many connections when the Client is created
+            "warm": 0,
+            # every this many seconds, probe that many connections (at
+            # least one) so that they don't go stale while idle
+            "keepalive": None,
+        }
+
+    Warm-up and keep-alive probes GET the cluster-probe endpoint, which
+    needs no authentication and does no work on the server.
+
+    With the "profile" config option enabled the phases of each request
+    are timed, see pybble.profile.
+
+    Requests made with hedge=True are hedged when the "hedging" config
+    option is enabled, see pybble.hedge.Hedger.
+
+    Parameters
+    ----------
+
+    auth: tuple or None
+        HTTP basic authentication credentials.
+
+    config: ClientConfig or dict
+
+    adapter: requests.adapters.HTTPAdapter, optional
+        Share the connection pool of another transport. It is left open
+        when this transport is closed.
+
+    hedger: pybble.hedge.Hedger, optional
+        Share the hedging threads and latency statistics of another
+        transport, when hedging is enabled. It is left open when this
+        transport is closed.
+    """
+
+    def __init__(self, auth, config, adapter=None, hedger=None):
+        # requests is imported on first use to keep importing pybble cheap
+        import requests
+
+        self.auth = auth
+        self.config = config
+        self.compression = CompressionStats()
+
+        self._owns_adapter = adapter is None
+        if adapter is None:
+            adapter = create_adapter(config)
+        self.adapter = adapter
+        self._session_class = requests.Session
+        self._local = threading.local()
+        client_config = ClientConfig.of(config)
+        self.probe_url = client_config.endpoint('cluster-probe')
+        self._keepalive = None
+
+        self.profiler = None
+        if client_config.get('profile', {}).get('enabled'):
+            from pybble.profile import Profiler
+            self.profiler = Profiler(client_config.api_url)
+
+        self.hedger = None
+        self._owns_hedger = hedger is None
+        if client_config.get('hedging', {}).get('enabled'):
+            if hedger is None:
+                from pybble.hedge import Hedger
+                # a primary and a hedge for every pooled connection
+                hedger = Hedger(client_config['hedging'],
+                                client_config['url']['root'],
+                                workers=2 * client_config['pool']['maxsize'])
+            self.hedger = hedger
+
+        options = config.get('compression', {})
+        self.request_encoding = options.get('request')
+        self.threshold = options.get('threshold', 1024)
+        self.level = options.get('level', 6)
+        self.accept_encoding = accept_encoding() if options.get('response', True) else 'identity'
+
+        if self.request_encoding is not None:
+            # fail early on an unusable encoding
+            compress(b'', self.request_encoding, self.level)
+
+    def request(self, method, url, json=None, data=None, headers=None,
+                hedge=False, **kwargs):
+        """Make a request, see requests.Session.request. JSON bodies are
+        encoded here so that they can be compressed. Only pass hedge=True
+        for idempotent requests.
+        """
+        # profiled on the calling thread, hedges are sent on others
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.begin_request(url)
+
+        # the phase under way, timed when it ends even if it fails
+        phase = 'serialize'
+        ok = False
+        try:
+            headers = dict(headers or {})
+            headers.setdefault('accept-encoding', self.accept_encoding)
+
+            if json is not None:
+                data = json_module.dumps(json).encode('utf-8')
+                headers['content-type'] = 'application/json'
+            elif isinstance(data, str):
+                data = data.encode('utf-8')
+
+            kwargs.setdefault('auth', self.auth)
+            kwargs['hooks'] = self._hooks(kwargs.get('hooks'))
+
+            body = data
+            encoding = self.request_encoding
+            # bodies that are already encoded are sent as they are
+            if (encoding is not None and isinstance(data, bytes)
+                    and 'content-encoding' not in headers
+                    and len(data) >= self.threshold):
+                body = self.compress(data, encoding)
+                headers['content-encoding'] = encoding
+
+            if profiler is not None:
+                profiler.lap('serialize')
+            phase = 'network'
+
+            if hedge and self.hedger is not None and not kwargs.get('stream'):
+                response = self.hedger.send(
+                    lambda url: self._send(method, url, data, body, headers,
+                                           kwargs),
+                    url)
+            else:
+                response = self._send(method, url, data, body, headers, kwargs)
+            ok = response.ok
+        finally:
+            if profiler is not None:
+                profiler.lap(phase)
+                profiler.end_request(ok)
+
+        return response
+
+    def compress(self, data, encoding):
+        """Compress a request body at the configured level, recording the
+        compression stats
+        """
+        started = time.thread_time()
+        body = compress(data, encoding, self.level)
+        self.compression.record_request(len(data), len(body),
+                                        time.thread_time() - started)
+        return body
+
+    def _send(self, method, url, data, body, headers, kwargs):
+        """Send the encoded body, falling back to data, the uncompressed
+        body, if the server doesn't accept the compression
+        """
+        headers = dict(headers)
+        response = self.send(method, url, data=body, headers=headers,
+                             **kwargs)
+
+        if body is not data and response.status_code == 415:
+            self.request_encoding = None
+            del headers['content-encoding']
+            response = self.send(method, url, data=data, headers=headers,
+                                 **kwargs)
+
+        return response
+
+    def _hooks(self, hooks):
+        """The caller's requests hooks, with _read_compressed run first on
+        each response
+        """
+        hooks = dict(hooks or {})
+        response_hooks = hooks.get('response', [])
+        if callable(response_hooks):
+            response_hooks = [response_hooks]
+        hooks['response'] = [self._read_compressed] + list(response_hooks)
+        return hooks
+
+    def _read_compressed(self, response, stream=False, **kwargs):
+        """Response hook, run before requests reads the body: read and
+        decode a compressed body that isn't streamed, recording its size on
+        the wire, whether or not it's chunked, and the CPU time spent
+        decoding it. Encodings decompress doesn't know, such as br, are left
+        to requests.
+        """
+        encoding = response.headers.get('content-encoding', '').lower()
+        if stream or encoding not in ('gzip', 'deflate', 'zstd'):
+            return response
+        wire = b''.join(response.raw.stream(decode_content=False))
+        started = time.thread_time()
+        response._content = decompress(wire, encoding)
+        response._content_consumed = True
+        self.compression.record_response(len(wire), len(response._content),
+                                         time.thread_time() - started)
+        return response
+
+    @property
+    def session(self):
+        """The calling thread's requests.Session, sharing the connection
+        pool of this transport
+        """
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._session_class()
+            session.mount('http://', self.adapter)
+            session.mount('https://', self.adapter)
+            self._local.session = session
+        return session
+
+    def send(self, method, url, **kwargs):
+        """Send a fully prepared request over the network. Subclasses
+        override this to record or replay traffic.
+        """
+        return self.session.request(method, url, **kwargs)
+
+    def probe(self, timeout=5, barrier=None):
+        """GET the cluster-probe endpoint on a pooled connection
+
+        Parameters
+        ----------
+
+        timeout: float
+            Seconds to wait for the response.
+
+        barrier: threading.Barrier, optional
+            Hold on to the connection until every party has one.
+
+        Returns
+        -------
+        ok: bool
+            False if the server could not be reached or didn't answer 2xx.
+        """
+        try:
+            response = self.send('GET', self.probe_url, auth=None,
+                                 timeout=timeout, stream=True)
+        except Exception:
+            return False
+        finally:
+            if barrier is not None:
+                try:
+                    barrier.wait(timeout)
+                except threading.BrokenBarrierError:
+                    pass
+        # read the body so that the connection goes back to the pool
+        response.content
+        return response.ok
+
+    def warm(self, connections=1, timeout=5):
+        """Open connections ahead of the first requests, or refresh
+        idle ones, by probing that many connections at once. No probe
+        returns its connection to the pool before every probe has one, so
+        each one checks out its own.
+
+        Parameters
+        ----------
+
+        connections: int
+            Number of connections, at most the pool's maxsize are kept.
+
+        timeout: float
+            Seconds to wait for each probe.
+
+        Returns
+        -------
+        ok: int
+            Number of successful probes.
+        """
+        results = []
+        barrier = threading.Barrier(connections)
+
+        def probe():
+            results.append(self.probe(timeout, barrier))
+
+        threads = [threading.Thread(target=probe, daemon=True)
+                   for _ in range(connections)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return sum(results)
+
+    def keepalive(self, interval, connections=1, timeout=5):
+        """Warm connections every interval seconds in a daemon thread,
+        until keepalive is called again or the transport is closed.
+
+        Parameters
+        ----------
+
+        interval: float or None
+            Seconds between probes, None stops probing.
+
+        See Transport.warm for the other parameters.
+        """
+        if self._keepalive is not None:
+            self._keepalive.set()
+            self._keepalive = None
+        if interval is None:
+            return
+
+        stopped = self._keepalive = threading.Event()
+
+        def run():
+            while not stopped.wait(interval):
+                self.warm(connections, timeout)
+
+        threading.Thread(target=run, name='pybble-keepalive',
+                         daemon=True).start()
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+    def close(self):
+        """Stop keep-alive probes and hedging threads, and close every
+        pooled connection unless the connection pool is shared. A shared
+        hedger is left running too.
+        """
+        self.keepalive(None)
+        if self.hedger is not None and self._owns_hedger:
+            self.hedger.close()
+        if self._owns_adapter:
+            self.adapter.close()
+
+
+def create_adapter(config):
+    """Create the connection pool configured by the "pool" config option,
+    for Transports to share, see Transport
+    """
+    from requests.adapters import HTTPAdapter
+
+    pool = config.get('pool', {})
+    return HTTPAdapter(pool_connections=pool.get('hosts', 10),
+                       pool_maxsize=pool.get('maxsize', 64),
+                       pool_block=pool.get('block', False))
+
+
+def create(auth, config, adapter=None, hedger=None):
+    """Create the transport selected by the "transport" config option:
+
+        "transport": {"record": "traffic.jsonl"}
+        "transport": {"replay": "traffic.jsonl", "speed": 1.0}
+
+    Without either a plain Transport is created. See
+    pybble.transport.recording. The transport shares the connection pool
+    adapter and the hedger when they are given.
+    """
+    options = config.get('transport', {})
+
+    if options.get('record'):
+        from pybble.transport.recording import RecordingTransport
+        return RecordingTransport(auth, config, options['record'],
+                                  adapter=adapter, hedger=hedger)
+
+    if options.get('replay'):
+        from pybble.transport.recording import ReplayTransport
+        return ReplayTransport(auth, config, options['replay'],
+                               speed=options.get('speed', 1.0),
+                               strict=options.get('strict', False),
+                               adapter=adapter, hedger=hedger)
+
+    return Transport(auth, config, adapter=adapter, hedger=hedger)
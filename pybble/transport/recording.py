@@ -0,0 +1,281 @@
+"""Recording and replay of Rubble traffic.
+
+A RecordingTransport appends every request and response made through it to a
+file, one JSON object per line. A ReplayTransport serves those responses back
+without a server, with the original latency, scaled latency or none at all,
+which makes it possible to profile pybble itself on real payloads.
+
+    client = Client(key, password,
+                    config={"transport": {"record": "traffic.jsonl"}})
+
+    client = Client(key, password,
+                    config={"transport": {"replay": "traffic.jsonl",
+                                          "speed": 0}})
+"""
+import base64
+import collections
+import hashlib
+import io
+import json
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from pybble.transport import Transport, decompress
+
+
+def encode_body(body):
+    """Store a body as text when possible, base64 otherwise"""
+    if body is None:
+        return {}
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    try:
+        return {'text': body.decode('utf-8')}
+    except UnicodeDecodeError:
+        return {'base64': base64.b64encode(body).decode('ascii')}
+
+
+def decode_body(stored):
+    if 'text' in stored:
+        return stored['text'].encode('utf-8')
+    if 'base64' in stored:
+        return base64.b64decode(stored['base64'])
+    return b''
+
+
+def body_digest(body):
+    if body is None:
+        return None
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    if not isinstance(body, bytes):
+        return None
+    return hashlib.sha1(body).hexdigest()
+
+
+def request_body(kwargs):
+    """The request body in kwargs as bytes, None if there is none, and the
+    body to send in its place. Iterable and file-like bodies can only be
+    read once, they are replaced by a body that collects what is sent.
+    Compressed bodies are returned decompressed, so that recordings don't
+    depend on the compression.
+
+    Returns
+    -------
+    body: callable
+        Returns the body, once it has been sent.
+
+    data: object
+        The body to send.
+    """
+    data = kwargs.get('data')
+    if data is None or isinstance(data, (bytes, str, dict)):
+        sent = data
+        if isinstance(sent, dict):
+            sent = requests.Request(data=data).prepare().body
+        chunks = None
+    else:
+        if hasattr(data, 'read'):
+            data = [data.read()]
+        chunks = []
+
+        def collect(iterable):
+            for chunk in iterable:
+                chunks.append(chunk)
+                yield chunk
+
+        data = collect(data)
+
+    def body():
+        content = sent if chunks is None else b''.join(
+            chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+            for chunk in chunks)
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        encoding = (kwargs.get('headers') or {}).get('content-encoding')
+        if content is not None and encoding is not None:
+            content = decompress(content, encoding)
+        return content
+
+    return body, data
+
+
+def prepared_url(method, url, params):
+    """The URL, including the query string, that requests would send"""
+    return requests.Request(method, url, params=params).prepare().url
+
+
+class RecordingTransport(Transport):
+    """A Transport that appends every exchange to the file at path.
+
+    Each line holds the method, the URL with its query string, the request
+    body, uncompressed, the response status, reason, content-type, encoding
+    and body, and the latency in seconds. Streamed responses are recorded
+    as they are read, once read to the end or closed, with the latency up
+    to the response headers.
+    """
+
+    def __init__(self, auth, config, path, adapter=None, hedger=None):
+        super().__init__(auth, config, adapter, hedger)
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def send(self, method, url, **kwargs):
+        body, kwargs['data'] = request_body(kwargs)
+        started = time.perf_counter()
+        response = super().send(method, url, **kwargs)
+
+        record = {
+            'method': method,
+            'url': response.request.url if response.request else url,
+            'status': response.status_code,
+            'reason': response.reason,
+            'content_type': response.headers.get('content-type'),
+            'encoding': response.encoding,
+        }
+
+        if kwargs.get('stream'):
+            # record the response once it has been read, as it is read
+            record['latency'] = time.perf_counter() - started
+            response.raw = _RecordingReader(
+                response.raw, lambda content: self._write(record, body(),
+                                                          content))
+        else:
+            content = response.content
+            record['latency'] = time.perf_counter() - started
+            self._write(record, body(), content)
+
+        return response
+
+    def _write(self, record, body, content):
+        record['request'] = encode_body(body)
+        record['digest'] = body_digest(body)
+        record['response'] = encode_body(content)
+
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line)
+                self._file.flush()
+
+    def close(self):
+        super().close()
+        with self._lock:
+            self._file.close()
+
+
+class _RecordingReader:
+    """Wraps the raw urllib3 response of a streamed request, collecting the
+    decoded body as it is read and calling done with it once the body has
+    been read to the end or the response is closed
+    """
+
+    def __init__(self, raw, done):
+        self._raw = raw
+        self._done = done
+        self._chunks = []
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def _finish(self):
+        if self._done is not None:
+            done, self._done = self._done, None
+            done(b''.join(self._chunks))
+
+    def stream(self, amt=2 ** 16, decode_content=None):
+        for chunk in self._raw.stream(amt, decode_content=decode_content):
+            self._chunks.append(chunk)
+            yield chunk
+        self._finish()
+
+    def read(self, amt=None, *args, **kwargs):
+        data = self._raw.read(amt, *args, **kwargs)
+        self._chunks.append(data)
+        if not data or amt is None:
+            self._finish()
+        return data
+
+    def close(self):
+        self._finish()
+        self._raw.close()
+
+
+class ReplayTransport(Transport):
+    """A Transport that serves responses from a recording.
+
+    Requests are matched on method and URL, including the query string, and
+    also on the request body if strict is true. Identical requests are served
+    the matching recorded responses in the order they were recorded, the
+    last one is repeated once they run out.
+
+    Parameters
+    ----------
+
+    speed: float, optional
+        Recorded latencies are divided by speed: 1 replays the original
+        timing, 2 replays twice as fast, 0 or None doesn't wait at all.
+
+    strict: bool, optional
+        Also match on the request body.
+    """
+
+    def __init__(self, auth, config, path, speed=1.0, strict=False,
+                 adapter=None, hedger=None):
+        super().__init__(auth, config, adapter, hedger)
+        self.speed = speed
+        self.strict = strict
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._records = collections.defaultdict(collections.deque)
+
+        with open(path, encoding='utf-8') as recording:
+            for line in recording:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                self._records[self._key(record['method'], record['url'],
+                                        record.get('digest'))].append(record)
+
+    def _key(self, method, url, digest):
+        if self.strict:
+            return method, url, digest
+        return method, url
+
+    def send(self, method, url, **kwargs):
+        url = prepared_url(method, url, kwargs.get('params'))
+        body, data = request_body(kwargs)
+        if data is not kwargs.get('data'):
+            # read the body as the server would
+            for _ in data:
+                pass
+        key = self._key(method, url, body_digest(body()))
+
+        with self._lock:
+            records = self._records.get(key)
+            if not records:
+                self.misses += 1
+                raise LookupError(
+                    "No recorded response for {} {}".format(method, url))
+            record = records.popleft() if len(records) > 1 else records[0]
+
+        if self.speed:
+            time.sleep(record['latency'] / self.speed)
+
+        response = requests.models.Response()
+        response.status_code = record['status']
+        response.reason = record['reason']
+        response.url = url
+        response.encoding = record.get('encoding')
+        response.headers = CaseInsensitiveDict()
+        if record.get('content_type'):
+            response.headers['content-type'] = record['content_type']
+        response._content = decode_body(record['response'])
+        # for streamed reads, see requests.Response.iter_content
+        response.raw = io.BytesIO(response._content)
+        return response
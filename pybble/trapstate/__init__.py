@@ -0,0 +1,124 @@
+"""Parsing of the trapstate XML document of a Rubble process.
+
+See RubbleProcess.get for a description of the document:
+
+    <?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+    <trapstate>
+        <timestamp>1368101400107</timestamp>
+        <cause>ERROR</cause>
+        <description>Inference failure: CONTRADICTION crazy_fact</description>
+        <triggering-message>input(pid(42),crazy_fact);</triggering-message>
+        <reschedule-delay>60000</reschedule-delay>
+        <discard-after>172800000</discard-after>
+    </trapstate>
+"""
+from xml.etree import ElementTree
+
+
+ERROR = 'ERROR'
+PAUSED = 'PAUSED'
+PAUSE_ON_CONDITION = 'PAUSE-ON-CONDITION'
+
+# element name: (attribute name, type)
+FIELDS = {
+    'timestamp': ('timestamp', int),
+    'cause': ('cause', str),
+    'description': ('description', str),
+    'triggering-message': ('triggering_message', str),
+    'reschedule-delay': ('reschedule_delay', int),
+    'discard-after': ('discard_after', int),
+    'pause-condition': ('pause_condition', str),
+}
+
+
+class TrapState:
+    """The exceptional processing state of a process. Trapstates are
+    immutable, so equal ones can be used as dict keys and set members.
+
+    Attributes
+    ----------
+
+    timestamp: int or None
+        When the trap occurred, in milliseconds since the epoch.
+
+    cause: str or None
+        ERROR, PAUSED or PAUSE-ON-CONDITION.
+
+    description: str or None
+
+    triggering_message: str or None
+        The message that caused the trap, in native Rubble syntax.
+
+    reschedule_delay: int or None
+        Milliseconds that messages are delayed by while trapped.
+
+    discard_after: int or None
+        Milliseconds after timestamp at which delayed messages are
+        discarded.
+
+    pause_condition: str or None
+        Rubble code evaluated for PAUSE-ON-CONDITION.
+    """
+
+    def __init__(self, **kwargs):
+        for attribute, _ in FIELDS.values():
+            object.__setattr__(self, attribute, kwargs.get(attribute))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("TrapState is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("TrapState is immutable")
+
+    @property
+    def discard_at(self):
+        """When pending messages start to be discarded, in milliseconds
+        since the epoch
+        """
+        if self.timestamp is None or self.discard_after is None:
+            return None
+        return self.timestamp + self.discard_after
+
+    @property
+    def stuck(self):
+        """Whether the process has stopped receiving messages"""
+        return self.cause in (ERROR, PAUSED)
+
+    def as_dict(self):
+        return {attribute: getattr(self, attribute)
+                for attribute, _ in FIELDS.values()}
+
+    def __eq__(self, other):
+        return isinstance(other, TrapState) and self.as_dict() == other.as_dict()
+
+    def __hash__(self):
+        return hash(tuple(getattr(self, attribute)
+                          for attribute, _ in FIELDS.values()))
+
+    def __repr__(self):
+        return "<TrapState cause={} timestamp={}>".format(self.cause,
+                                                          self.timestamp)
+
+
+def parse(xml):
+    """Parse a trapstate XML document.
+
+    Returns
+    -------
+    trapstate: TrapState or None
+        None for a missing or blank trapstate, which means normal
+        processing.
+    """
+    if not xml or not xml.strip():
+        return None
+
+    if isinstance(xml, str):
+        xml = xml.encode('utf-8')
+
+    values = {}
+    for element in ElementTree.fromstring(xml):
+        if element.tag in FIELDS and element.text is not None:
+            attribute, type_ = FIELDS[element.tag]
+            values[attribute] = type_(element.text.strip())
+
+    return TrapState(**values)
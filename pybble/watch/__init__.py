@@ -0,0 +1,262 @@
+"""Watch Rubble processes for state changes.
+
+Rather than retrieving every watched process on every poll, a Watcher pages
+through processlist, which carries each process's modtime, and only calls
+process for the processes whose modtime has advanced. The poll interval
+backs off while nothing changes, so idle processes cost one paged list call
+per interval.
+"""
+import threading
+
+from pybble.batch import bounded_map
+
+
+class ProcessChange:
+    """A change to a watched process.
+
+    Attributes
+    ----------
+
+    pid: str
+        The process ID.
+
+    modtime: int or None
+        The new modification time, None if the process was deleted.
+
+    previous_modtime: int or None
+        The modification time seen on the previous poll, None for a process
+        that appeared since then.
+
+    process: dict or None
+        The "content" object returned by RubbleProcess.get, None if the
+        process was deleted, the watcher doesn't fetch state or retrieving
+        the process failed.
+
+    error: Exception or None
+        Why retrieving the process failed, e.g. because it was deleted
+        right after it was listed.
+    """
+
+    def __init__(self, pid, modtime, previous_modtime, process=None,
+                 error=None):
+        self.pid = pid
+        self.modtime = modtime
+        self.previous_modtime = previous_modtime
+        self.process = process
+        self.error = error
+
+    @property
+    def deleted(self):
+        return self.modtime is None
+
+    def __repr__(self):
+        return "<ProcessChange pid={} modtime={} previous_modtime={}>".format(
+            self.pid, self.modtime, self.previous_modtime)
+
+
+class Watcher:
+    """Poll a set of processes for changes.
+
+    Examples
+    --------
+
+        for change in client.process.watch([17, 42]):
+            print(change.pid, change.process['facts'])
+
+        async for change in client.process.watch([17, 42]):
+            ...
+
+        watcher = client.process.watch([17, 42], callback=print)
+        ...
+        watcher.stop()
+
+    Parameters
+    ----------
+
+    process: RubbleProcess
+        Used to list and retrieve processes.
+
+    pids: iterable
+        The process IDs to watch.
+
+    page_size: int, optional
+        Number of processes per processlist call.
+
+    min_interval: float, optional
+        Seconds between polls while processes are changing.
+
+    max_interval: float, optional
+        Upper bound for the poll interval of an idle watcher.
+
+    backoff: float, optional
+        Factor the interval grows by after every poll without changes.
+
+    fetch: bool, optional
+        Retrieve the full state of changed processes. If False, changes only
+        carry pid and modtimes.
+
+    workers: int, optional
+        Number of concurrent process retrievals.
+
+    initial: bool, optional
+        Report every existing watched process as a change on the first poll,
+        rather than using it as the baseline.
+
+    on_error: callable, optional
+        Called with the exception when a poll or the callback fails while
+        watching in a thread, see Watcher.start. The watcher keeps polling,
+        backing off as if nothing had changed. The last exception is kept
+        in self.error in any case.
+    """
+
+    def __init__(self, process, pids, page_size=1000, min_interval=1.0,
+                 max_interval=60.0, backoff=2.0, fetch=True, workers=8,
+                 initial=False, on_error=None):
+        self.process = process
+        self.pids = set(str(pid) for pid in pids)
+        self.page_size = page_size
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.fetch = fetch
+        self.workers = workers
+        self.interval = min_interval
+        self.modtimes = None if not initial else {}
+        self.on_error = on_error
+        self.error = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def modtimes_now(self):
+        """Return a dict of pid to modtime for the watched processes that
+        currently exist, paging through processlist from the lowest watched
+        pid and stopping after the highest.
+        """
+        if not self.pids:
+            return {}
+
+        highest = max(int(pid) for pid in self.pids)
+        modtimes = {}
+        pages = self.process.list_pages(page_size=self.page_size,
+                                        pid_begin=min(int(pid) for pid in self.pids))
+        for page in pages:
+            for item in page:
+                if item['pid'] in self.pids:
+                    modtimes[item['pid']] = item['modtime']
+
+            if int(page[-1]['pid']) >= highest:
+                break
+
+        return modtimes
+
+    def poll(self):
+        """Poll once and adjust the interval.
+
+        Returns
+        -------
+        changes: list
+            ProcessChange objects, empty if nothing changed.
+        """
+        current = self.modtimes_now()
+
+        if self.modtimes is None:
+            self.modtimes = current
+            return []
+
+        changes = []
+        for pid, modtime in current.items():
+            previous = self.modtimes.get(pid)
+            if previous is None or modtime > previous:
+                changes.append(ProcessChange(pid, modtime, previous))
+
+        for pid in self.modtimes.keys() - current.keys():
+            changes.append(ProcessChange(pid, None, self.modtimes[pid]))
+
+        self.modtimes = current
+
+        if self.fetch:
+            fetched = [change for change in changes if not change.deleted]
+            for change, response, error in bounded_map(self._fetch, fetched,
+                                                       workers=self.workers):
+                if error is None:
+                    change.process = response.get('content')
+                else:
+                    change.error = error
+
+        if changes:
+            self.interval = self.min_interval
+        else:
+            self._back_off()
+
+        return changes
+
+    def _back_off(self):
+        self.interval = min(self.interval * self.backoff, self.max_interval)
+
+    def _fetch(self, change):
+        return self.process.get(change.pid, prettyprint=False)
+
+    def __iter__(self):
+        # cleared here, not in the generator, which only starts running on
+        # the first next() and would undo a stop() made before that
+        self._stopped.clear()
+        return self._changes()
+
+    def _changes(self):
+        while not self._stopped.is_set():
+            yield from self.poll()
+            self._stopped.wait(self.interval)
+
+    def __aiter__(self):
+        self._stopped.clear()
+        return self._async_changes()
+
+    async def _async_changes(self):
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        while not self._stopped.is_set():
+            for change in await loop.run_in_executor(None, self.poll):
+                yield change
+            await asyncio.sleep(self.interval)
+
+    def start(self, callback):
+        """Poll in a daemon thread, calling callback with every
+        ProcessChange. Exceptions raised by a poll or by callback don't
+        stop the thread, see on_error.
+        """
+        self._stopped.clear()
+
+        def run():
+            while not self._stopped.is_set():
+                try:
+                    changes = self.poll()
+                except Exception as e:
+                    self._failed(e)
+                    self._back_off()
+                    changes = []
+
+                for change in changes:
+                    try:
+                        callback(change)
+                    except Exception as e:
+                        self._failed(e)
+
+                self._stopped.wait(self.interval)
+
+        self._thread = threading.Thread(target=run, name='pybble-watch',
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def _failed(self, error):
+        self.error = error
+        if self.on_error is not None:
+            self.on_error(error)
+
+    def stop(self):
+        """Stop polling after the current poll"""
+        self._stopped.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+            self._thread = None